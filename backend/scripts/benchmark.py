@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+"""Benchmark reproduzível do pipeline de upscale.
+
+Gera vídeos sintéticos (resolução, duração e taxa de frames duplicados
+configuráveis), roda o upscale.py com o stub_upscaler.py no lugar do
+realesrgan-ncnn-vulkan e mede, para cada modo do pipeline:
+
+  - throughput por etapa (a partir dos eventos "stage" do upscale.py)
+  - pico de RSS da árvore de processos
+  - pico de uso de disco temporário (diretório do job + slots do streaming)
+
+Os resultados saem em JSON; com --baseline o benchmark compara com uma
+execução anterior e termina com código 1 se algum limite de regressão
+for ultrapassado.
+
+Exemplo:
+    python benchmark.py --resolutions 320x180,1280x720 --frames 96 --dup-rates 0,0.5 \\
+        --modes staged,chunked,streaming --output resultados.json
+    python benchmark.py --baseline resultados.json --max-slowdown 0.15
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPTS_DIR)
+UPSCALE_SCRIPT = os.path.join(SCRIPTS_DIR, "upscale.py")
+STUB_SCRIPT = os.path.join(SCRIPTS_DIR, "stub_upscaler.py")
+JOBS_DIR = os.path.join(BASE_DIR, "jobs")
+
+SAMPLE_INTERVAL = 0.1  # segundos entre amostras de RSS/disco
+
+# Configuração JSON (mesmas chaves do frontend) de cada modo comparado
+MODES = {
+    "staged": {},
+    "chunked": {"chunkSize": 16},
+    "streaming": {"streaming": True},
+    "segments": {"segments": 2},
+    "staged_dedup": {"dedup": True},
+    "streaming_dedup": {"streaming": True, "dedup": True},
+    "frame_store": {"frameStore": "raw"},
+}
+
+# ----------------------------
+# Vídeos sintéticos
+# ----------------------------
+def generate_video(path, width, height, frames, dup_rate, fps=24, seed=0):
+    """Gera um vídeo determinístico: gradiente em movimento + ruído fixo.
+
+    Uma fração `dup_rate` dos frames repete exatamente o frame anterior
+    (como cenas paradas / animação em 2s), para exercitar a deduplicação.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 32, size=(height, width, 3), dtype=np.uint8)
+    duplicated = rng.random(frames) < dup_rate
+    duplicated[0] = False
+
+    ys, xs = np.mgrid[0:height, 0:width]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Não foi possível criar o vídeo sintético: {path}")
+    frame = None
+    for idx in range(frames):
+        if frame is None or not duplicated[idx]:
+            shift = idx * 4
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[..., 0] = (xs + shift) % 256
+            frame[..., 1] = (ys + shift // 2) % 256
+            frame[..., 2] = ((xs + ys) // 2 + shift) % 256
+            frame = cv2.add(frame, noise)
+            cv2.putText(frame, str(idx), (8, max(24, height // 6)), cv2.FONT_HERSHEY_SIMPLEX,
+                        max(0.5, height / 360), (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+    return int(duplicated.sum())
+
+def get_synthetic_video(videos_dir, width, height, frames, dup_rate, fps):
+    """Reaproveita o vídeo sintético se já existir (mesmos parâmetros → mesmo arquivo)"""
+    name = f"synthetic_{width}x{height}_{frames}f_dup{int(dup_rate * 100):02d}.mp4"
+    path = os.path.join(videos_dir, name)
+    if not os.path.exists(path):
+        print(f"🎞️ Gerando {name}...", flush=True)
+        generate_video(path, width, height, frames, dup_rate, fps)
+    return path
+
+def create_stub_launcher(work_dir):
+    """Cria um executável que roda o stub com o mesmo Python deste benchmark"""
+    if os.name == "nt":
+        launcher = os.path.join(work_dir, "stub_upscaler.cmd")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'@"{sys.executable}" "{STUB_SCRIPT}" %*\n')
+    else:
+        launcher = os.path.join(work_dir, "stub_upscaler.sh")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{STUB_SCRIPT}" "$@"\n')
+        os.chmod(launcher, 0o755)
+    return launcher
+
+# ----------------------------
+# Medição de RSS e disco
+# ----------------------------
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Arquivo removido durante a varredura
+    return total
+
+def scratch_dirs():
+    """Diretórios temporários do modo streaming (ver get_scratch_root no upscale.py)"""
+    roots = ["/dev/shm", tempfile.gettempdir()]
+    return [d for root in roots if os.path.isdir(root) for d in glob.glob(os.path.join(root, "upscale_stream_*"))]
+
+def tree_rss(process):
+    """RSS somado do processo e de todos os filhos (upscaler, ffmpeg, processos de segmento)"""
+    try:
+        procs = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0
+    total = 0
+    for proc in procs:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def monitor(pid, existing_jobs, stop_event, peaks):
+    """Amostra RSS da árvore de processos e disco temporário até `stop_event`"""
+    process = psutil.Process(pid) if psutil is not None else None
+    while not stop_event.is_set():
+        if process is not None:
+            peaks["rss"] = max(peaks["rss"], tree_rss(process))
+        temp_dirs = scratch_dirs()
+        if os.path.isdir(JOBS_DIR):
+            temp_dirs += [os.path.join(JOBS_DIR, d) for d in os.listdir(JOBS_DIR) if d not in existing_jobs]
+        peaks["disk"] = max(peaks["disk"], sum(directory_size(d) for d in temp_dirs))
+        stop_event.wait(SAMPLE_INTERVAL)
+
+# ----------------------------
+# Execução
+# ----------------------------
+def run_case(video_path, output_path, mode, stub_launcher, frames, stub_delay_ms):
+    """Roda o upscale.py uma vez e devolve as métricas coletadas"""
+    config = {
+        "inputPath": video_path,
+        "outputPath": output_path,
+        "scale": 2,
+        "gpuMemory": 8192,
+        "useGpu": True,
+        "upscalerPath": stub_launcher,
+        "autotune": False,        # Configuração fixa: resultados comparáveis entre execuções
+        "resume": False,
+        "frameCache": False,
+        "jobRetentionHours": 0,
+    }
+    config.update(MODES[mode])
+
+    env = dict(os.environ, STUB_UPSCALER_DELAY_MS=str(stub_delay_ms))
+    existing_jobs = set(os.listdir(JOBS_DIR)) if os.path.isdir(JOBS_DIR) else set()
+    peaks = {"rss": 0, "disk": 0}
+    stop_event = threading.Event()
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, UPSCALE_SCRIPT], cwd=SCRIPTS_DIR, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding="utf-8")
+    sampler = threading.Thread(target=monitor, args=(process.pid, existing_jobs, stop_event, peaks), daemon=True)
+    sampler.start()
+    stdout, stderr = process.communicate(json.dumps(config))
+    wall = time.perf_counter() - start
+    stop_event.set()
+    sampler.join()
+
+    stages, profile, errors = {}, None, []
+    for line in stdout.splitlines():
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if event.get("type") == "metrics" and event.get("kind") == "stage":
+            metrics = event["metrics"]
+            stage = stages.setdefault(metrics["stage"], {"wallSeconds": 0.0, "cpuSeconds": 0.0, "childCpuSeconds": 0.0})
+            for key in stage:
+                stage[key] += metrics[key]
+        elif event.get("type") == "metrics" and event.get("kind") == "profile":
+            profile = event["metrics"]
+        elif event.get("type") == "error":
+            errors.append(event.get("message"))
+
+    for stage in stages.values():
+        stage["framesPerSecond"] = round(frames / stage["wallSeconds"], 2) if stage["wallSeconds"] > 0 else None
+
+    peak_rss = peaks["rss"]
+    if psutil is None and resource is not None:
+        # Sem psutil: maior RSS entre os filhos já encerrados (valor cumulativo, aproximado)
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+    result = {
+        "ok": process.returncode == 0 and os.path.exists(output_path),
+        "wallSeconds": round(wall, 3),
+        "framesPerSecond": round(frames / wall, 2) if wall > 0 else None,
+        "stages": stages,
+        "latencies": profile["latencies"] if profile else {},
+        "spawnOverhead": profile["spawnOverhead"] if profile else None,
+        "bytesWritten": profile["bytesWritten"] if profile else None,
+        "peakRssMb": round(peak_rss / (1024 * 1024), 1),
+        "peakTempDiskMb": round(peaks["disk"] / (1024 * 1024), 1),
+        "outputMb": round(os.path.getsize(output_path) / (1024 * 1024), 2) if os.path.exists(output_path) else None,
+    }
+    if not result["ok"]:
+        result["errors"] = errors or [stderr.strip()[-2000:]]
+    return result
+
+def median_result(runs):
+    """Resultado mediano (pelo tempo total) entre as repetições"""
+    ordered = sorted(runs, key=lambda r: r["wallSeconds"])
+    return ordered[len(ordered) // 2]
+
+# ----------------------------
+# Regressões
+# ----------------------------
+def compare_with_baseline(results, baseline, max_slowdown, max_rss_increase, max_disk_increase):
+    """Compara com um resultado anterior; retorna a lista de regressões encontradas"""
+    previous = {(r["case"], r["mode"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["case"], result["mode"])
+        base = previous.get(key)
+        if base is None or not base["ok"]:
+            continue
+        label = f"{result['case']} [{result['mode']}]"
+        if not result["ok"]:
+            regressions.append(f"{label}: falhou (antes passava)")
+            continue
+
+        checks = [("tempo total", base["wallSeconds"], result["wallSeconds"], max_slowdown)]
+        for name, stage in result["stages"].items():
+            base_stage = base["stages"].get(name)
+            if base_stage:
+                checks.append((f"etapa {name}", base_stage["wallSeconds"], stage["wallSeconds"], max_slowdown))
+        if result["peakRssMb"] and base["peakRssMb"]:
+            checks.append(("pico de RSS", base["peakRssMb"], result["peakRssMb"], max_rss_increase))
+        if base["peakTempDiskMb"]:
+            checks.append(("pico de disco", base["peakTempDiskMb"], result["peakTempDiskMb"], max_disk_increase))
+
+        for what, before, after, limit in checks:
+            if before > 0 and (after - before) / before > limit:
+                regressions.append(f"{label}: {what} {before} → {after} (+{(after - before) / before:.0%}, "
+                                   f"limite {limit:.0%})")
+    return regressions
+
+# ----------------------------
+# CLI
+# ----------------------------
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+def parse_resolution(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def print_summary(results):
+    print(f"\n{'caso':<34} {'modo':<16} {'total s':>8} {'fps':>7} {'RSS MB':>8} {'disco MB':>9}  etapas (fps)")
+    for r in results:
+        stages = ", ".join(f"{name} {stage['framesPerSecond']}" for name, stage in r["stages"].items())
+        status = "" if r["ok"] else "  ❌ FALHOU"
+        print(f"{r['case']:<34} {r['mode']:<16} {r['wallSeconds']:>8} {r['framesPerSecond'] or 0:>7} "
+              f"{r['peakRssMb']:>8} {r['peakTempDiskMb']:>9}  {stages}{status}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de upscale com upscaler stub")
+    parser.add_argument("--resolutions", default="320x180,640x360", help="lista WxH separada por vírgula")
+    parser.add_argument("--frames", default="48", help="quantidades de frames (vírgula)")
+    parser.add_argument("--dup-rates", default="0,0.5", help="frações de frames duplicados (vírgula)")
+    parser.add_argument("--fps", type=float, default=24)
+    parser.add_argument("--modes", default="staged,chunked,streaming", help=f"modos: {', '.join(MODES)}")
+    parser.add_argument("--repeat", type=int, default=1, help="repetições por caso (usa a mediana)")
+    parser.add_argument("--stub-delay-ms", type=float, default=0, help="atraso por frame do stub (simula a GPU)")
+    parser.add_argument("--work-dir", default=os.path.join(BASE_DIR, "benchmarks"))
+    parser.add_argument("--output", help="arquivo JSON de resultados (padrão: <work-dir>/results.json)")
+    parser.add_argument("--baseline", help="resultado anterior para detectar regressões")
+    parser.add_argument("--max-slowdown", type=float, default=0.15, help="aumento máximo de tempo (fração)")
+    parser.add_argument("--max-rss-increase", type=float, default=0.25, help="aumento máximo do pico de RSS")
+    parser.add_argument("--max-disk-increase", type=float, default=0.25, help="aumento máximo do pico de disco")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        # Lido antes da execução: --output pode apontar para o mesmo arquivo
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    modes = parse_list(args.modes)
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"modos desconhecidos: {', '.join(unknown)}")
+    if psutil is None:
+        print("⚠️ psutil não instalado: pico de RSS aproximado pelo maior processo filho", flush=True)
+
+    videos_dir = os.path.join(args.work_dir, "videos")
+    outputs_dir = os.path.join(args.work_dir, "outputs")
+    os.makedirs(videos_dir, exist_ok=True)
+    os.makedirs(outputs_dir, exist_ok=True)
+    stub_launcher = create_stub_launcher(args.work_dir)
+
+    results = []
+    for width, height in map(parse_resolution, parse_list(args.resolutions)):
+        for frames in parse_list(args.frames, int):
+            for dup_rate in parse_list(args.dup_rates, float):
+                video = get_synthetic_video(videos_dir, width, height, frames, dup_rate, args.fps)
+                case = os.path.splitext(os.path.basename(video))[0].replace("synthetic_", "")
+                for mode in modes:
+                    print(f"🚀 {case} [{mode}]", flush=True)
+                    output_path = os.path.join(outputs_dir, f"{case}_{mode}.mp4")
+                    runs = []
+                    for _ in range(args.repeat):
+                        if os.path.exists(output_path):
+                            os.remove(output_path)
+                        runs.append(run_case(video, output_path, mode, stub_launcher, frames, args.stub_delay_ms))
+                    result = median_result(runs)
+                    result.update({"case": case, "mode": mode, "width": width, "height": height,
+                                   "frames": frames, "dupRate": dup_rate})
+                    results.append(result)
+
+    report = {
+        "createdAt": time.time(),
+        "environment": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "cpuCount": os.cpu_count(),
+            "ffmpeg": shutil.which("ffmpeg"),
+        },
+        "settings": {"repeat": args.repeat, "stubDelayMs": args.stub_delay_ms, "fps": args.fps},
+        "results": results,
+    }
+    output = args.output or os.path.join(args.work_dir, "results.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print_summary(results)
+    print(f"\n💾 Resultados salvos em {output}")
+
+    exit_code = 0 if all(r["ok"] for r in results) else 1
+    if baseline is not None:
+        regressions = compare_with_baseline(results, baseline, args.max_slowdown,
+                                            args.max_rss_increase, args.max_disk_increase)
+        if regressions:
+            print("\n❌ Regressões encontradas:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            exit_code = 1
+        else:
+            print("\n✅ Nenhuma regressão em relação ao baseline")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
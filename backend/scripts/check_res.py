@@ -1,13 +1,12 @@
 import sys
-import subprocess
 
-video_path = sys.argv[1]
+from media_probe import probe_media, ProbeError
 
-result = subprocess.run(
-    ["ffprobe", "-v", "error", "-select_streams", "v:0",
-     "-show_entries", "stream=width,height", "-of", "csv=p=0", video_path],
-    capture_output=True, text=True
-)
+video_path = sys.argv[1]
 
-width, height = result.stdout.strip().split(',')
-print(f"Resolução do vídeo: {width}x{height}")
+try:
+    info = probe_media(video_path)
+except (OSError, ProbeError) as e:
+    print(f"Não foi possível obter a resolução do vídeo: {e}")
+    sys.exit(1)
+print(f"Resolução do vídeo: {info['display_width']}x{info['display_height']}")
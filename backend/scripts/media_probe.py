@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""Probe de mídia: metadados exatos do vídeo com uma única execução do ffprobe.
+
+    media_probe.py video.mp4   → resumo em JSON (resolução, frames, fps, VFR, rotação, áudio...)
+
+Os resultados ficam em cache no disco (backend/cache/probe), indexados por
+caminho, tamanho e mtime do arquivo: lotes, retomadas e a divisão em segmentos
+não repetem o probe dos mesmos arquivos.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from fractions import Fraction
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE_CACHE_DIR = os.path.join(BASE_DIR, "cache", "probe")
+PROBE_CACHE_MAX_ENTRIES = 2000  # arquivos de cache mantidos (os mais antigos saem primeiro)
+PROBE_MEMORY_ENTRIES = 256     # resultados mantidos em memória por processo (modo servidor)
+PROBE_VERSION = 1               # muda quando o formato do resultado muda (invalida o cache)
+PROBE_TIMEOUT = 600             # segundos por execução; o ffprobe lê todos os pacotes de vídeo do arquivo
+VFR_TOLERANCE = 0.1             # variação relativa da duração dos frames acima da qual o vídeo é VFR
+
+class ProbeError(Exception):
+    """ffprobe indisponível, arquivo ilegível ou sem trilha de vídeo"""
+
+# Cache em memória na frente do cache em disco (vários probes do mesmo arquivo por job)
+_memory_cache = {}
+_cache_lock = threading.Lock()
+
+def probe_cache_key(path):
+    """Chave do arquivo: caminho absoluto + tamanho + mtime (um arquivo alterado é refeito)"""
+    stat = os.stat(path)
+    key = f"{PROBE_VERSION}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def probe_media(path, cache_dir=PROBE_CACHE_DIR):
+    """Metadados de `path` (ver parse_probe), do cache quando o arquivo não mudou.
+
+    Levanta FileNotFoundError se o arquivo não existe e ProbeError se o ffprobe falhar.
+    Com `cache_dir` None só o cache em memória é usado.
+    """
+    key = probe_cache_key(path)
+    with _cache_lock:
+        if key in _memory_cache:
+            return _memory_cache[key]
+
+    cache_path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+    info = None
+    if cache_path:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            info = None
+    if info is None:
+        info = parse_probe(run_ffprobe(path))
+        if cache_path:
+            store_probe_cache(cache_dir, cache_path, info)
+
+    with _cache_lock:
+        if len(_memory_cache) >= PROBE_MEMORY_ENTRIES:
+            _memory_cache.clear()
+        _memory_cache[key] = info
+    return info
+
+def run_ffprobe(path):
+    """Saída do ffprobe no formato JSON dele: format e streams, mais os pacotes só da trilha de vídeo.
+
+    Os pacotes vêm de uma segunda execução restrita à trilha de vídeo, em
+    formato compacto lido linha a linha: áudio e legendas não entram e a saída
+    de vídeos longos não precisa caber inteira na memória como um JSON.
+    """
+    data = _run_ffprobe_json(["-show_format", "-show_streams"], path)
+    video = _video_stream(data.get("streams", []))
+    if video is not None:
+        data["packets"] = _probe_video_packets(path, video.get("index"))
+    return data
+
+def _run_ffprobe_json(args, path):
+    cmd = ["ffprobe", "-v", "error", "-of", "json"] + args + [path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ProbeError(f"ffprobe indisponível: {e}")
+    if result.returncode != 0:
+        raise ProbeError(f"ffprobe falhou (código {result.returncode}): {result.stderr.strip()[-500:]}")
+    try:
+        return json.loads(result.stdout)
+    except ValueError as e:
+        raise ProbeError(f"saída inválida do ffprobe: {e}")
+
+def _probe_video_packets(path, stream_index):
+    """Instante e flags de cada pacote da trilha `stream_index` (sem decodificar)"""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", str(stream_index),
+           "-show_entries", "packet=pts_time,dts_time,flags", "-of", "compact=p=0", path]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+    except OSError as e:
+        raise ProbeError(f"ffprobe indisponível: {e}")
+    # O stderr vai para uma thread: com o stdout sendo lido aqui, nenhum dos pipes enche
+    stderr = []
+    drain = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    drain.start()
+    timer = threading.Timer(PROBE_TIMEOUT, process.kill)
+    timer.start()
+    try:
+        packets = [packet for packet in (parse_packet_line(line, stream_index) for line in process.stdout) if packet]
+        returncode = process.wait()
+    finally:
+        timer.cancel()
+        drain.join(timeout=5)
+    if returncode != 0:
+        raise ProbeError(f"ffprobe falhou nos pacotes (código {returncode}): {''.join(stderr).strip()[-500:]}")
+    return packets
+
+def parse_packet_line(line, stream_index):
+    """"pts_time=0.041667|dts_time=0.000000|flags=__" → pacote no formato do JSON do ffprobe (None se vazia)"""
+    fields = dict(item.partition("=")[::2] for item in line.strip().split("|") if "=" in item)
+    if not fields:
+        return None
+    return {"stream_index": stream_index, **fields}
+
+def _video_stream(streams):
+    """Trilha de vídeo principal (capas/attached pictures não contam)"""
+    return next((s for s in streams if s.get("codec_type") == "video"
+                 and not s.get("disposition", {}).get("attached_pic")), None)
+
+def _rate(value):
+    """"30000/1001" → 29.97 (0.0 se ausente ou inválido)"""
+    try:
+        rate = Fraction(value or "0")
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+    return float(rate) if rate > 0 else 0.0
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _packet_time(packet):
+    value = packet.get("pts_time")
+    if value in (None, "N/A"):
+        value = packet.get("dts_time")
+    return None if value in (None, "N/A") else _float(value, None)
+
+def _rotation(stream):
+    """Rotação de exibição em graus no sentido horário (0, 90, 180 ou 270)"""
+    rotation = 0.0
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            # A matriz de exibição guarda o ângulo anti-horário
+            rotation = -_float(side_data["rotation"])
+    if not rotation:
+        rotation = _float(stream.get("tags", {}).get("rotate"))
+    return int(round(rotation / 90.0)) * 90 % 360
+
+def parse_probe(data):
+    """Resume a saída JSON do ffprobe.
+
+    - frame_count: pacotes da trilha de vídeo (exato, sem decodificar)
+    - fps: taxa média; base_fps: r_frame_rate (menor taxa que representa todos os instantes)
+    - vfr: a duração dos frames varia mais que VFR_TOLERANCE
+    - keyframes: instantes (s) dos keyframes, em ordem
+    - display_width/display_height: dimensões já com a rotação aplicada
+    """
+    streams = data.get("streams", [])
+    video = _video_stream(streams)
+    if video is None:
+        raise ProbeError("arquivo sem trilha de vídeo")
+
+    video_packets = [p for p in data.get("packets", []) if p.get("stream_index") == video.get("index")]
+    times = sorted(t for t in (_packet_time(p) for p in video_packets) if t is not None)
+    keyframes = sorted(_packet_time(p) for p in video_packets
+                       if "K" in p.get("flags", "") and _packet_time(p) is not None)
+    frame_count = len(video_packets) or int(_float(video.get("nb_frames")))
+
+    fps = _rate(video.get("avg_frame_rate"))
+    base_fps = _rate(video.get("r_frame_rate"))
+    deltas = sorted(b - a for a, b in zip(times, times[1:]) if b > a)
+    if len(deltas) >= 2:
+        median = deltas[len(deltas) // 2]
+        vfr = deltas[-1] - deltas[0] > median * VFR_TOLERANCE
+    else:
+        vfr = bool(fps and base_fps and abs(fps - base_fps) > 0.01)
+    if not fps:
+        duration = times[-1] - times[0] if len(times) > 1 else 0.0
+        fps = (len(times) - 1) / duration if duration > 0 else base_fps
+
+    width, height = int(video.get("width", 0)), int(video.get("height", 0))
+    rotation = _rotation(video)
+    fmt = data.get("format", {})
+    return {
+        "format": fmt.get("format_name"),
+        "duration": _float(fmt.get("duration")) or _float(video.get("duration")),
+        "bit_rate": int(_float(fmt.get("bit_rate"))),
+        "codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "width": width,
+        "height": height,
+        "rotation": rotation,
+        "display_width": height if rotation in (90, 270) else width,
+        "display_height": width if rotation in (90, 270) else height,
+        "time_base": video.get("time_base"),
+        "fps": fps,
+        "base_fps": base_fps or fps,
+        "vfr": vfr,
+        "frame_count": frame_count,
+        "keyframes": keyframes,
+        "audio": [{
+            "index": s.get("index"),
+            "codec": s.get("codec_name"),
+            "channels": int(_float(s.get("channels"))),
+            "channel_layout": s.get("channel_layout"),
+            "sample_rate": int(_float(s.get("sample_rate"))),
+            "bit_rate": int(_float(s.get("bit_rate"))),
+            "language": s.get("tags", {}).get("language"),
+        } for s in streams if s.get("codec_type") == "audio"],
+    }
+
+def store_probe_cache(cache_dir, cache_path, info):
+    """Grava o resultado de forma atômica e limita o número de entradas do cache"""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp_path, cache_path)
+        entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".json")]
+        if len(entries) > PROBE_CACHE_MAX_ENTRIES:
+            entries.sort(key=os.path.getmtime)
+            for old in entries[:len(entries) - PROBE_CACHE_MAX_ENTRIES]:
+                os.remove(old)
+    except OSError:
+        pass  # Sem cache em disco o probe continua valendo para este processo
+
+def describe_probe(info):
+    """Resumo de uma linha para logs"""
+    audio = ", ".join(a["codec"] or "?" for a in info["audio"]) or "sem áudio"
+    return (f"{info['display_width']}x{info['display_height']} {info['codec']}/{info['pix_fmt']}, "
+            f"{info['frame_count']} frames, {info['fps']:.3f} fps{' (VFR)' if info['vfr'] else ''}"
+            f"{', rotação ' + str(info['rotation']) + '°' if info['rotation'] else ''}, "
+            f"{len(info['keyframes'])} keyframes, áudio: {audio}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Uso: media_probe.py video [video...]\n")
+        sys.exit(1)
+    for video_path in sys.argv[1:]:
+        try:
+            info = probe_media(video_path)
+        except (OSError, ProbeError) as e:
+            sys.stderr.write(f"{video_path}: {e}\n")
+            sys.exit(1)
+        summary = {k: v for k, v in info.items() if k != "keyframes"}
+        summary["keyframes"] = len(info["keyframes"])
+        print(json.dumps({"path": video_path, **summary}, ensure_ascii=False))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Upscaler falso e determinístico com a mesma CLI do realesrgan-ncnn-vulkan.
+
+Usado pelo benchmark.py para medir o pipeline sem GPU nem binário do Windows:
+
+    stub_upscaler.py -i entrada.png -o saida.png -s 2 [-t 256] [-j 1:2:2] [-f png] [-g 0] [-n modelo]
+
+Como o original, aceita arquivo → arquivo ou diretório → diretório. O resultado
+é um resize nearest-neighbor (sempre o mesmo para a mesma entrada).
+
+Variáveis de ambiente:
+    STUB_UPSCALER_DELAY_MS  atraso fixo por frame, simulando o custo da inferência
+    STUB_UPSCALER_OOM_TILE  falha com "out of memory" se o tile for 0 ou maior que este valor
+"""
+import os
+import sys
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+def parse_args(argv):
+    """Lê as opções no formato "-x valor" do realesrgan-ncnn-vulkan"""
+    args = {}
+    i = 0
+    while i < len(argv):
+        if argv[i].startswith("-") and i + 1 < len(argv):
+            args[argv[i]] = argv[i + 1]
+            i += 2
+        else:
+            i += 1
+    return args
+
+def upscale_file(input_path, output_path, scale, delay):
+    image = cv2.imread(input_path)
+    if image is None:
+        sys.stderr.write(f"decode image {input_path} failed\n")
+        return False
+    if delay:
+        time.sleep(delay)
+    upscaled = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    return cv2.imwrite(output_path, upscaled)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if "-i" not in args or "-o" not in args:
+        sys.stderr.write("Usage: stub_upscaler.py -i infile -o outfile [options]...\n")
+        return 1
+
+    scale = int(args.get("-s", "4"))
+    tile_size = int(args.get("-t", "0"))
+    output_format = args.get("-f", "png")
+    delay = float(os.environ.get("STUB_UPSCALER_DELAY_MS", "0")) / 1000
+    oom_tile = int(os.environ.get("STUB_UPSCALER_OOM_TILE", "0"))
+
+    if oom_tile and (tile_size == 0 or tile_size > oom_tile):
+        sys.stderr.write("vkAllocateMemory failed: out of memory\n")
+        return 1
+
+    input_path, output_path = args["-i"], args["-o"]
+    if os.path.isdir(input_path):
+        os.makedirs(output_path, exist_ok=True)
+        ok = True
+        for name in sorted(os.listdir(input_path)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            target = os.path.join(output_path, os.path.splitext(name)[0] + "." + output_format)
+            ok = upscale_file(os.path.join(input_path, name), target, scale, delay) and ok
+        return 0 if ok else 1
+    return 0 if upscale_file(input_path, output_path, scale, delay) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,35 +4,477 @@ import subprocess
 import shutil
 import sys
 import signal
-import io
 import json
 import time
+import queue
+import tempfile
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import builtins
+import hashlib
+import hmac
+import ipaddress
+import platform
+import contextlib
+import contextvars
+import heapq
+import itertools
+import argparse
+import socket
+import socketserver
+import multiprocessing
+import uuid
+import zlib
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from media_probe import probe_media, describe_probe, ProbeError
 
 # ----------------------------
 # Forçar flush automático em todos os prints
 # ----------------------------
-print = lambda *args, **kwargs: __builtins__.print(*args, **kwargs, flush=True)
+print = lambda *args, **kwargs: builtins.print(*args, **kwargs, flush=True)
 
-# Forçar stdout e stderr em UTF-8
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+# Forçar stdout e stderr em UTF-8 (reconfigure mantém o objeto: quem já o capturou, como o pytest, continua valendo)
+for _stream in (sys.stdout, sys.stderr):
+    if hasattr(_stream, "reconfigure"):
+        _stream.reconfigure(encoding='utf-8')
 
 # ----------------------------
 # Diretório base
 # ----------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# ----------------------------
+# Opções avançadas do pipeline (sobrescritas pela configuração JSON)
+# ----------------------------
+DEFAULT_OPTIONS = {
+    "streaming": False,   # decode → upscale → encode em memória, sem PNGs em disco
+    "queue_depth": 8,     # frames máximos em cada fila do modo streaming
+    "chunk_size": 0,      # frames por execução do upscaler (0 = um processo por frame)
+    "segments": 0,        # divide o vídeo em K segmentos processados em paralelo (0 = desligado)
+    "segment_workers": 0, # processos simultâneos no modo segmentado (0 = automático)
+    "resume": True,               # retoma jobs interrompidos com a mesma entrada/configuração
+    "job_retention_hours": 0,     # horas para manter jobs concluídos (0 = remove ao terminar)
+    "stale_job_hours": 168,       # horas para descartar jobs incompletos abandonados
+    "dedup": False,               # faz upscale só de frames únicos e reaproveita o resultado nos duplicados
+    "dedup_threshold": 0.0,       # diferença média (0-255) abaixo da qual frames vizinhos contam como iguais
+    "frame_cache": False,         # cache persistente de frames com upscale, compartilhado entre jobs
+    "cache_dir": None,            # diretório do cache (padrão: backend/cache/upscaled)
+    "cache_max_mb": 10240,        # tamanho máximo do cache antes da remoção LRU
+    "autotune": True,             # ajusta workers/-j pelo throughput medido e salva o perfil por GPU/resolução
+    "backend": "ncnn",            # backend de upscale: "ncnn" (Real-ESRGAN) ou "cpu" (OpenCV em processo)
+    "upscaler_path": None,        # caminho do realesrgan-ncnn-vulkan (padrão: pasta realesrgan_portable/PATH)
+    "cpu_model_path": None,       # modelo do cv2.dnn_superres (ex.: ESPCN_x2.pb) para o backend cpu
+    "cpu_threads": 0,             # threads do backend cpu (0 = todos os núcleos)
+    "encoder": "ffmpeg",          # "ffmpeg" (pipe único com áudio) ou "opencv" (mp4v + mux de áudio separado)
+    "video_codec": "libx264",     # codec do FFmpeg (libx264, libx265, h264_nvenc, ...)
+    "crf": 18,                    # qualidade constante (menor = melhor)
+    "preset": "medium",           # preset de velocidade do encoder
+    "encoder_threads": 0,         # threads do encoder (0 = automático)
+    "decoder": "ffmpeg",          # "ffmpeg" (pipe multithread com timestamps por frame) ou "opencv" (cv2.VideoCapture)
+    "decoder_threads": 0,         # threads do decoder FFmpeg (0 = automático)
+    "decoder_hwaccel": None,      # aceleração de hardware do decode (-hwaccel: "auto", "cuda", "d3d11va", ...)
+    "trace_path": None,           # grava um perfil Chrome-trace (chrome://tracing / Perfetto) do job inteiro
+    "frame_store": "png",         # "png" (um arquivo por frame) ou "raw" (arquivo único mapeado em memória)
+    "frame_store_codec": "raw",   # codec por slot do frame store: "raw" (sem compressão) ou "zlib" (rápido, sem perdas)
+    "tile_diff": False,           # só refaz o upscale dos tiles que mudaram em relação ao frame anterior (streaming)
+    "tile_diff_size": 128,        # lado do tile (pixels da entrada)
+    "tile_diff_overlap": 16,      # margem de contexto/transição em volta de cada tile (pixels da entrada)
+    "tile_diff_threshold": 1.0,   # diferença média (0-255) acima da qual o tile conta como alterado
+    "resolution_plan": "auto",    # "auto" (caminho mais barato até o alvo), "quality" (sem reduzir a entrada) ou "off"
+    "resolution_skip": False,     # sem upscaler quando a origem já cobre o alvo (só o resize/reencode do FFmpeg)
+    "preview": None,              # "clip" (trecho curto) ou "pair" (imagens antes/depois) no lugar do vídeo inteiro
+    "preview_start": 0.0,         # início do preview em segundos (seek direto, sem decodificar o que vem antes)
+    "preview_duration": 2.0,      # duração do trecho em segundos
+    "preview_stride": 1,          # usa 1 a cada N frames do trecho
+    "disk_budget_mb": 0,          # limite dos PNGs em staging; extração, upscale e encode sobrepostos (0 = sem limite)
+    "frame_tiling": "auto",       # divide frames grandes em tiles entre vários workers: "auto" (a partir de 4K), "on" ou "off"
+    "frame_tile_size": 512,       # lado do tile (pixels da entrada)
+    "frame_tile_overlap": 16,     # margem de contexto/transição em volta de cada tile (pixels da entrada)
+    "frame_tile_workers": 0,      # execuções simultâneas do upscaler por frame (0 = automático)
+    "distributed_workers": [],    # workers remotos ("host:porta", ver --worker) que recebem lotes de frames
+    "distributed_local_workers": 0,  # workers locais em processos separados (teste do modo distribuído)
+    "distributed_token": None,    # token compartilhado com os workers (--token)
+    "shard_size": 8,              # frames por lote enviado a um worker
+    "assembly_workers": 0,        # threads que leem/redimensionam frames à frente do encoder (0 = automático)
+    "early_assembly": True,       # a montagem do vídeo começa durante o upscale, conforme os frames ficam prontos
+    "progressive_output": False,  # grava segmentos fMP4 + playlist HLS (<saída>_live/) para assistir durante o job
+    "progressive_segment_seconds": 6.0,  # duração de cada segmento da saída progressiva
+}
+
+# Processos filhos do modo segmentado não emitem progresso próprio
+PROGRESS_MUTED = False
+
+# Sem ffprobe os metadados vêm do OpenCV; o aviso sai uma vez por processo
+PROBE_WARNED = False
+
+# Job em execução no contexto atual (o modo servidor roda vários jobs no mesmo processo):
+# dict com "id", "cancel" (Event) e "gpu" (Semaphore das etapas de GPU, ou None)
+JOB_CONTEXT = contextvars.ContextVar("job_context", default=None)
+
+# Eventos saem uma linha JSON por escrita, serializados entre threads
+EVENT_LOCK = threading.Lock()
+EVENT_SINKS = []  # destinos extras dos eventos (filas das conexões do modo servidor; não podem bloquear)
+
+def parse_pipeline_options(config):
+    """Converte as chaves camelCase da configuração em opções do pipeline"""
+    options = dict(DEFAULT_OPTIONS)
+    options["streaming"] = bool(config.get('streaming', options["streaming"]))
+    options["queue_depth"] = max(1, int(config.get('queueDepth', options["queue_depth"])))
+    options["chunk_size"] = max(0, int(config.get('chunkSize', options["chunk_size"])))
+    options["segments"] = max(0, int(config.get('segments', options["segments"])))
+    options["segment_workers"] = max(0, int(config.get('segmentWorkers', options["segment_workers"])))
+    options["resume"] = bool(config.get('resume', options["resume"]))
+    options["job_retention_hours"] = max(0.0, float(config.get('jobRetentionHours', options["job_retention_hours"])))
+    options["stale_job_hours"] = max(0.0, float(config.get('staleJobHours', options["stale_job_hours"])))
+    options["dedup"] = bool(config.get('dedup', options["dedup"]))
+    options["dedup_threshold"] = max(0.0, float(config.get('dedupThreshold', options["dedup_threshold"])))
+    options["frame_cache"] = bool(config.get('frameCache', options["frame_cache"]))
+    options["cache_dir"] = config.get('cacheDir', options["cache_dir"])
+    options["cache_max_mb"] = max(1, int(config.get('cacheMaxMb', options["cache_max_mb"])))
+    options["autotune"] = bool(config.get('autotune', options["autotune"]))
+    options["backend"] = str(config.get('backend', options["backend"])).lower()
+    options["upscaler_path"] = config.get('upscalerPath', options["upscaler_path"])
+    options["cpu_model_path"] = config.get('cpuModelPath', options["cpu_model_path"])
+    options["cpu_threads"] = max(0, int(config.get('cpuThreads', options["cpu_threads"])))
+    options["encoder"] = str(config.get('encoder', options["encoder"])).lower()
+    options["video_codec"] = config.get('videoCodec', options["video_codec"])
+    options["crf"] = int(config.get('crf', options["crf"]))
+    options["preset"] = config.get('preset', options["preset"])
+    options["encoder_threads"] = max(0, int(config.get('encoderThreads', options["encoder_threads"])))
+    options["decoder"] = str(config.get('decoder', options["decoder"])).lower()
+    options["decoder_threads"] = max(0, int(config.get('decoderThreads', options["decoder_threads"])))
+    options["decoder_hwaccel"] = config.get('decoderHwaccel', options["decoder_hwaccel"])
+    options["trace_path"] = config.get('tracePath', options["trace_path"])
+    options["frame_store"] = str(config.get('frameStore', options["frame_store"])).lower()
+    options["frame_store_codec"] = str(config.get('frameStoreCodec', options["frame_store_codec"])).lower()
+    options["tile_diff"] = bool(config.get('tileDiff', options["tile_diff"]))
+    options["tile_diff_size"] = max(MIN_TILE_SIZE, int(config.get('tileDiffSize', options["tile_diff_size"])))
+    options["tile_diff_overlap"] = max(0, int(config.get('tileDiffOverlap', options["tile_diff_overlap"])))
+    options["tile_diff_threshold"] = max(0.0, float(config.get('tileDiffThreshold', options["tile_diff_threshold"])))
+    options["resolution_plan"] = str(config.get('resolutionPlan', options["resolution_plan"])).lower()
+    options["resolution_skip"] = bool(config.get('resolutionSkip', options["resolution_skip"]))
+    preview = config.get('preview', options["preview"])
+    options["preview"] = ("clip" if preview is True else str(preview).lower()) if preview else None
+    options["preview_start"] = max(0.0, float(config.get('previewStart', options["preview_start"])))
+    options["preview_duration"] = max(0.0, float(config.get('previewDuration', options["preview_duration"])))
+    options["preview_stride"] = max(1, int(config.get('previewStride', options["preview_stride"])))
+    options["disk_budget_mb"] = max(0, int(config.get('diskBudgetMb', options["disk_budget_mb"])))
+    frame_tiling = config.get('frameTiling', options["frame_tiling"])
+    options["frame_tiling"] = ("on" if frame_tiling else "off") if isinstance(frame_tiling, bool) else str(frame_tiling).lower()
+    options["frame_tile_size"] = max(MIN_TILE_SIZE, int(config.get('frameTileSize', options["frame_tile_size"])))
+    options["frame_tile_overlap"] = max(0, int(config.get('frameTileOverlap', options["frame_tile_overlap"])))
+    options["frame_tile_workers"] = max(0, int(config.get('frameTileWorkers', options["frame_tile_workers"])))
+    workers = config.get('distributedWorkers', options["distributed_workers"])
+    options["distributed_workers"] = [workers] if isinstance(workers, str) else list(workers or [])
+    options["distributed_local_workers"] = max(0, int(config.get('distributedLocalWorkers',
+                                                                 options["distributed_local_workers"])))
+    options["distributed_token"] = config.get('distributedToken', options["distributed_token"])
+    options["shard_size"] = min(max(1, int(config.get('shardSize', options["shard_size"]))), DISTRIBUTED_MAX_PAYLOADS)
+    options["assembly_workers"] = max(0, int(config.get('assemblyWorkers', options["assembly_workers"])))
+    options["early_assembly"] = bool(config.get('earlyAssembly', options["early_assembly"]))
+    options["progressive_output"] = bool(config.get('progressiveOutput', options["progressive_output"]))
+    options["progressive_segment_seconds"] = max(1.0, float(config.get('progressiveSegmentSeconds',
+                                                                       options["progressive_segment_seconds"])))
+    return options
+
+def emit_event(entry):
+    """Escreve um evento JSON-lines no stdout (e nos sinks do servidor), marcado com o job atual"""
+    context = JOB_CONTEXT.get()
+    if context is not None and context["id"] is not None:
+        entry["jobId"] = context["id"]
+    line = json.dumps(entry)
+    with EVENT_LOCK:
+        # Uma única escrita por linha: eventos de threads/processos diferentes não se misturam
+        print(line + "\n", end="")
+        for sink in list(EVENT_SINKS):
+            try:
+                sink(line)
+            except OSError:
+                EVENT_SINKS.remove(sink)
+
 def log_message(message, type="log"):
     """Envia uma mensagem para o stdout em formato JSON."""
     log_entry = {"type": type, "message": message, "timestamp": time.time()}
-    print(json.dumps(log_entry))
+    emit_event(log_entry)
 
 def progress_update(progress, message=None, stage=None):
     """Envia uma atualização de progresso para o stdout em formato JSON."""
+    if PROGRESS_MUTED:
+        return
     progress_entry = {"type": "progress", "progress": progress, "message": message, "stage": stage, "timestamp": time.time()}
-    print(json.dumps(progress_entry))
+    emit_event(progress_entry)
+
+def send_metrics(metrics, kind=None):
+    """Envia métricas do job para o stdout em formato JSON.
+
+    `kind` identifica o tipo do evento ("stage", "throughput", "profile", ...).
+    """
+    metrics_entry = {"type": "metrics", "metrics": metrics, "timestamp": time.time()}
+    if kind:
+        metrics_entry["kind"] = kind
+    emit_event(metrics_entry)
+
+# ----------------------------
+# Controle de execução: cancelamento por job e reserva da GPU
+# ----------------------------
+CANCEL_POLL_INTERVAL = 0.5  # segundos entre verificações de cancelamento em esperas longas
+
+class JobCancelled(BaseException):
+    """Job cancelado (comando "cancel" do servidor ou Ctrl+C).
+
+    Deriva de BaseException, como o KeyboardInterrupt, para atravessar os
+    `except Exception` que isolam falhas de frames individuais nos workers.
+    """
+
+# Contextos dos jobs em execução, para o Ctrl+C cancelar todos
+ACTIVE_JOBS = {}
+_active_jobs_lock = threading.Lock()
+
+def create_job_context(job_id=None, gpu_slots=None):
+    """Contexto de execução de um job: id dos eventos, sinal de cancelamento e vagas de GPU"""
+    return {"id": job_id, "cancel": threading.Event(), "gpu": gpu_slots}
+
+@contextlib.contextmanager
+def job_scope(context):
+    """Executa o bloco como o job `context` (eventos marcados com o id, cancelável)"""
+    token = JOB_CONTEXT.set(context)
+    with _active_jobs_lock:
+        ACTIVE_JOBS[id(context)] = context
+    try:
+        yield context
+    finally:
+        with _active_jobs_lock:
+            ACTIVE_JOBS.pop(id(context), None)
+        JOB_CONTEXT.reset(token)
+
+def is_cancelled():
+    context = JOB_CONTEXT.get()
+    return context is not None and context["cancel"].is_set()
+
+def check_cancelled():
+    """Levanta JobCancelled se o job atual foi cancelado"""
+    if is_cancelled():
+        raise JobCancelled("⏹️ Job cancelado")
+
+def bind_job_context(fn):
+    """Envolve `fn` para rodar em outra thread com o contexto (job, profiler) de quem a criou"""
+    context = contextvars.copy_context()
+    def run(*args, **kwargs):
+        # Cada chamada usa sua cópia: um Context não pode estar ativo em duas threads
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+def as_completed_cancellable(futures):
+    """Como as_completed, mas verifica o cancelamento do job enquanto espera"""
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        check_cancelled()
+        yield from done
+
+@contextlib.contextmanager
+def gpu_stage():
+    """Reserva a GPU para uma etapa de upscale.
+
+    No modo servidor só `gpu_slots` jobs fazem upscale ao mesmo tempo; os demais
+    seguem extraindo/codificando em paralelo e esperam aqui pela vez na GPU.
+    """
+    context = JOB_CONTEXT.get()
+    slots = context["gpu"] if context is not None else None
+    if slots is None:
+        yield
+        return
+    if not slots.acquire(blocking=False):
+        log_message("⏳ Aguardando GPU livre (outro job em upscale)...")
+        while not slots.acquire(timeout=CANCEL_POLL_INTERVAL):
+            check_cancelled()
+    try:
+        yield
+    finally:
+        slots.release()
+
+# ----------------------------
+# Telemetria: tempos por etapa, latências, filas e perfil Chrome-trace
+# ----------------------------
+THROUGHPUT_WINDOW = 5.0         # segundos da janela do frames/s móvel
+THROUGHPUT_EMIT_INTERVAL = 0.5  # intervalo mínimo entre eventos de throughput
+TRACE_MAX_EVENTS = 500000       # limite de eventos guardados para o perfil Chrome-trace
+
+# Profiler do job atual (criado por process_video; None desliga a coleta)
+PROFILER = contextvars.ContextVar("profiler", default=None)
+
+def create_profiler(trace_path=None):
+    """Estado da telemetria de um job; com `trace_path` também guarda eventos Chrome-trace"""
+    return {
+        "lock": threading.Lock(),
+        "origin": time.perf_counter(),
+        "stages": {},       # nome → {"wall", "cpu", "child_cpu", "calls"}
+        "latencies": {},    # nome do span → lista de durações (s)
+        "queues": {},       # nome da fila → {"samples", "total", "max"}
+        "spawn": [],        # tempo até o subprocesso iniciar (s)
+        "bytes_written": 0,
+        "trace_path": trace_path,
+        "trace": [] if trace_path else None,
+    }
+
+def _trace_event(profiler, event):
+    if profiler["trace"] is not None and len(profiler["trace"]) < TRACE_MAX_EVENTS:
+        event.setdefault("pid", os.getpid())
+        event.setdefault("tid", threading.get_ident())
+        profiler["trace"].append(event)
+
+def _trace_ts(profiler, t):
+    return (t - profiler["origin"]) * 1e6  # Chrome-trace usa microssegundos
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """Mede tempo de parede e de CPU (do processo e dos subprocessos) de uma etapa do pipeline"""
+    profiler = PROFILER.get()
+    if profiler is None:
+        yield
+        return
+    start, cpu_start, children_start = time.perf_counter(), time.process_time(), os.times()
+    try:
+        yield
+    finally:
+        end, cpu_end, children_end = time.perf_counter(), time.process_time(), os.times()
+        child_cpu = ((children_end.children_user - children_start.children_user)
+                     + (children_end.children_system - children_start.children_system))
+        with profiler["lock"]:
+            stage = profiler["stages"].setdefault(name, {"wall": 0.0, "cpu": 0.0, "child_cpu": 0.0, "calls": 0})
+            stage["wall"] += end - start
+            stage["cpu"] += cpu_end - cpu_start
+            stage["child_cpu"] += child_cpu
+            stage["calls"] += 1
+            _trace_event(profiler, {"name": name, "cat": "stage", "ph": "X",
+                                    "ts": _trace_ts(profiler, start), "dur": (end - start) * 1e6})
+        send_metrics({
+            "stage": name,
+            "wallSeconds": round(end - start, 3),
+            "cpuSeconds": round(cpu_end - cpu_start, 3),
+            "childCpuSeconds": round(child_cpu, 3),
+        }, kind="stage")
+
+@contextlib.contextmanager
+def profile_span(name, cat="frame"):
+    """Mede a latência de uma operação curta (ex.: upscale de um frame) para os percentis"""
+    profiler = PROFILER.get()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with profiler["lock"]:
+            profiler["latencies"].setdefault(name, []).append(end - start)
+            _trace_event(profiler, {"name": name, "cat": cat, "ph": "X",
+                                    "ts": _trace_ts(profiler, start), "dur": (end - start) * 1e6})
+
+def profile_queue(name, depth):
+    """Registra uma amostra da profundidade de uma fila"""
+    profiler = PROFILER.get()
+    if profiler is None:
+        return
+    with profiler["lock"]:
+        stats = profiler["queues"].setdefault(name, {"samples": 0, "total": 0, "max": 0})
+        stats["samples"] += 1
+        stats["total"] += depth
+        stats["max"] = max(stats["max"], depth)
+        _trace_event(profiler, {"name": name, "ph": "C", "ts": _trace_ts(profiler, time.perf_counter()),
+                                "args": {"depth": depth}})
+
+def profile_spawn(seconds):
+    """Registra o custo de criar um subprocesso (fork/exec até o Popen retornar)"""
+    profiler = PROFILER.get()
+    if profiler is not None:
+        with profiler["lock"]:
+            profiler["spawn"].append(seconds)
+
+def profile_bytes(count):
+    """Soma bytes gravados em disco pelo pipeline"""
+    profiler = PROFILER.get()
+    if profiler is not None:
+        with profiler["lock"]:
+            profiler["bytes_written"] += count
+
+def create_throughput(stage, total):
+    """Acompanha frames/s numa janela móvel e calcula o ETA real da etapa"""
+    return {"stage": stage, "total": total, "start": time.perf_counter(), "samples": deque(), "last_emit": 0.0}
+
+def throughput_tick(tracker, done, force=False, **extra):
+    """Atualiza o contador de frames concluídos e emite um evento "throughput" (limitado por intervalo)"""
+    if PROGRESS_MUTED:
+        return
+    now = time.perf_counter()
+    samples = tracker["samples"]
+    samples.append((now, done))
+    while len(samples) > 2 and now - samples[0][0] > THROUGHPUT_WINDOW:
+        samples.popleft()
+    if not force and now - tracker["last_emit"] < THROUGHPUT_EMIT_INTERVAL:
+        return
+    tracker["last_emit"] = now
+    
+    first_time, first_done = samples[0]
+    if now - first_time > 0 and done > first_done:
+        rolling_fps = (done - first_done) / (now - first_time)
+    else:
+        elapsed = now - tracker["start"]
+        rolling_fps = done / elapsed if elapsed > 0 else 0.0
+    remaining = max(tracker["total"] - done, 0)
+    metrics = {
+        "currentStage": tracker["stage"],
+        "framesProcessed": done,
+        "totalFrames": tracker["total"],
+        "currentFps": round(rolling_fps, 2),
+        "etaSeconds": round(remaining / rolling_fps, 1) if rolling_fps > 0 else None,
+    }
+    metrics.update(extra)
+    send_metrics(metrics, kind="throughput")
+
+def _percentiles(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "meanMs": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50Ms": round(pick(0.50) * 1000, 2),
+        "p90Ms": round(pick(0.90) * 1000, 2),
+        "p99Ms": round(pick(0.99) * 1000, 2),
+        "maxMs": round(ordered[-1] * 1000, 2),
+    }
+
+def profile_report():
+    """Emite o resumo do perfil do job e grava o arquivo Chrome-trace, se pedido"""
+    profiler = PROFILER.get()
+    if profiler is None:
+        return
+    with profiler["lock"]:
+        report = {
+            "totalSeconds": round(time.perf_counter() - profiler["origin"], 3),
+            "stages": {name: {"wallSeconds": round(stage["wall"], 3), "cpuSeconds": round(stage["cpu"], 3),
+                              "childCpuSeconds": round(stage["child_cpu"], 3), "calls": stage["calls"]}
+                       for name, stage in profiler["stages"].items()},
+            "latencies": {name: _percentiles(values) for name, values in profiler["latencies"].items() if values},
+            "queues": {name: {"avg": round(stats["total"] / stats["samples"], 2), "max": stats["max"]}
+                       for name, stats in profiler["queues"].items() if stats["samples"]},
+            "spawnOverhead": _percentiles(profiler["spawn"]) if profiler["spawn"] else None,
+            "bytesWritten": profiler["bytes_written"],
+        }
+        trace = list(profiler["trace"]) if profiler["trace"] is not None else None
+    send_metrics(report, kind="profile")
+    
+    if trace is not None:
+        try:
+            trace_dir = os.path.dirname(os.path.abspath(profiler["trace_path"]))
+            os.makedirs(trace_dir, exist_ok=True)
+            with open(profiler["trace_path"], "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+            log_message(f"🧭 Perfil Chrome-trace salvo em {profiler['trace_path']} ({len(trace)} eventos)")
+        except OSError as e:
+            log_message(f"⚠️ Não foi possível salvar o perfil: {e}", "warning")
 
 def setup_directories():
     """Cria os diretórios necessários"""
@@ -48,8 +490,305 @@ def clean_temp_folder(tmp_folder):
         shutil.rmtree(tmp_path)
     os.makedirs(tmp_path, exist_ok=True)
 
-def get_video_info(input_path):
-    """Obtém informações do vídeo"""
+# ----------------------------
+# Jobs retomáveis (diretório de trabalho + manifesto)
+# ----------------------------
+JOBS_FOLDER = "jobs"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_SAVE_INTERVAL = 2.0  # segundos entre gravações periódicas do manifesto
+
+def compute_job_id(input_path, job_settings):
+    """Gera o id do job a partir do arquivo de entrada (caminho, tamanho, mtime, início) e das configurações"""
+    stat = os.stat(input_path)
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(input_path).encode("utf-8"))
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    with open(input_path, "rb") as f:
+        digest.update(f.read(1024 * 1024))
+    digest.update(json.dumps(job_settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def save_manifest(job, force=True):
+    """Grava o manifesto de forma atômica (arquivo temporário + replace)"""
+    now = time.time()
+    if not force and now - job["last_save"] < MANIFEST_SAVE_INTERVAL:
+        return
+    manifest = job["manifest"]
+    manifest["updated_at"] = now
+    manifest_path = os.path.join(job["dir"], MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    job["last_save"] = now
+
+def load_manifest(job_dir):
+    """Lê o manifesto de um job; retorna None se não existir ou estiver corrompido"""
+    manifest_path = os.path.join(job_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def open_job(input_path, job_settings, resume=True):
+    """Abre (ou cria) o diretório de trabalho do job e seu manifesto"""
+    job_id = compute_job_id(input_path, job_settings)
+    tmp_folder = os.path.join(JOBS_FOLDER, job_id)
+    job_dir = os.path.join(BASE_DIR, tmp_folder)
+    
+    manifest = load_manifest(job_dir) if resume else None
+    if manifest is not None and manifest.get("status") != "done":
+        log_message(f"♻️ Retomando job {job_id}: {manifest.get('extracted_frames', 0)} frames extraídos, "
+                    f"{len(manifest.get('upscaled', []))} com upscale")
+    else:
+        clean_temp_folder(tmp_folder)
+        manifest = {
+            "job_id": job_id,
+            "input": os.path.abspath(input_path),
+            "settings": job_settings,
+            "status": "running",
+            "created_at": time.time(),
+            "extracted_frames": 0,
+            "extraction_complete": False,
+            "upscaled": [],
+            "encoded": False,
+            "segments_split": False,
+            "segments_done": [],
+            "duplicates": {},
+        }
+    
+    manifest["status"] = "running"
+    job = {"id": job_id, "dir": job_dir, "tmp_folder": tmp_folder, "manifest": manifest, "last_save": 0.0}
+    save_manifest(job)
+    return job
+
+def prune_unrecorded_frames(job, store=None):
+    """Remove frames com upscale que não constam no manifesto (podem estar incompletos).
+
+    Com `store` (frame store dos frames com upscale) os slots não confirmados são liberados.
+    """
+    recorded = set(job["manifest"]["upscaled"])
+    removed = 0
+    if store is not None:
+        for idx in frame_store_indices(store):
+            if idx not in recorded:
+                frame_store_clear(store, idx)
+                removed += 1
+    for f in os.listdir(job["dir"]):
+        if f.startswith("frame_up_") and f.endswith(".png"):
+            if int(f[len("frame_up_"):-len(".png")]) not in recorded:
+                os.remove(os.path.join(job["dir"], f))
+                removed += 1
+    if removed:
+        log_message(f"🧽 {removed} frames com upscale não confirmados serão refeitos")
+
+def cleanup_jobs(retention_hours, stale_hours):
+    """Política de retenção: remove jobs concluídos e jobs incompletos abandonados"""
+    jobs_root = os.path.join(BASE_DIR, JOBS_FOLDER)
+    if not os.path.isdir(jobs_root):
+        return
+    now = time.time()
+    for job_id in os.listdir(jobs_root):
+        job_dir = os.path.join(jobs_root, job_id)
+        if not os.path.isdir(job_dir):
+            continue
+        manifest = load_manifest(job_dir)
+        updated_at = manifest.get("updated_at", 0) if manifest else os.path.getmtime(job_dir)
+        age_hours = (now - updated_at) / 3600
+        if manifest and manifest.get("status") == "done":
+            expired = age_hours >= retention_hours
+        else:
+            expired = age_hours >= stale_hours
+        if expired:
+            log_message(f"🧹 Removendo job {job_id} (retenção)")
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+# ----------------------------
+# Frame store: frames crus de tamanho fixo em um único arquivo mapeado em memória
+# ----------------------------
+FRAME_STORE_CODECS = {"raw": 0, "zlib": 1}
+FRAME_STORE_INDEX_DTYPE = np.dtype([("length", "<i8"), ("codec", "u1")])
+FRAME_STORE_GROWTH = 1.25     # fator de crescimento quando a contagem do container é menor que a real
+FRAME_STORE_ZLIB_LEVEL = 1    # nível mais rápido do zlib: o objetivo é economizar disco, não tamanho máximo
+
+def open_frame_store(path, shape, capacity, codec="raw"):
+    """Abre (ou cria) um frame store em `path`.raw/.idx/.json.
+
+    Cada frame ocupa um slot de tamanho fixo (altura × largura × 3 bytes) em um
+    arquivo pré-dimensionado; o índice guarda, por slot, quantos bytes foram
+    gravados (0 = vazio) e o codec usado. Um store existente com o mesmo formato
+    é reaproveitado (retomada de jobs); com formato diferente é recriado.
+    O arquivo é criado esparso: slots vazios ou comprimidos com zlib só ocupam
+    no disco os bytes realmente gravados (em sistemas de arquivos com suporte).
+    """
+    if codec not in FRAME_STORE_CODECS:
+        raise ValueError(f"❌ Codec do frame store desconhecido: {codec}")
+    shape = tuple(int(v) for v in shape)
+    meta_path = path + ".json"
+    meta = {"shape": list(shape), "capacity": max(1, int(capacity)), "codec": codec}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = None
+    reuse = (existing is not None and existing.get("shape") == meta["shape"]
+             and os.path.exists(path + ".raw") and os.path.exists(path + ".idx"))
+    if reuse:
+        meta["capacity"] = existing["capacity"]
+    
+    store = {
+        "path": path,
+        "shape": shape,
+        "slot_bytes": int(np.prod(shape)),
+        "capacity": 0,
+        "codec": codec,
+        "lock": threading.Lock(),
+        "data": None,
+        "index": None,
+    }
+    if not reuse:
+        for suffix in (".raw", ".idx"):
+            with open(path + suffix, "wb"):
+                pass
+    _frame_store_map(store, meta["capacity"])
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return store
+
+def _frame_store_map(store, capacity):
+    """(Re)mapeia dados e índice com `capacity` slots; views já entregues continuam válidas"""
+    path = store["path"]
+    with open(path + ".raw", "r+b") as f:
+        f.truncate(capacity * store["slot_bytes"])
+    with open(path + ".idx", "r+b") as f:
+        f.truncate(capacity * FRAME_STORE_INDEX_DTYPE.itemsize)
+    if store["data"] is not None:
+        store["data"].flush()
+        store["index"].flush()
+    store["data"] = np.memmap(path + ".raw", dtype=np.uint8, mode="r+", shape=(capacity, store["slot_bytes"]))
+    store["index"] = np.memmap(path + ".idx", dtype=FRAME_STORE_INDEX_DTYPE, mode="r+", shape=(capacity,))
+    store["capacity"] = capacity
+
+def _frame_store_ensure(store, idx):
+    if idx < store["capacity"]:
+        return
+    with store["lock"]:
+        if idx >= store["capacity"]:
+            capacity = max(idx + 1, int(store["capacity"] * FRAME_STORE_GROWTH))
+            _frame_store_map(store, capacity)
+            with open(store["path"] + ".json", "w", encoding="utf-8") as f:
+                json.dump({"shape": list(store["shape"]), "capacity": capacity, "codec": store["codec"]}, f)
+
+def frame_store_slot(store, idx):
+    """View gravável (sem cópia) do slot `idx` no formato do frame"""
+    _frame_store_ensure(store, idx)
+    return store["data"][idx].reshape(store["shape"])
+
+def frame_store_write(store, idx, frame):
+    """Grava um frame BGR no slot `idx` (redimensiona se o formato não bater); retorna os bytes gravados"""
+    if frame.shape != store["shape"]:
+        frame = cv2.resize(frame, (store["shape"][1], store["shape"][0]), interpolation=cv2.INTER_LANCZOS4)
+    _frame_store_ensure(store, idx)
+    data = store["data"]
+    codec = FRAME_STORE_CODECS["raw"]
+    length = store["slot_bytes"]
+    if store["codec"] == "zlib":
+        packed = zlib.compress(np.ascontiguousarray(frame), FRAME_STORE_ZLIB_LEVEL)
+        # Frames sem redundância podem crescer com a compressão: nesse caso o slot fica cru
+        if len(packed) < length:
+            codec, length = FRAME_STORE_CODECS["zlib"], len(packed)
+            data[idx, :length] = np.frombuffer(packed, dtype=np.uint8)
+    if codec == FRAME_STORE_CODECS["raw"]:
+        data[idx].reshape(store["shape"])[...] = frame
+    # O índice é atualizado por último: um slot só conta como gravado depois dos dados
+    store["index"][idx] = (length, codec)
+    return length
+
+def frame_store_read(store, idx):
+    """Lê o frame do slot `idx`: view sem cópia (cru) ou array decodificado (zlib); None se vazio"""
+    if idx >= store["capacity"]:
+        return None
+    length, codec = store["index"][idx]
+    if length <= 0:
+        return None
+    if codec == FRAME_STORE_CODECS["zlib"]:
+        raw = zlib.decompress(store["data"][idx, :length])
+        return np.frombuffer(raw, dtype=np.uint8).reshape(store["shape"])
+    return store["data"][idx].reshape(store["shape"])
+
+def frame_store_has(store, idx):
+    return idx < store["capacity"] and store["index"][idx]["length"] > 0
+
+def frame_store_clear(store, idx):
+    if idx < store["capacity"]:
+        store["index"][idx] = (0, 0)
+
+def frame_store_indices(store):
+    """Índices dos slots gravados, em ordem"""
+    return [int(idx) for idx in np.flatnonzero(store["index"]["length"] > 0)]
+
+def frame_store_disk_usage(store):
+    """(bytes lógicos dos frames gravados, bytes realmente ocupados no disco)"""
+    logical = int(store["index"]["length"].sum())
+    try:
+        stat = os.stat(store["path"] + ".raw")
+        allocated = stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+    except OSError:
+        allocated = 0
+    return logical, allocated
+
+def close_frame_store(store):
+    """Grava as páginas pendentes no disco e libera os mapeamentos"""
+    if store["data"] is None:
+        return
+    store["data"].flush()
+    store["index"].flush()
+    store["data"] = None
+    store["index"] = None
+    store["capacity"] = 0
+
+def open_job_frame_stores(job_dir, width, height, scale, capacity, codec="raw"):
+    """Frame stores de um job: frames extraídos (origem) e frames com upscale (destino)"""
+    source = open_frame_store(os.path.join(job_dir, "frames"), (height, width, 3), capacity, codec)
+    target = open_frame_store(os.path.join(job_dir, "frames_up"), (height * scale, width * scale, 3), capacity, codec)
+    log_message(f"🗄️ Frame store {codec}: {capacity} slots de {width}x{height} → {width * scale}x{height * scale}")
+    return source, target
+
+def report_frame_store_metrics(stores):
+    """Resumo do uso de disco dos frame stores do job"""
+    logical, allocated = 0, 0
+    for store in stores:
+        store_logical, store_allocated = frame_store_disk_usage(store)
+        logical += store_logical
+        allocated += store_allocated
+    send_metrics({"frameStoreBytes": logical, "frameStoreDiskBytes": allocated})
+    log_message(f"🗄️ Frame store: {logical / (1024 * 1024):.1f} MB gravados, "
+                f"{allocated / (1024 * 1024):.1f} MB ocupados no disco")
+
+def probe_video(input_path):
+    """Metadados do ffprobe (ver media_probe, com cache em disco); None sem ffprobe"""
+    global PROBE_WARNED
+    try:
+        return probe_media(input_path)
+    except ProbeError as e:
+        if not PROBE_WARNED:
+            PROBE_WARNED = True
+            log_message(f"⚠️ Probe indisponível, usando OpenCV para os metadados: {e}", "warning")
+        return None
+
+def get_video_info(input_path, exact_count=False):
+    """Obtém informações do vídeo.
+
+    Com ffprobe os valores vêm de probe_video (contagem exata pelos pacotes).
+    Sem ele, o OpenCV lê o container e, com `exact_count`, os frames são contados
+    pelo demux do FFmpeg (ver count_video_frames): a contagem do container costuma
+    errar em VFR/B-frames.
+    """
+    probe = probe_video(input_path)
+    if probe is not None and probe["frame_count"] and probe["fps"]:
+        return probe["fps"], probe["frame_count"], probe["display_width"], probe["display_height"]
+
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
         raise ValueError("Não foi possível abrir o vídeo")
@@ -60,8 +799,29 @@ def get_video_info(input_path):
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     cap.release()
     
+    if exact_count:
+        counted = count_video_frames(input_path)
+        if counted and counted != frame_count:
+            log_message(f"🔢 Contagem do container ({frame_count}) corrigida para {counted} frames")
+            frame_count = counted
+    
     return fps, frame_count, width, height
 
+def count_video_frames(input_path):
+    """Conta os pacotes de vídeo com o FFmpeg em stream copy (só demux, sem decodificar); 0 se falhar"""
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+           "-i", input_path, "-map", "0:v:0", "-c", "copy", "-f", "null", "-"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    except OSError:
+        return 0
+    frames = 0
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("=")
+        if key == "frame" and value.strip().isdigit():
+            frames = int(value)
+    return frames if result.returncode == 0 else 0
+
 def extract_audio(input_video, output_audio):
     """Extrai áudio do vídeo usando FFmpeg"""
     try:
@@ -72,7 +832,8 @@ def extract_audio(input_video, output_audio):
             output_audio,
             "-y"
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        # Sem timeout fixo: é só stream copy, mas entradas longas levam mais de 30 s
+        result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode == 0:
             log_message("✅ Áudio extraído com sucesso")
             return True
@@ -108,7 +869,7 @@ def add_audio_to_video(video_path, audio_path, output_path):
         ]
         
         log_message(f"🔊 Comando FFmpeg: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        result = subprocess.run(cmd, capture_output=True, text=True)
         
         if result.returncode == 0:
             log_message("✅ Áudio adicionado com sucesso!")
@@ -120,30 +881,651 @@ def add_audio_to_video(video_path, audio_path, output_path):
         log_message(f"❌ Erro ao adicionar áudio: {e}", "error")
         return False
 
-def extract_frames(input_path, tmp_folder):
-    """Extrai frames do vídeo"""
-    cap = cv2.VideoCapture(input_path)
+# ----------------------------
+# Deduplicação de frames
+# ----------------------------
+DEDUP_THUMB_SIZE = (64, 36)  # miniatura em tons de cinza para a comparação perceptual
+
+def create_dedup_state(threshold=0.0, consecutive_only=False):
+    """Cria o estado da deduplicação.
+
+    Com `consecutive_only` um frame só é considerado duplicado do último frame
+    único (necessário no modo streaming, que não guarda frames antigos).
+    """
+    return {
+        "threshold": threshold,
+        "consecutive_only": consecutive_only,
+        "hashes": {},
+        "last_unique": None,
+        "last_hash": None,
+        "last_thumb": None,
+        "duplicates": {},
+    }
+
+def find_duplicate_frame(frame, frame_idx, dedup):
+    """Retorna o índice do frame de origem se `frame` for duplicado; senão registra o frame como único"""
+    digest = hashlib.blake2b(frame.tobytes(), digest_size=16).digest()
+    if dedup["consecutive_only"]:
+        source = dedup["last_unique"] if digest == dedup["last_hash"] else None
+    else:
+        source = dedup["hashes"].get(digest)
+    
+    thumb = None
+    if dedup["threshold"] > 0:
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), DEDUP_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        if source is None and dedup["last_thumb"] is not None:
+            if cv2.absdiff(thumb, dedup["last_thumb"]).mean() <= dedup["threshold"]:
+                source = dedup["last_unique"]
+    
+    if source is not None:
+        dedup["duplicates"][frame_idx] = source
+        return source
+    
+    if not dedup["consecutive_only"]:
+        dedup["hashes"][digest] = frame_idx
+    dedup["last_unique"] = frame_idx
+    dedup["last_hash"] = digest
+    dedup["last_thumb"] = thumb
+    return None
+
+def report_dedup_metrics(total_frames, duplicate_frames):
+    """Envia a taxa de deduplicação no evento de métricas"""
+    dedup_ratio = duplicate_frames / total_frames if total_frames else 0.0
+    log_message(f"🪞 Deduplicação: {duplicate_frames}/{total_frames} frames duplicados ({dedup_ratio:.1%})")
+    send_metrics({
+        "uniqueFrames": total_frames - duplicate_frames,
+        "duplicateFrames": duplicate_frames,
+        "dedupRatio": dedup_ratio,
+    })
+
+# ----------------------------
+# Encoder FFmpeg (pipe de frames + áudio no mesmo passo)
+# ----------------------------
+# Codecs de áudio que podem ir por stream copy para dentro de um .mp4
+MP4_AUDIO_CODECS = {"aac", "mp3", "ac3", "eac3", "alac", "opus", "flac"}
+
+def get_encoder_settings(options):
+    """Configurações do encoder FFmpeg; None quando o job deve usar o cv2.VideoWriter (mp4v)"""
+    if options["encoder"] != "ffmpeg":
+        return None
+    if shutil.which("ffmpeg") is None:
+        log_message("⚠️ FFmpeg não encontrado no PATH, usando encoder OpenCV (mp4v)", "warning")
+        return None
+    return {
+        "codec": options["video_codec"],
+        "crf": options["crf"],
+        "preset": options["preset"],
+        "threads": options["encoder_threads"],
+    }
+
+def probe_audio_codec(input_path):
+    """Codec da primeira trilha de áudio (None se não houver ou sem ffprobe)"""
+    probe = probe_video(input_path)
+    if probe is None or not probe["audio"]:
+        return None
+    return probe["audio"][0]["codec"]
+
+def build_audio_args(input_path):
+    """Argumentos de áudio: stream copy quando o codec cabe no MP4, senão AAC"""
+    codec = probe_audio_codec(input_path)
+    if codec is None or codec in MP4_AUDIO_CODECS:
+        return ["-c:a", "copy"]
+    log_message(f"🔊 Áudio {codec} não suportado em MP4, convertendo para AAC")
+    return ["-c:a", "aac", "-b:a", "192k"]
+
+def build_video_codec_args(encoder):
+    """Argumentos de codec/qualidade/preset/threads do encoder FFmpeg"""
+    codec = encoder["codec"]
+    args = ["-c:v", codec, "-preset", str(encoder["preset"]), "-pix_fmt", "yuv420p"]
+    # Encoders de hardware NVENC usam -cq no lugar de -crf
+    args += ["-cq" if codec.endswith("_nvenc") else "-crf", str(encoder["crf"])]
+    if encoder["threads"]:
+        args += ["-threads", str(encoder["threads"])]
+    if codec in ("libx265", "hevc_nvenc"):
+        args += ["-tag:v", "hvc1"]  # Compatibilidade com players da Apple
+    return args
+
+# Saída progressiva: arquivos gravados pelo muxer HLS do FFmpeg no diretório <saída>_live
+PROGRESSIVE_PLAYLIST = "playlist.m3u8"
+PROGRESSIVE_INIT = "init.mp4"
+PROGRESSIVE_REPORT_INTERVAL = 2.0  # segundos entre verificações da playlist durante o encode
+
+def progressive_output_dir(output_path):
+    """Diretório da saída progressiva de `output_path` (video.mp4 → video_live/)"""
+    return os.path.splitext(output_path)[0] + "_live"
+
+def read_progressive_playlist(playlist_path):
+    """(segmentos em ordem, segundos já tocáveis, playlist fechada) da playlist HLS"""
+    segments, seconds, closed = [], 0.0, False
+    try:
+        with open(playlist_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return segments, seconds, closed
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                seconds += float(line[len("#EXTINF:"):].split(",")[0])
+            except ValueError:
+                pass
+        elif line == "#EXT-X-ENDLIST":
+            closed = True
+        elif line and not line.startswith("#"):
+            segments.append(line)
+    return segments, seconds, closed
+
+def clear_progressive_output(live_dir):
+    """Remove só os arquivos da saída progressiva (o diretório fica se tiver outros arquivos)"""
+    if not os.path.isdir(live_dir):
+        return
+    for name in os.listdir(live_dir):
+        if name in (PROGRESSIVE_PLAYLIST, PROGRESSIVE_INIT) or (
+                name.startswith("segment_") and name.endswith((".m4s", ".tmp"))) or name.endswith(".m3u8.tmp"):
+            os.remove(os.path.join(live_dir, name))
+    with contextlib.suppress(OSError):
+        os.rmdir(live_dir)
+
+class FFmpegVideoWriter:
+    """Encoder via pipe do FFmpeg com a mesma interface do cv2.VideoWriter (write/release/isOpened).
+
+    Os frames BGR vão crus pelo stdin; com `audio_source` o áudio do arquivo
+    original é multiplexado no mesmo passo. Com `output_size` diferente de `size`
+    o redimensionamento final é feito pelo filtro scale do FFmpeg (multithread).
+    O arquivo é gravado com sufixo .partial e só recebe o nome final quando o
+    FFmpeg termina com sucesso.
+    Com `encoder["progressive"]` o FFmpeg grava segmentos fMP4 e uma playlist HLS
+    que cresce durante o encode (ver get_encoder_settings); no release os
+    segmentos são concatenados e remultiplexados sem reencode no arquivo final.
+    """
+
+    def __init__(self, output_path, fps, size, encoder, audio_source=None, output_size=None):
+        width, height = size
+        self.output_path = output_path
+        self.partial_path = output_path + ".partial"
+        self.progressive = encoder.get("progressive")
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_source:
+            cmd += ["-i", audio_source]
+        cmd += ["-map", "0:v:0"]
+        if audio_source:
+            cmd += ["-map", "1:a:0?"] + build_audio_args(audio_source) + ["-shortest"]
+        filters = []
+        if output_size and tuple(output_size) != (width, height):
+            filters.append(f"scale={output_size[0]}:{output_size[1]}:flags=lanczos")
+            width, height = output_size
+        if width % 2 or height % 2:
+            # yuv420p exige dimensões pares
+            filters.append("pad=ceil(iw/2)*2:ceil(ih/2)*2")
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += build_video_codec_args(encoder)
+        if self.progressive:
+            cmd += self._progressive_args()
+        else:
+            cmd += ["-movflags", "+faststart", "-f", "mp4", self.partial_path]
+        
+        log_message(f"🎬 Encoder FFmpeg: {' '.join(cmd)}")
+        self.stderr_lines = []
+        try:
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.PIPE)
+        except OSError as e:
+            log_message(f"❌ Não foi possível iniciar o FFmpeg: {e}", "error")
+            self.process = None
+            return
+        # Drenar o stderr em paralelo para o pipe nunca encher e travar o encoder
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.stderr_thread.start()
+
+    def _progressive_args(self):
+        """Muxer HLS com segmentos fMP4; keyframes forçados a cada segmento para os cortes caírem no tempo"""
+        live_dir = self.progressive["dir"]
+        seconds = self.progressive["segment_seconds"]
+        clear_progressive_output(live_dir)
+        os.makedirs(live_dir, exist_ok=True)
+        self.playlist_path = os.path.join(live_dir, PROGRESSIVE_PLAYLIST)
+        self.progressive_segments = 0
+        self.progressive_checked = time.monotonic()
+        log_message(f"📡 Saída progressiva: {self.playlist_path} (segmentos de {seconds:g}s)")
+        send_metrics({"playlistPath": self.playlist_path, "segments": 0, "playableSeconds": 0.0,
+                      "finished": False}, kind="progressive")
+        return [
+            "-force_key_frames", f"expr:gte(t,n_forced*{seconds:g})",
+            "-f", "hls", "-hls_time", f"{seconds:g}", "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", PROGRESSIVE_INIT,
+            "-hls_segment_filename", os.path.join(live_dir, "segment_%05d.m4s"),
+            self.playlist_path,
+        ]
+
+    def _report_progressive(self, finished=False):
+        """Avisa (métricas "progressive") quando a playlist ganha segmentos novos"""
+        segments, seconds, _ = read_progressive_playlist(self.playlist_path)
+        if len(segments) == self.progressive_segments and not finished:
+            return
+        self.progressive_segments = len(segments)
+        send_metrics({"playlistPath": self.playlist_path, "segments": len(segments),
+                      "playableSeconds": round(seconds, 3), "finished": finished}, kind="progressive")
+
+    def _finalize_progressive(self):
+        """Arquivo final = init + segmentos (um MP4 fragmentado válido), remultiplexado com faststart"""
+        live_dir = self.progressive["dir"]
+        segments, _, closed = read_progressive_playlist(self.playlist_path)
+        if not closed or not segments:
+            raise ValueError(f"❌ Playlist progressiva incompleta: {self.playlist_path}")
+        self._report_progressive(finished=True)
+        fragmented_path = self.partial_path + ".frag.mp4"
+        try:
+            with open(fragmented_path, "wb") as target:
+                for name in [PROGRESSIVE_INIT] + segments:
+                    with open(os.path.join(live_dir, name), "rb") as source:
+                        shutil.copyfileobj(source, target, 1024 * 1024)
+            cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", fragmented_path, "-map", "0", "-c", "copy",
+                   "-movflags", "+faststart", "-f", "mp4", self.partial_path]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                if os.path.exists(self.partial_path):
+                    os.remove(self.partial_path)
+                raise ValueError(f"❌ Falha ao concatenar a saída progressiva: {result.stderr.strip()}")
+        finally:
+            if os.path.exists(fragmented_path):
+                os.remove(fragmented_path)
+        log_message(f"🧷 {len(segments)} segmentos progressivos concatenados em {self.output_path}")
+        clear_progressive_output(live_dir)
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            self.stderr_lines.append(line.decode("utf-8", errors="replace").rstrip())
+            del self.stderr_lines[:-20]
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(memoryview(frame).cast("B") if frame.flags["C_CONTIGUOUS"] else frame.tobytes())
+        except (BrokenPipeError, OSError):
+            self.process.wait()
+            self.stderr_thread.join(timeout=5)
+            raise ValueError(f"❌ FFmpeg encerrou durante o encode: {' | '.join(self.stderr_lines)}")
+        if self.progressive and time.monotonic() - self.progressive_checked >= PROGRESSIVE_REPORT_INTERVAL:
+            self.progressive_checked = time.monotonic()
+            self._report_progressive()
+
+    def release(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        returncode = self.process.wait()
+        self.stderr_thread.join(timeout=5)
+        self.process = None
+        if returncode != 0:
+            if os.path.exists(self.partial_path):
+                os.remove(self.partial_path)
+            if self.progressive:
+                clear_progressive_output(self.progressive["dir"])
+            raise ValueError(f"❌ FFmpeg falhou (código {returncode}): {' | '.join(self.stderr_lines)}")
+        if self.progressive:
+            self._finalize_progressive()
+        os.replace(self.partial_path, self.output_path)
+
+    def abort(self):
+        """Encerra o FFmpeg sem finalizar o arquivo (erro ou cancelamento no meio do encode)"""
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.wait()
+        self.stderr_thread.join(timeout=5)
+        self.process = None
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+        if self.progressive:
+            clear_progressive_output(self.progressive["dir"])
+
+def close_video_writer(out, completed=True):
+    """Finaliza o encoder; se o encode não terminou, descarta o arquivo parcial do FFmpeg"""
+    if completed or not hasattr(out, "abort"):
+        out.release()
+    else:
+        out.abort()
+
+def open_video_writer(output_path, fps, size, encoder=None, audio_source=None, output_size=None):
+    """Abre o encoder: FFmpeg (com áudio e resize final opcionais no mesmo passo) ou cv2.VideoWriter mp4v.
+
+    O cv2.VideoWriter não redimensiona: nele `size` já deve ser o tamanho final.
+    """
+    if encoder is not None:
+        return FFmpegVideoWriter(output_path, fps, size, encoder, audio_source, output_size)
+    return cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, output_size or size)
+
+def output_video_target(output_path, encoder=None, audio_source=None):
+    """Retorna (vídeo gravado pelo encoder, áudio multiplexado no mesmo passo).
+
+    Só o encoder FFmpeg multiplexa o áudio: nesse caso o vídeo já é `output_path`;
+    senão é o *_no_audio.mp4 para o mux de áudio posterior.
+    """
+    if encoder is not None and audio_source:
+        return output_path, audio_source
+    return output_path.replace(".mp4", "_no_audio.mp4"), None
+
+def open_output_writer(video_path, fps, frame, target_width=None, target_height=None, encoder=None,
+                       audio_source=None):
+    """Abre o encoder do vídeo final a partir do primeiro frame com upscale.
+
+    Com o FFmpeg o resize final até o alvo fica no filtro scale dele; no OpenCV,
+    frame a frame. Retorna (writer, frame_size): frames de outro tamanho devem
+    ser redimensionados para `frame_size` antes da escrita.
+    """
+    height, width = frame.shape[:2]
+    final_width = target_width or width
+    final_height = target_height or height
+    frame_size = (width, height) if encoder is not None else (final_width, final_height)
+    log_message(f"🎬 Criando vídeo: {video_path}")
+    log_message(f"📏 Resolução: {final_width}x{final_height}")
+    out = open_video_writer(video_path, fps, frame_size, encoder, audio_source, (final_width, final_height))
+    if not out.isOpened():
+        raise ValueError(f"❌ Não foi possível criar o vídeo: {video_path}")
+    return out, frame_size
+
+def get_decoder_settings(options):
+    """Configurações do decoder FFmpeg; None quando o job deve usar o cv2.VideoCapture"""
+    if options["decoder"] != "ffmpeg":
+        return None
+    if shutil.which("ffmpeg") is None:
+        log_message("⚠️ FFmpeg não encontrado no PATH, usando decoder OpenCV", "warning")
+        return None
+    return {"threads": options["decoder_threads"], "hwaccel": options["decoder_hwaccel"]}
+
+class FFmpegVideoReader:
+    """Decoder via pipe do FFmpeg com a mesma interface do cv2.VideoCapture (read/grab/get/release/isOpened).
+
+    O FFmpeg decodifica com várias threads (e aceleração de hardware opcional) e
+    entrega frames BGR crus pelo stdout, sem duplicar nem descartar frames de
+    vídeos VFR. O filtro showinfo informa pelo stderr o timestamp de cada frame,
+    disponível em get(cv2.CAP_PROP_POS_MSEC) como no OpenCV. Com `output_size`
+    o redimensionamento também é feito pelo FFmpeg.
+    """
+
+    def __init__(self, input_path, decoder, output_size=None):
+        self.fps, self.frame_count, width, height = get_video_info(input_path)
+        self.width, self.height = output_size or (width, height)
+        self.frame_bytes = self.width * self.height * 3
+        self.position_ms = 0.0
+        self.frames_read = 0
+        self.timestamps = queue.Queue()
+        self.timestamps_missing = False
+        self.stderr_lines = deque(maxlen=20)
+        
+        cmd = ["ffmpeg", "-hide_banner", "-nostats", "-loglevel", "info"]
+        if decoder.get("hwaccel"):
+            cmd += ["-hwaccel", str(decoder["hwaccel"])]
+        if decoder.get("threads"):
+            cmd += ["-threads", str(decoder["threads"])]
+        filters = ["showinfo=checksum=0"]
+        if (self.width, self.height) != (width, height):
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+        cmd += ["-i", input_path, "-map", "0:v:0", "-fps_mode", "passthrough", "-vf", ",".join(filters),
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        
+        log_message(f"🎞️ Decoder FFmpeg: {' '.join(cmd)}")
+        try:
+            self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE)
+        except OSError as e:
+            log_message(f"❌ Não foi possível iniciar o FFmpeg: {e}", "error")
+            self.process = None
+            return
+        self.stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self.stderr_thread.start()
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            line = line.decode("utf-8", errors="replace").rstrip()
+            if "showinfo" in line and " pts_time:" in line:
+                value = line.split(" pts_time:", 1)[1].split()[0]
+                try:
+                    self.timestamps.put(float(value))
+                except ValueError:
+                    self.timestamps.put(None)
+            elif line:
+                self.stderr_lines.append(line)
+
+    def isOpened(self):
+        return self.process is not None
+
+    def _read_into(self, buffer):
+        view = memoryview(buffer)
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if filled < self.frame_bytes:
+            if self.frames_read == 0 and self.process.wait() != 0:
+                log_message(f"⚠️ FFmpeg não entregou frames: {' | '.join(self.stderr_lines)}", "warning")
+            return False
+        
+        # O timestamp do frame chega pelo stderr; sem ele, avança um intervalo nominal
+        timestamp = None
+        if not self.timestamps_missing:
+            try:
+                timestamp = self.timestamps.get(timeout=5)
+            except queue.Empty:
+                log_message("⚠️ FFmpeg não informou timestamps, usando o fps nominal", "warning")
+                self.timestamps_missing = True
+        if timestamp is None:
+            timestamp = self.position_ms / 1000 + (1 / self.fps if self.fps and self.frames_read else 0)
+        self.position_ms = timestamp * 1000
+        self.frames_read += 1
+        return True
+
+    def read(self):
+        if self.process is None:
+            return False, None
+        buffer = bytearray(self.frame_bytes)
+        if not self._read_into(buffer):
+            return False, None
+        return True, np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def grab(self):
+        if self.process is None:
+            return False
+        if not hasattr(self, "_scratch"):
+            self._scratch = bytearray(self.frame_bytes)
+        return self._read_into(self._scratch)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.position_ms
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def release(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.stderr_thread.join(timeout=5)
+        self.process = None
+
+def open_video_reader(input_path, decoder=None, output_size=None):
+    """Abre o decoder: FFmpeg multithread (com resize opcional) ou cv2.VideoCapture.
+
+    O cv2.VideoCapture não redimensiona: com ele quem lê faz o resize para `output_size`.
+    """
+    if decoder is not None:
+        return FFmpegVideoReader(input_path, decoder, output_size)
+    return cv2.VideoCapture(input_path)
+
+def create_frame_timing(fps):
+    """Estado para posicionar frames pelo timestamp em uma saída de fps constante"""
+    return {"fps": fps, "origin": None, "written": 0, "last": None, "repeated": 0, "dropped": 0}
+
+def write_timed_frame(out, frame, timestamp, timing):
+    """Escreve o frame no instante do seu timestamp (origem = primeiro frame).
+
+    A saída continua CFR: o pipe rawvideo do encoder não carrega timestamps, então
+    o tempo do original é reproduzido na grade de 1/fps. Intervalos maiores que
+    1/fps (VFR) repetem o frame anterior e frames que caem no mesmo instante de
+    saída são descartados, como o -fps_mode cfr do FFmpeg: o vídeo segue o tempo
+    real do original (com precisão de meio frame) e o áudio continua sincronizado,
+    mas a cadência variável em si não é preservada.
+    Sem timestamp (ou sem `timing`) o frame é simplesmente escrito.
+    """
+    if timing is None or timestamp is None:
+        out.write(frame)
+        return
+    if timing["origin"] is None:
+        timing["origin"] = timestamp
+    slot = round((timestamp - timing["origin"]) * timing["fps"])
+    if slot < timing["written"]:
+        timing["dropped"] += 1
+        return
+    while timing["written"] < slot and timing["last"] is not None:
+        out.write(timing["last"])
+        timing["written"] += 1
+        timing["repeated"] += 1
+    out.write(frame)
+    timing["written"] += 1
+    timing["last"] = frame
+
+def report_frame_timing(timing):
+    if timing is not None and (timing["repeated"] or timing["dropped"]):
+        log_message(f"⏱️ Timestamps VFR: {timing['repeated']} frames repetidos e {timing['dropped']} "
+                    f"descartados para manter o sincronismo a {timing['fps']:.3f} fps")
+
+def save_job_timestamps(job, timestamps):
+    """Timestamps dos frames extraídos (segundos), em um arquivo à parte do manifesto"""
+    path = os.path.join(job["dir"], "timestamps.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(timestamps, f)
+    os.replace(path + ".tmp", path)
+
+def load_job_timestamps(job):
+    try:
+        with open(os.path.join(job["dir"], "timestamps.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def extract_frames(input_path, tmp_folder, start_frame=0, checkpoint=None, dedup=None, total_frames=None,
+                   store=None, prescale=None, decoder=None, timestamps=None, budget=None, on_frame=None,
+                   report_progress=True):
+    """Extrai frames do vídeo.
+
+    Frames anteriores a `start_frame` (já extraídos em uma execução anterior)
+    são apenas avançados com grab(), sem regravar o PNG. `checkpoint(n)` é
+    chamado periodicamente com o número de frames já gravados.
+    Com `dedup` (ver create_dedup_state) frames duplicados não são gravados;
+    o mapeamento duplicado → origem fica em dedup["duplicates"].
+    `total_frames` (padrão: contagem do container) é a base do progresso e do ETA.
+    Com `store` (ver open_frame_store) os frames vão para os slots do frame store
+    em vez de PNGs em `tmp_folder`. Com `prescale` (largura, altura) os frames são
+    reduzidos antes de gravados (ver plan_resolution).
+    `decoder` (ver get_decoder_settings) troca o cv2.VideoCapture pelo FFmpeg; em
+    `timestamps` (lista) é anotado o instante de cada frame, inclusive dos pulados.
+    Com `budget` (ver create_disk_budget) cada PNG espera espaço no orçamento de
+    staging antes de ser gravado. `on_frame(idx, gravado, origem)` é chamado para
+    cada frame decodificado (origem: frame único de um duplicado, senão None);
+    retornar False interrompe a extração.
+    """
+    cap = open_video_reader(input_path, decoder, prescale)
     frame_idx = 0
+    if timestamps is not None:
+        del timestamps[:]
+    if not total_frames:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+    throughput = create_throughput("extracting_frames", total_frames)
     
     log_message("Extraindo frames do vídeo...")
+    if start_frame:
+        log_message(f"⏩ Pulando {start_frame} frames já extraídos")
     
     while True:
-        ret, frame = cap.read()
+        check_cancelled()
+        tmp_input = os.path.join(BASE_DIR, tmp_folder, f"frame_{frame_idx:06d}.png")
+        if store is not None:
+            already_extracted = frame_idx < start_frame and frame_store_has(store, frame_idx)
+        else:
+            already_extracted = frame_idx < start_frame and os.path.exists(tmp_input)
+        if already_extracted and dedup is None:
+            if not cap.grab():
+                break
+            if timestamps is not None:
+                timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+            frame_idx += 1
+            continue
+        
+        with profile_span("decode"):
+            ret, frame = cap.read()
         if not ret:
             break
-            
-        tmp_input = os.path.join(BASE_DIR, tmp_folder, f"frame_{frame_idx:06d}.png")
-        success = cv2.imwrite(tmp_input, frame)
+        if timestamps is not None:
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+        if prescale and (frame.shape[1], frame.shape[0]) != tuple(prescale):
+            frame = cv2.resize(frame, tuple(prescale), interpolation=cv2.INTER_AREA)
+        
+        # Duplicados não geram PNG; frames já extraídos só alimentam o estado da deduplicação
+        source = find_duplicate_frame(frame, frame_idx, dedup) if dedup is not None else None
+        if source is not None:
+            if on_frame is not None and on_frame(frame_idx, False, source) is False:
+                break
+            frame_idx += 1
+            continue
+        if already_extracted:
+            frame_idx += 1
+            continue
+        
+        if budget is not None and not disk_budget_wait(budget):
+            break
+        if store is not None:
+            with profile_span("store_write"):
+                profile_bytes(frame_store_write(store, frame_idx, frame))
+            success = True
+        else:
+            with profile_span("png_write"):
+                success = cv2.imwrite(tmp_input, frame)
+            if success:
+                frame_bytes = os.path.getsize(tmp_input)
+                profile_bytes(frame_bytes)
+                if budget is not None:
+                    disk_budget_add(budget, frame_bytes)
         if not success:
             log_message(f"⚠️ Erro ao salvar frame {frame_idx}", "warning")
+        if on_frame is not None and on_frame(frame_idx, success, None) is False:
+            break
         frame_idx += 1
         
         if frame_idx % 30 == 0:
             log_message(f"Extraídos {frame_idx} frames...")
-            progress = 10 + (frame_idx / 1000) * 20
-            progress_update(progress, f"Extraídos {frame_idx} frames", "extracting")
+            if report_progress:
+                # A contagem do container pode ser menor que a real: nunca passar do fim da faixa
+                progress = 10 + min(frame_idx / max(total_frames, 1), 1.0) * 20
+                progress_update(progress, f"Extraídos {frame_idx} frames", "extracting")
+            throughput_tick(throughput, frame_idx)
+            if checkpoint:
+                checkpoint(frame_idx)
     
     cap.release()
+    throughput_tick(throughput, frame_idx, force=True)
     log_message(f"Total de {frame_idx} frames extraídos.")
     return frame_idx
 
@@ -193,106 +1575,916 @@ def choose_optimal_settings(gpu_memory_mb):
     
     return settings
 
-def process_single_frame(frame_file, tmp_dir, exe_path, scale, settings):
-    """Processa um único frame"""
-    tmp_input = os.path.join(tmp_dir, frame_file)
-    frame_number = frame_file.replace("frame_", "").replace(".png", "")
-    tmp_output = os.path.join(tmp_dir, f"frame_up_{frame_number}.png")
-    
-    if os.path.exists(tmp_output):
-        return True, frame_file
-    
-    cmd = [
-        exe_path,
-        "-i", tmp_input,
-        "-o", tmp_output,
-        "-s", str(scale),
-        "-f", "png",
-        "-g", "0",  # Sempre usar GPU
-        "-j", settings["j_value"]
-    ]
+# ----------------------------
+# Autotune: ajuste de workers/-j pelo throughput e perfis salvos por GPU/resolução
+# ----------------------------
+AUTOTUNE_PROFILES_PATH = os.path.join(BASE_DIR, "profiles", "autotune.json")
+AUTOTUNE_J_VALUES = ["4:2:2", "8:4:4", "12:6:6", "16:8:8", "24:12:12"]
+AUTOTUNE_MAX_WORKERS = 4
+AUTOTUNE_WINDOW_SECONDS = 10.0   # duração mínima de cada janela de medição
+AUTOTUNE_WINDOW_FRAMES = 8       # frames mínimos em cada janela de medição
+AUTOTUNE_IMPROVEMENT = 1.05      # ganho mínimo (5%) para aceitar uma mudança
+AUTOTUNE_MOVES = [("workers", 1), ("j", 1), ("workers", -1), ("j", -1)]
+MIN_TILE_SIZE = 32
+OOM_FALLBACK_TILE_SIZE = 200     # tile usado quando o modo automático (0) estoura a memória
+
+_profiles_lock = threading.Lock()
+
+def load_autotune_profiles():
+    """Lê os perfis salvos ({"devices": {...}, "profiles": {...}})"""
+    try:
+        with open(AUTOTUNE_PROFILES_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("devices", {})
+    data.setdefault("profiles", {})
+    return data
+
+def update_autotune_profiles(update):
+    """Aplica `update(data)` nos perfis e grava de forma atômica"""
+    with _profiles_lock:
+        data = load_autotune_profiles()
+        update(data)
+        os.makedirs(os.path.dirname(AUTOTUNE_PROFILES_PATH), exist_ok=True)
+        tmp_path = f"{AUTOTUNE_PROFILES_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, AUTOTUNE_PROFILES_PATH)
+
+def get_autotune_device():
+    """Identifica a GPU desta máquina; o nvidia-smi só é chamado na primeira vez"""
+    host = platform.node() or "localhost"
+    device = load_autotune_profiles()["devices"].get(host)
+    if device:
+        return device
     
-    # Adicionar tile size se especificado
-    if settings["tile_size"] > 0:
-        cmd.extend(["-t", str(settings["tile_size"])])
+    device = {"name": "unknown", "memory_mb": 8192}
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=name,memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode == 0:
+            name, memory = result.stdout.strip().split("\n")[0].rsplit(",", 1)
+            device = {"name": name.strip(), "memory_mb": int(memory)}
+            log_message(f"🎮 GPU detectada: {device['name']} ({device['memory_mb']} MB)")
+    except Exception as e:
+        log_message(f"⚠️ Não foi possível detectar a GPU: {e}", "warning")
     
+    def record(data):
+        data["devices"][host] = device
+    update_autotune_profiles(record)
+    return device
+
+def create_autotuner(settings, profile_key, converged=False):
+    """Cria o estado do autotune a partir das configurações iniciais"""
+    return {
+        "settings": dict(settings),
+        "best": dict(settings),
+        "best_fps": 0.0,
+        "move_idx": 0,
+        "converged": converged,
+        "changed": False,
+        "profile_key": profile_key,
+        "window_start": time.time(),
+        "window_frames": 0,
+        "active": 0,
+        "cond": threading.Condition(),
+    }
+
+def _apply_autotune_move(settings, move):
+    """Aplica um passo (workers ou -j) às configurações; retorna None se sair dos limites"""
+    kind, step = move
+    candidate = dict(settings)
+    if kind == "workers":
+        candidate["num_threads"] = settings["num_threads"] + step
+        if not 1 <= candidate["num_threads"] <= AUTOTUNE_MAX_WORKERS:
+            return None
+    else:
+        load = int(settings["j_value"].split(":")[1])
+        current = min(range(len(AUTOTUNE_J_VALUES)),
+                      key=lambda i: abs(int(AUTOTUNE_J_VALUES[i].split(":")[1]) - load))
+        if not 0 <= current + step < len(AUTOTUNE_J_VALUES):
+            return None
+        candidate["j_value"] = AUTOTUNE_J_VALUES[current + step]
+    return candidate
+
+@contextlib.contextmanager
+def autotune_slot(tuner):
+    """Limita as execuções simultâneas ao número de workers escolhido pelo autotune"""
+    with tuner["cond"]:
+        while tuner["active"] >= tuner["settings"]["num_threads"]:
+            tuner["cond"].wait()
+        tuner["active"] += 1
+        settings = dict(tuner["settings"])
     try:
-        # Timeout aumentado para processamento pesado
-        timeout = 120
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        yield settings
+    finally:
+        with tuner["cond"]:
+            tuner["active"] -= 1
+            tuner["cond"].notify_all()
+
+def autotune_record(tuner, frames=1):
+    """Contabiliza frames concluídos e, ao fim de cada janela, ajusta as configurações (hill climbing)"""
+    with tuner["cond"]:
+        tuner["window_frames"] += frames
+        elapsed = time.time() - tuner["window_start"]
+        if tuner["converged"] or elapsed < AUTOTUNE_WINDOW_SECONDS or tuner["window_frames"] < AUTOTUNE_WINDOW_FRAMES:
+            return
         
-        if result.returncode == 0:
-            return True, frame_file
+        fps = tuner["window_frames"] / elapsed
+        tuner["window_start"] = time.time()
+        tuner["window_frames"] = 0
+        current = tuner["settings"]
+        
+        if fps > tuner["best_fps"] * AUTOTUNE_IMPROVEMENT:
+            # Melhorou (ou é a primeira medição): mantém e repete o mesmo passo
+            tuner["best"], tuner["best_fps"] = dict(current), fps
+            tuner["changed"] = True
         else:
-            error_msg = result.stderr.strip()
-            if "out of memory" in error_msg.lower():
-                log_message(f"💥 Out of Memory no frame {frame_file}", "error")
-            return False, frame_file
-            
-    except subprocess.TimeoutExpired:
-        log_message(f"⏰ Timeout no frame {frame_file}", "warning")
-        return False, frame_file
-    except Exception as e:
-        log_message(f"⚠️ Erro no frame {frame_file}: {e}", "warning")
-        return False, frame_file
+            tuner["move_idx"] += 1
+        
+        candidate = None
+        while candidate is None and tuner["move_idx"] < len(AUTOTUNE_MOVES):
+            candidate = _apply_autotune_move(tuner["best"], AUTOTUNE_MOVES[tuner["move_idx"]])
+            if candidate is None:
+                tuner["move_idx"] += 1
+        
+        if candidate is None:
+            tuner["converged"] = True
+            tuner["settings"] = dict(tuner["best"])
+            log_message(f"🎛️ Autotune convergiu: {tuner['best_fps']:.2f} fps com "
+                        f"{tuner['best']['num_threads']} workers, j={tuner['best']['j_value']}")
+        else:
+            tuner["settings"] = candidate
+            log_message(f"🎛️ Autotune: {fps:.2f} fps com {current['num_threads']} workers, j={current['j_value']} "
+                        f"→ testando {candidate['num_threads']} workers, j={candidate['j_value']}")
+        tuner["cond"].notify_all()
 
-def upscale_frames_optimized(tmp_folder, exe_path, scale=2, gpu_memory_limit=None):
-    """Versão otimizada do upscale de frames"""
-    tmp_dir = os.path.join(BASE_DIR, tmp_folder)
-    frame_files = [f for f in os.listdir(tmp_dir) if f.startswith("frame_") and f.endswith(".png") and not f.startswith("frame_up_")]
-    
-    if not frame_files:
-        log_message("❌ Nenhum frame encontrado para upscale", "error")
-        return 0
+def autotune_report_oom(tuner, tile_size):
+    """Out of Memory: reduz o tile de todas as próximas execuções"""
+    with tuner["cond"]:
+        for key in ("settings", "best"):
+            if tuner[key]["tile_size"] == 0 or tuner[key]["tile_size"] > tile_size:
+                tuner[key]["tile_size"] = tile_size
+        tuner["changed"] = True
+
+def autotune_finish(tuner):
+    """Salva o melhor perfil encontrado para esta GPU/resolução"""
+    if not tuner["changed"]:
+        return
+    best = dict(tuner["best"])
     
-    log_message(f"🚀 Iniciando upscale otimizado para {len(frame_files)} frames...")
+    def record(data):
+        data["profiles"][tuner["profile_key"]] = {"settings": best, "fps": tuner["best_fps"], "updated_at": time.time()}
+    update_autotune_profiles(record)
+    log_message(f"💾 Perfil de autotune salvo: {tuner['profile_key']}")
+
+def shrink_tile_size(tile_size):
+    """Próximo tile menor após um Out of Memory; None quando não dá para reduzir mais"""
+    if tile_size <= 0:
+        return OOM_FALLBACK_TILE_SIZE
+    smaller = tile_size // 2
+    return smaller if smaller >= MIN_TILE_SIZE else None
+
+def resolve_upscale_settings(gpu_memory_limit=None, frame_size=None, scale=2, autotune=False):
+    """Retorna (configurações, autotuner).
+
+    Com autotune e um perfil salvo para esta GPU/resolução, o perfil é usado direto
+    (sem nvidia-smi nem nova calibração); sem perfil, parte da tabela estática e
+    ajusta durante o job. Sem autotune o autotuner é None.
+    """
+    if autotune and frame_size:
+        device = get_autotune_device()
+        profile_key = f"{device['name']}|{frame_size[0]}x{frame_size[1]}|x{scale}"
+        profile = load_autotune_profiles()["profiles"].get(profile_key)
+        if profile:
+            settings = dict(profile["settings"])
+            log_message(f"🎛️ Perfil de autotune carregado ({profile.get('fps', 0):.2f} fps): "
+                        f"j={settings['j_value']}, tile={settings['tile_size']}, threads={settings['num_threads']}")
+            return settings, create_autotuner(settings, profile_key, converged=True)
+        
+        settings = choose_optimal_settings(gpu_memory_limit or device["memory_mb"])
+        log_message(f"🎛️ Autotune ativo, ponto de partida: j={settings['j_value']}, tile={settings['tile_size']}, threads={settings['num_threads']}")
+        return settings, create_autotuner(settings, profile_key)
     
-    # Detectar memória GPU
     if gpu_memory_limit:
         gpu_memory = gpu_memory_limit
         log_message(f"🎯 Memória GPU configurada manualmente: {gpu_memory} MB")
     else:
         gpu_memory = get_gpu_memory()
     
-    # Obter configurações ótimas
     settings = choose_optimal_settings(gpu_memory)
     log_message(f"⚙️ Configurações otimizadas: j={settings['j_value']}, tile={settings['tile_size']}, threads={settings['num_threads']}")
-    
-    successful_frames = 0
-    failed_frames = 0
-    
-    # Processar frames em paralelo
-    max_workers = settings["num_threads"]
-    
-    log_message(f"🔁 Processando com {max_workers} threads paralelas...")
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submeter todos os frames para processamento
-        future_to_frame = {
-            executor.submit(process_single_frame, frame_file, tmp_dir, exe_path, scale, settings): frame_file
-            for frame_file in frame_files
-        }
-        
-        for i, future in enumerate(as_completed(future_to_frame)):
-            frame_file = future_to_frame[future]
+    return settings, None
+
+# ----------------------------
+# Cache persistente de frames com upscale (endereçado por conteúdo, LRU)
+# ----------------------------
+UPSCALER_MODEL = "realesr-animevideov3"  # modelo padrão do realesrgan-ncnn-vulkan
+CACHE_EVICT_LOW_WATER = 0.9              # após a remoção o cache fica em 90% do limite
+CACHE_EVICT_CHECK_RATIO = 0.05           # verifica o limite a cada 5% do tamanho gravado
+
+def create_frame_cache(cache_dir=None, max_mb=10240):
+    """Cria o estado do cache de frames (o diretório pode ser compartilhado entre processos)"""
+    cache_dir = cache_dir or os.path.join(BASE_DIR, "cache", "upscaled")
+    os.makedirs(cache_dir, exist_ok=True)
+    return {
+        "dir": cache_dir,
+        "max_bytes": max_mb * 1024 * 1024,
+        "hits": 0,
+        "misses": 0,
+        "stores": 0,
+        "evictions": 0,
+        "bytes_since_check": 0,
+        "lock": threading.Lock(),
+    }
+
+def link_or_copy(src, dst):
+    """Cria um hardlink (sem custo de cópia); usa cópia quando o sistema de arquivos não suporta"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def frame_cache_key(frame, scale, settings, model=UPSCALER_MODEL):
+    """Chave do cache: hash do conteúdo do frame + modelo + escala + tile"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(frame.tobytes())
+    digest.update(f"{frame.shape}|{model}|{scale}|{settings['tile_size']}".encode("utf-8"))
+    return digest.hexdigest()
+
+def _frame_cache_path(cache, key):
+    return os.path.join(cache["dir"], key[:2], f"{key}.png")
+
+def frame_cache_lookup(cache, key, output_path):
+    """Copia o frame do cache para `output_path` se existir; atualiza o mtime (recência LRU)"""
+    cached = _frame_cache_path(cache, key)
+    try:
+        os.utime(cached)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        link_or_copy(cached, output_path)
+        hit = True
+    except FileNotFoundError:
+        hit = False
+    with cache["lock"]:
+        cache["hits" if hit else "misses"] += 1
+    return hit
+
+def frame_cache_read(cache, key):
+    """Lê um frame do cache direto para a memória; retorna None em caso de miss"""
+    cached = _frame_cache_path(cache, key)
+    try:
+        os.utime(cached)
+        frame = cv2.imread(cached)
+    except FileNotFoundError:
+        frame = None
+    with cache["lock"]:
+        cache["hits" if frame is not None else "misses"] += 1
+    return frame
+
+def frame_cache_store(cache, key, upscaled_path):
+    """Publica um frame no cache de forma atômica (arquivo temporário + replace)"""
+    cached = _frame_cache_path(cache, key)
+    if os.path.exists(cached):
+        return
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        link_or_copy(upscaled_path, tmp_path)
+        os.replace(tmp_path, cached)
+    except OSError as e:
+        log_message(f"⚠️ Não foi possível gravar no cache: {e}", "warning")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    
+    with cache["lock"]:
+        cache["stores"] += 1
+        cache["bytes_since_check"] += os.path.getsize(cached)
+        if cache["bytes_since_check"] >= cache["max_bytes"] * CACHE_EVICT_CHECK_RATIO:
+            cache["bytes_since_check"] = 0
+            evict_frame_cache(cache)
+
+def frame_cache_store_array(cache, key, frame):
+    """Publica no cache um frame que só existe em memória"""
+    cached = _frame_cache_path(cache, key)
+    if os.path.exists(cached):
+        return
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp.png"
+    if cv2.imwrite(tmp_path, frame):
+        frame_cache_store(cache, key, tmp_path)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+def evict_frame_cache(cache):
+    """Remove os frames menos usados recentemente até o cache caber no limite"""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache["dir"]):
+        for f in files:
+            if not f.endswith(".png"):
+                continue
+            path = os.path.join(root, f)
             try:
-                success, processed_frame = future.result()
-                if success:
-                    successful_frames += 1
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # Removido por outro job
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+    
+    if total <= cache["max_bytes"]:
+        return
+    
+    entries.sort()
+    for _, size, path in entries:
+        if total <= cache["max_bytes"] * CACHE_EVICT_LOW_WATER:
+            break
+        try:
+            os.remove(path)
+            cache["evictions"] += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    log_message(f"🧹 Cache de frames reduzido para {total / (1024 * 1024):.0f} MB")
+
+def report_cache_metrics(cache):
+    """Envia os contadores de hit/miss do cache no evento de métricas"""
+    lookups = cache["hits"] + cache["misses"]
+    hit_rate = cache["hits"] / lookups if lookups else 0.0
+    log_message(f"🗃️ Cache de frames: {cache['hits']} hits, {cache['misses']} misses ({hit_rate:.1%})")
+    send_metrics({
+        "cacheHits": cache["hits"],
+        "cacheMisses": cache["misses"],
+        "cacheHitRate": hit_rate,
+        "cacheStores": cache["stores"],
+        "cacheEvictions": cache["evictions"],
+    })
+
+def build_upscaler_command(exe_path, input_path, output_path, scale, settings):
+    """Monta a linha de comando do Real-ESRGAN (aceita arquivo ou diretório)"""
+    cmd = [
+        exe_path,
+        "-i", input_path,
+        "-o", output_path,
+        "-s", str(scale),
+        "-f", "png",
+        "-g", "0",  # Sempre usar GPU
+        "-j", settings["j_value"]
+    ]
+    
+    # Adicionar tile size se especificado
+    if settings["tile_size"] > 0:
+        cmd.extend(["-t", str(settings["tile_size"])])
+    return cmd
+
+def run_upscaler(input_path, output_path, exe_path, scale, settings, label, tuner=None, timeout=120):
+    """Executa o upscaler; em Out of Memory reduz o tile e tenta de novo.
+
+    Retorna True em caso de sucesso. TimeoutExpired é repassado para quem chamou;
+    se o job for cancelado o processo é encerrado e JobCancelled é levantado.
+    """
+    attempt_settings = settings
+    while True:
+        cmd = build_upscaler_command(exe_path, input_path, output_path, scale, attempt_settings)
+        spawn_start = time.perf_counter()
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+            profile_spawn(time.perf_counter() - spawn_start)
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=CANCEL_POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if is_cancelled() or time.monotonic() >= deadline:
+                        process.kill()
+                        process.communicate()
+                        check_cancelled()
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+        if process.returncode == 0:
+            return True
+        
+        error_msg = stderr.strip()
+        if "out of memory" not in error_msg.lower():
+            return False
+        smaller = shrink_tile_size(attempt_settings["tile_size"])
+        if smaller is None:
+            log_message(f"💥 Out of Memory em {label} mesmo com tile {attempt_settings['tile_size']}", "error")
+            return False
+        log_message(f"💥 Out of Memory em {label}: reduzindo tile {attempt_settings['tile_size']} → {smaller}", "warning")
+        attempt_settings = dict(attempt_settings, tile_size=smaller)
+        if tuner is not None:
+            autotune_report_oom(tuner, smaller)
+
+# ----------------------------
+# Backends de upscale
+# ----------------------------
+# Um backend é um dict com:
+#   "name"          nome do backend ("ncnn", "cpu")
+#   "model"         identificação do modelo (entra na chave do cache de frames)
+#   "exe_path"      executável externo, quando o backend trabalha com arquivos (None se em processo)
+#   "upscale_batch" função (frames, scale, settings, tuner=None) → lista de frames BGR (None em falhas)
+NCNN_EXECUTABLE_DIR = os.path.join(BASE_DIR, "realesrgan_portable", "realesrgan-ncnn-vulkan-20220424-windows")
+DNN_SUPERRES_ALGORITHMS = ("edsr", "espcn", "fsrcnn", "lapsrn")
+
+def find_ncnn_executable(upscaler_path=None):
+    """Localiza o realesrgan-ncnn-vulkan (caminho configurado, pasta portátil ou PATH)"""
+    if upscaler_path:
+        return upscaler_path
+    exe_name = "realesrgan-ncnn-vulkan.exe" if os.name == "nt" else "realesrgan-ncnn-vulkan"
+    candidates = [
+        os.path.join(NCNN_EXECUTABLE_DIR, exe_name),
+        os.path.join(NCNN_EXECUTABLE_DIR, "realesrgan-ncnn-vulkan.exe"),
+        shutil.which("realesrgan-ncnn-vulkan"),
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return candidates[0]
+
+def ncnn_upscale_batch(exe_path, frames, scale, settings, tuner=None):
+    """Upscale de um lote em memória com uma única execução do Real-ESRGAN (diretório → diretório)"""
+    batch_dir = tempfile.mkdtemp(prefix="upscale_batch_", dir=get_scratch_root())
+    batch_input = os.path.join(batch_dir, "in")
+    batch_output = os.path.join(batch_dir, "out")
+    os.makedirs(batch_input)
+    os.makedirs(batch_output)
+    try:
+        for i, frame in enumerate(frames):
+            cv2.imwrite(os.path.join(batch_input, f"{i:06d}.png"), frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
+        try:
+            run_upscaler(batch_input, batch_output, exe_path, scale, settings, "lote em memória", tuner,
+                         timeout=120 * len(frames))
+        except subprocess.TimeoutExpired:
+            log_message("⏰ Timeout no lote em memória", "warning")
+        
+        results = []
+        for i in range(len(frames)):
+            output = os.path.join(batch_output, f"{i:06d}.png")
+            results.append(cv2.imread(output) if os.path.exists(output) else None)
+        return results
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+def create_ncnn_backend(exe_path):
+    """Backend Real-ESRGAN ncnn/Vulkan (executável externo, GPU)"""
+    if not os.path.exists(exe_path):
+        raise FileNotFoundError(f"❌ Executável Real-ESRGAN não encontrado: {exe_path}")
+    return {
+        "name": "ncnn",
+        "model": UPSCALER_MODEL,
+        "scales": (2, 3, 4),  # escalas do realesr-animevideov3
+        "exe_path": exe_path,
+        "upscale_batch": lambda frames, scale, settings, tuner=None:
+            ncnn_upscale_batch(exe_path, frames, scale, settings, tuner),
+    }
+
+def create_cpu_backend(threads=0, model_path=None):
+    """Backend em processo na CPU: cv2.dnn_superres quando há modelo, senão resize Lanczos + nitidez.
+
+    Cada frame do lote roda em uma thread do pool (o OpenCV libera o GIL);
+    o dnn_superres não é thread-safe, então cada thread carrega sua própria instância.
+    """
+    threads = threads or os.cpu_count() or 1
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="cpu_upscale")
+    local = threading.local()
+    
+    algorithm, model_scale = None, None
+    if model_path:
+        name = os.path.basename(model_path).lower()
+        algorithm = next((a for a in DNN_SUPERRES_ALGORITHMS if name.startswith(a)), None)
+        if not hasattr(cv2, "dnn_superres"):
+            log_message("⚠️ cv2.dnn_superres indisponível (requer opencv-contrib-python), usando resize", "warning")
+            algorithm = None
+        elif algorithm is None or not os.path.exists(model_path):
+            log_message(f"⚠️ Modelo de super-resolução inválido: {model_path}, usando resize", "warning")
+            algorithm = None
+        else:
+            digits = "".join(c for c in name.split("_x")[-1] if c.isdigit())
+            model_scale = int(digits) if digits else None
+    
+    def upscale_one(frame, scale):
+        if frame is None:
+            return None
+        if algorithm and model_scale == scale:
+            if not hasattr(local, "sr"):
+                local.sr = cv2.dnn_superres.DnnSuperResImpl_create()
+                local.sr.readModel(model_path)
+                local.sr.setModel(algorithm, model_scale)
+            return local.sr.upsample(frame)
+        upscaled = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LANCZOS4)
+        # Unsharp mask leve para compensar a suavização da interpolação
+        blurred = cv2.GaussianBlur(upscaled, (0, 0), 1.0)
+        return cv2.addWeighted(upscaled, 1.5, blurred, -0.5, 0)
+    
+    def upscale_batch(frames, scale, settings, tuner=None):
+        return list(pool.map(lambda frame: upscale_one(frame, scale), frames))
+    
+    log_message(f"🖥️ Backend CPU: {'dnn_superres ' + algorithm if algorithm else 'Lanczos + nitidez'}, {threads} threads")
+    return {
+        "name": "cpu",
+        "model": f"cpu-{algorithm}-x{model_scale}" if algorithm else "cpu-lanczos",
+        "scales": (2, 3, 4),  # escalas sem modelo caem no resize Lanczos
+        "exe_path": None,
+        "upscale_batch": upscale_batch,
+    }
+
+# Backends já criados neste processo (o modo servidor reaproveita entre jobs)
+_BACKENDS = {}
+_backends_lock = threading.Lock()
+
+def create_upscaler_backend(options):
+    """Cria o backend de upscale configurado nas opções (ou reaproveita um já criado)"""
+    key = (options["backend"], options["upscaler_path"], options["cpu_model_path"], options["cpu_threads"])
+    with _backends_lock:
+        if key not in _BACKENDS:
+            _BACKENDS[key] = _build_upscaler_backend(options)
+        return _BACKENDS[key]
+
+def _build_upscaler_backend(options):
+    if options["backend"] == "cpu":
+        return create_cpu_backend(options["cpu_threads"], options["cpu_model_path"])
+    if options["backend"] == "ncnn":
+        return create_ncnn_backend(find_ncnn_executable(options["upscaler_path"]))
+    raise ValueError(f"❌ Backend de upscale desconhecido: {options['backend']}")
+
+def resolve_backend_settings(backend, gpu_memory_limit=None, frame_size=None, scale=2, autotune=False):
+    """Configurações do backend: GPU/autotune para o ncnn, pool de threads para backends em processo"""
+    if backend.get("settings"):
+        # Backends compostos (ver create_tiled_backend) já resolveram as configurações internas
+        return dict(backend["settings"]), None
+    if backend["exe_path"]:
+        return resolve_upscale_settings(gpu_memory_limit, frame_size, scale, autotune)
+    settings = {"j_value": "", "batch_size": 8, "tile_size": 0, "num_threads": 2}
+    return settings, None
+
+def upscale_frames_with_backend(frames, backend, scale, settings, cache=None, tuner=None):
+    """Upscale de frames em memória pelo backend, consultando/alimentando o cache de frames"""
+    results = [None] * len(frames)
+    keys = {}
+    misses = []
+    for i, frame in enumerate(frames):
+        if cache is not None and frame is not None:
+            keys[i] = frame_cache_key(frame, scale, settings, backend["model"])
+            results[i] = frame_cache_read(cache, keys[i])
+            if results[i] is not None:
+                continue
+        misses.append(i)
+    
+    if misses:
+        upscaled = backend["upscale_batch"]([frames[i] for i in misses], scale, settings, tuner)
+        for i, frame in zip(misses, upscaled):
+            results[i] = frame
+            if frame is not None and i in keys:
+                frame_cache_store_array(cache, keys[i], frame)
+    return results
+
+def process_frame_batch_in_memory(batch_files, tmp_dir, backend, scale, settings, cache=None):
+    """Lê um lote de PNGs, faz upscale em memória pelo backend e grava os frame_up_*.png"""
+    frames = [cv2.imread(os.path.join(tmp_dir, f)) for f in batch_files]
+    with profile_span("upscale_batch"):
+        upscaled = upscale_frames_with_backend(frames, backend, scale, settings, cache)
+    results = []
+    for frame_file, frame in zip(batch_files, upscaled):
+        tmp_output = os.path.join(tmp_dir, frame_file.replace("frame_", "frame_up_", 1))
+        success = frame is not None and cv2.imwrite(tmp_output, frame)
+        if success:
+            profile_bytes(os.path.getsize(tmp_output))
+        results.append((success, frame_file))
+    return results
+
+def process_single_frame(frame_file, tmp_dir, exe_path, scale, settings, cache=None, tuner=None):
+    """Processa um único frame (consultando o cache de frames antes de chamar o upscaler)"""
+    tmp_input = os.path.join(tmp_dir, frame_file)
+    frame_number = frame_file.replace("frame_", "").replace(".png", "")
+    tmp_output = os.path.join(tmp_dir, f"frame_up_{frame_number}.png")
+    
+    if os.path.exists(tmp_output):
+        return True, frame_file
+    
+    try:
+        with (autotune_slot(tuner) if tuner is not None else contextlib.nullcontext(settings)) as settings:
+            cache_key = None
+            if cache is not None:
+                source = cv2.imread(tmp_input)
+                if source is not None:
+                    cache_key = frame_cache_key(source, scale, settings)
+                    if frame_cache_lookup(cache, cache_key, tmp_output):
+                        return True, frame_file
+            
+            # Timeout aumentado para processamento pesado
+            with profile_span("upscale_frame"):
+                success = run_upscaler(tmp_input, tmp_output, exe_path, scale, settings, f"frame {frame_file}", tuner)
+        
+        if success:
+            profile_bytes(os.path.getsize(tmp_output))
+            if cache_key is not None:
+                frame_cache_store(cache, cache_key, tmp_output)
+            if tuner is not None:
+                autotune_record(tuner)
+            return True, frame_file
+        return False, frame_file
+            
+    except subprocess.TimeoutExpired:
+        log_message(f"⏰ Timeout no frame {frame_file}", "warning")
+        return False, frame_file
+    except Exception as e:
+        log_message(f"⚠️ Erro no frame {frame_file}: {e}", "warning")
+        return False, frame_file
+
+def process_frame_chunk(chunk_idx, chunk_files, tmp_dir, exe_path, scale, settings, cache=None, tuner=None):
+    """Processa um lote de frames com uma única chamada do upscaler (diretório → diretório).
+
+    Frames que não saírem do lote são reprocessados individualmente.
+    Retorna uma lista de (sucesso, frame_file), um item por frame.
+    """
+    chunk_dir = os.path.join(tmp_dir, f"chunk_{chunk_idx:05d}")
+    chunk_input = os.path.join(chunk_dir, "in")
+    chunk_output = os.path.join(chunk_dir, "out")
+    os.makedirs(chunk_input, exist_ok=True)
+    os.makedirs(chunk_output, exist_ok=True)
+    
+    results = []
+    cache_keys = {}
+    try:
+        # Frames encontrados no cache não entram no lote
+        if cache is not None:
+            remaining = []
+            for frame_file in chunk_files:
+                source = cv2.imread(os.path.join(tmp_dir, frame_file))
+                if source is None:
+                    remaining.append(frame_file)
+                    continue
+                cache_keys[frame_file] = frame_cache_key(source, scale, settings)
+                tmp_output = os.path.join(tmp_dir, frame_file.replace("frame_", "frame_up_", 1))
+                if frame_cache_lookup(cache, cache_keys[frame_file], tmp_output):
+                    results.append((True, frame_file))
                 else:
-                    failed_frames += 1
+                    remaining.append(frame_file)
+            chunk_files = remaining
+            if not chunk_files:
+                return results
+        
+        # Hardlinks evitam copiar os PNGs; cópia como fallback
+        for frame_file in chunk_files:
+            link_or_copy(os.path.join(tmp_dir, frame_file), os.path.join(chunk_input, frame_file))
+        
+        try:
+            with (autotune_slot(tuner) if tuner is not None else contextlib.nullcontext(settings)) as chunk_settings:
+                with profile_span("upscale_chunk"):
+                    chunk_ok = run_upscaler(chunk_input, chunk_output, exe_path, scale, chunk_settings,
+                                            f"lote {chunk_idx}", tuner, timeout=120 * len(chunk_files))
+                if not chunk_ok:
+                    log_message(f"⚠️ Lote {chunk_idx} falhou", "warning")
+        except subprocess.TimeoutExpired:
+            log_message(f"⏰ Timeout no lote {chunk_idx}", "warning")
+        
+        # Contabilizar frame a frame: o que saiu do lote é aproveitado, o resto é refeito
+        for frame_file in chunk_files:
+            frame_number = frame_file.replace("frame_", "").replace(".png", "")
+            chunk_result = os.path.join(chunk_output, frame_file)
+            tmp_output = os.path.join(tmp_dir, f"frame_up_{frame_number}.png")
+            if os.path.exists(chunk_result) and os.path.getsize(chunk_result) > 0:
+                profile_bytes(os.path.getsize(chunk_result))
+                os.replace(chunk_result, tmp_output)
+                if frame_file in cache_keys:
+                    frame_cache_store(cache, cache_keys[frame_file], tmp_output)
+                if tuner is not None:
+                    autotune_record(tuner)
+                results.append((True, frame_file))
+            else:
+                log_message(f"🔁 Reprocessando frame {frame_file} individualmente", "warning")
+                success, _ = process_single_frame(frame_file, tmp_dir, exe_path, scale, settings, tuner=tuner)
+                if success and frame_file in cache_keys:
+                    frame_cache_store(cache, cache_keys[frame_file], tmp_output)
+                results.append((success, frame_file))
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+    
+    return results
+
+def upscale_frames_optimized(tmp_folder, backend, scale=2, gpu_memory_limit=None, chunk_size=0,
+                             on_frame_done=None, cache=None, autotune=False, on_frame_failed=None):
+    """Versão otimizada do upscale de frames.
+
+    `backend` vem de create_upscaler_backend. Com chunk_size > 0 o upscaler recebe
+    lotes de N frames por execução, pagando a inicialização do processo e do modelo
+    uma vez por lote; backends em processo sempre recebem lotes de frames em memória.
+    `on_frame_done(frame_file)` é chamado para cada frame concluído com sucesso e
+    `on_frame_failed(frame_file)` para cada frame cujo upscale falhou.
+    Com `cache` (ver create_frame_cache) frames já conhecidos não passam pelo upscaler.
+    Com `autotune` workers e -j são ajustados durante o job (ver autotune_record).
+    """
+    tmp_dir = os.path.join(BASE_DIR, tmp_folder)
+    frame_files = sorted(f for f in os.listdir(tmp_dir) if f.startswith("frame_") and f.endswith(".png") and not f.startswith("frame_up_"))
+    
+    if not frame_files:
+        log_message("❌ Nenhum frame encontrado para upscale", "error")
+        return 0
+    
+    log_message(f"🚀 Iniciando upscale otimizado para {len(frame_files)} frames...")
+    
+    frame_size = None
+    if autotune:
+        sample = cv2.imread(os.path.join(tmp_dir, frame_files[0]))
+        frame_size = (sample.shape[1], sample.shape[0]) if sample is not None else None
+    settings, tuner = resolve_backend_settings(backend, gpu_memory_limit, frame_size, scale, autotune)
+    exe_path = backend["exe_path"]
+    if not exe_path and chunk_size <= 0:
+        chunk_size = settings["batch_size"]
+    
+    successful_frames = 0
+    failed_frames = 0
+    processed = 0
+    throughput = create_throughput("upscaling", len(frame_files))
+    
+    # Processar frames em paralelo (com autotune o limite real é controlado por autotune_slot)
+    max_workers = AUTOTUNE_MAX_WORKERS if tuner is not None else settings["num_threads"]
+    
+    log_message(f"🔁 Processando com {max_workers} threads paralelas...")
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if chunk_size > 0:
+            # Frames já processados não entram nos lotes
+            pending = [f for f in frame_files
+                       if not os.path.exists(os.path.join(tmp_dir, f.replace("frame_", "frame_up_", 1)))]
+            successful_frames += len(frame_files) - len(pending)
+            processed += len(frame_files) - len(pending)
+            chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+            log_message(f"📦 Modo em lotes: {len(chunks)} lotes de até {chunk_size} frames")
+            if exe_path:
+                future_to_frames = {
+                    executor.submit(bind_job_context(process_frame_chunk), idx, chunk, tmp_dir, exe_path, scale, settings, cache, tuner): chunk
+                    for idx, chunk in enumerate(chunks)
+                }
+            else:
+                future_to_frames = {
+                    executor.submit(bind_job_context(process_frame_batch_in_memory), chunk, tmp_dir, backend, scale, settings, cache): chunk
+                    for chunk in chunks
+                }
+        else:
+            # Submeter todos os frames para processamento
+            future_to_frames = {
+                executor.submit(bind_job_context(process_single_frame), frame_file, tmp_dir, exe_path, scale, settings, cache, tuner): [frame_file]
+                for frame_file in frame_files
+            }
+        
+        try:
+            for future in as_completed_cancellable(future_to_frames):
+                frames = future_to_frames[future]
+                try:
+                    results = future.result()
+                    if chunk_size <= 0:
+                        results = [results]
+                    for success, processed_frame in results:
+                        if success:
+                            successful_frames += 1
+                            if on_frame_done:
+                                on_frame_done(processed_frame)
+                        else:
+                            failed_frames += 1
+                            if on_frame_failed:
+                                on_frame_failed(processed_frame)
+                except Exception as e:
+                    log_message(f"❌ Erro no(s) frame(s) {', '.join(frames)}: {e}", "error")
+                    failed_frames += len(frames)
+                    if on_frame_failed:
+                        for frame_file in frames:
+                            on_frame_failed(frame_file)
                 
                 # Atualizar progresso a cada 5 frames
-                if (i + 1) % 5 == 0:
-                    progress = 30 + ((i + 1) / len(frame_files)) * 50
-                    progress_update(progress, f"Processados {i + 1}/{len(frame_files)} frames", "upscaling")
-                    log_message(f"✅ {i + 1}/{len(frame_files)} frames processados...")
+                previous = processed
+                processed += len(frames)
+                if processed // 5 != previous // 5:
+                    progress = 30 + (processed / len(frame_files)) * 50
+                    progress_update(progress, f"Processados {processed}/{len(frame_files)} frames", "upscaling")
+                    log_message(f"✅ {processed}/{len(frame_files)} frames processados...")
+                throughput_tick(throughput, processed)
+        except BaseException:
+            # Interrupção: não esperar pelos frames que ainda estão na fila
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    
+    throughput_tick(throughput, processed, force=True)
+    log_message(f"📊 Resultado final: {successful_frames} frames bem-sucedidos, {failed_frames} falhas")
+    if cache is not None:
+        report_cache_metrics(cache)
+    if tuner is not None:
+        autotune_finish(tuner)
+    
+    return successful_frames
+
+def upscale_frame_store(source, target, backend, scale=2, gpu_memory_limit=None, chunk_size=0,
+                        on_frame_done=None, cache=None, autotune=False, on_frame_failed=None):
+    """Upscale dos frames de um frame store para outro, sem PNGs no diretório do job.
+
+    Mesma política de upscale_frames_optimized: com chunk_size > 0 (ou backends em
+    processo) os frames vão em lotes pelo backend; sem lotes, o Real-ESRGAN recebe
+    um frame por execução por um slot de troca fixo de cada thread (em tmpfs
+    quando disponível). `on_frame_done(idx)` é chamado para cada frame concluído e
+    `on_frame_failed(idx)` para cada frame cujo upscale falhou.
+    """
+    frame_indices = frame_store_indices(source)
+    if not frame_indices:
+        log_message("❌ Nenhum frame encontrado para upscale", "error")
+        return 0
+    
+    log_message(f"🚀 Iniciando upscale otimizado para {len(frame_indices)} frames (frame store)...")
+    
+    frame_size = (source["shape"][1], source["shape"][0])
+    settings, tuner = resolve_backend_settings(backend, gpu_memory_limit, frame_size, scale, autotune)
+    exe_path = backend["exe_path"]
+    if not exe_path and chunk_size <= 0:
+        chunk_size = settings["batch_size"]
+    
+    pending = [idx for idx in frame_indices if not frame_store_has(target, idx)]
+    successful_frames = len(frame_indices) - len(pending)
+    failed_frames = 0
+    processed = successful_frames
+    throughput = create_throughput("upscaling", len(frame_indices))
+    
+    local = threading.local()
+    slot_dirs = []
+    slot_dirs_lock = threading.Lock()
+    
+    def upscale_group(group):
+        # Views sem cópia: o frame vai do mapeamento direto para o upscaler
+        frames = [frame_store_read(source, idx) for idx in group]
+        if chunk_size > 0:
+            with (autotune_slot(tuner) if tuner is not None else contextlib.nullcontext(settings)) as group_settings:
+                with profile_span("upscale_batch"):
+                    upscaled = upscale_frames_with_backend(frames, backend, scale, group_settings, cache, tuner)
+            if tuner is not None and exe_path:
+                autotune_record(tuner, sum(1 for frame in upscaled if frame is not None))
+        else:
+            if not hasattr(local, "slot_dir"):
+                local.slot_dir = tempfile.mkdtemp(prefix="upscale_slot_", dir=get_scratch_root())
+                with slot_dirs_lock:
+                    slot_dirs.append(local.slot_dir)
+            with profile_span("upscale_frame"):
+                upscaled = [upscale_frame_in_memory(frames[0], local.slot_dir, exe_path, scale, settings, cache, tuner)]
+        results = []
+        for idx, frame in zip(group, upscaled):
+            if frame is not None:
+                with profile_span("store_write"):
+                    profile_bytes(frame_store_write(target, idx, frame))
+            results.append((frame is not None, idx))
+        return results
+    
+    max_workers = AUTOTUNE_MAX_WORKERS if tuner is not None else settings["num_threads"]
+    if chunk_size > 0:
+        groups = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        log_message(f"📦 Modo em lotes: {len(groups)} lotes de até {chunk_size} frames")
+    else:
+        groups = [[idx] for idx in pending]
+    log_message(f"🔁 Processando com {max_workers} threads paralelas...")
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_group = {executor.submit(bind_job_context(upscale_group), group): group for group in groups}
+            try:
+                for future in as_completed_cancellable(future_to_group):
+                    group = future_to_group[future]
+                    try:
+                        for success, idx in future.result():
+                            if success:
+                                successful_frames += 1
+                                if on_frame_done:
+                                    on_frame_done(idx)
+                            else:
+                                failed_frames += 1
+                                if on_frame_failed:
+                                    on_frame_failed(idx)
+                    except Exception as e:
+                        log_message(f"❌ Erro no(s) frame(s) {', '.join(str(idx) for idx in group)}: {e}", "error")
+                        failed_frames += len(group)
+                        if on_frame_failed:
+                            for idx in group:
+                                on_frame_failed(idx)
                     
-            except Exception as e:
-                log_message(f"❌ Erro no frame {frame_file}: {e}", "error")
-                failed_frames += 1
+                    previous = processed
+                    processed += len(group)
+                    if processed // 5 != previous // 5:
+                        progress = 30 + (processed / len(frame_indices)) * 50
+                        progress_update(progress, f"Processados {processed}/{len(frame_indices)} frames", "upscaling")
+                        log_message(f"✅ {processed}/{len(frame_indices)} frames processados...")
+                    throughput_tick(throughput, processed)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+    finally:
+        for slot_dir in slot_dirs:
+            shutil.rmtree(slot_dir, ignore_errors=True)
     
+    throughput_tick(throughput, processed, force=True)
     log_message(f"📊 Resultado final: {successful_frames} frames bem-sucedidos, {failed_frames} falhas")
+    if cache is not None:
+        report_cache_metrics(cache)
+    if tuner is not None:
+        autotune_finish(tuner)
     
     return successful_frames
 
@@ -303,28 +2495,762 @@ def calculate_target_resolution(original_width, original_height, target_height=1
     target_height = target_height if target_height % 2 == 0 else target_height + 1
     return target_width, target_height
 
-def create_output_video(tmp_folder, output_path, fps, target_width=None, target_height=None):
-    """Cria o vídeo final a partir dos frames upscaled"""
+# ----------------------------
+# Frames grandes em tiles: um frame dividido entre vários workers do upscaler
+# ----------------------------
+FRAME_TILING_MODES = ("auto", "on", "off")
+FRAME_TILING_AUTO_PIXELS = 3840 * 2160  # no modo "auto", frames a partir de 4K (na entrada do upscaler)
+
+def split_frame_tiles(width, height, tile_size, overlap):
+    """Grade de tiles cobrindo o frame: lista de (tile, região_com_margem), ambos (x0, y0, x1, y1)"""
+    tiles = []
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            x1, y1 = min(x0 + tile_size, width), min(y0 + tile_size, height)
+            padded = (max(0, x0 - overlap), max(0, y0 - overlap), min(width, x1 + overlap), min(height, y1 + overlap))
+            tiles.append(((x0, y0, x1, y1), padded))
+    return tiles
+
+def upscale_frame_tiles(frame, inner, scale, settings, tile_size, overlap, workers):
+    """Upscale de um frame grande em tiles com margem, distribuídos entre `workers` execuções do backend.
+
+    Cada worker recebe um lote de tiles (um processo do Real-ESRGAN por lote), então
+    a memória por worker depende do tile e não do frame. Os tiles voltam ao frame na
+    ordem da grade: a margem de cada tile cai sobre tiles já aplicados e é mesclada
+    com a mesma transição do tile-diff (ver apply_tile_patches).
+    """
+    height, width = frame.shape[:2]
+    tiles = split_frame_tiles(width, height, tile_size, overlap)
+    crops = [np.ascontiguousarray(frame[py0:py1, px0:px1]) for _, (px0, py0, px1, py1) in tiles]
+    # Distribuição intercalada: tiles vizinhos (de custo parecido) vão para workers diferentes
+    groups = [list(range(worker, len(tiles), workers)) for worker in range(min(workers, len(tiles)))]
+    
+    def upscale_group(group):
+        with profile_span("upscale_tiles"):
+            return inner["upscale_batch"]([crops[i] for i in group], scale, settings)
+    
+    upscaled = [None] * len(tiles)
+    with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="frame_tiles") as executor:
+        futures = {executor.submit(bind_job_context(upscale_group), group): group for group in groups}
+        for future in as_completed_cancellable(futures):
+            for i, crop in zip(futures[future], future.result()):
+                upscaled[i] = crop
+    if any(crop is None for crop in upscaled):
+        return None
+    
+    canvas = np.zeros((height * scale, width * scale, 3), dtype=np.uint8)
+    return apply_tile_patches(canvas, [(tile, padded, crop) for (tile, padded), crop in zip(tiles, upscaled)], scale)
+
+def create_tiled_backend(inner, gpu_memory_limit=None, scale=2, tile_size=512, overlap=16, workers=0,
+                         min_pixels=0):
+    """Envolve um backend para dividir frames com `min_pixels` ou mais entre vários workers.
+
+    Frames que cabem em um tile (ex.: os do tile-diff) passam direto pelo backend interno.
+    Os executáveis externos também recebem frames em memória (exe_path None): o
+    pipeline trata o backend composto como um backend em processo, um frame por vez,
+    com o paralelismo dentro de cada frame.
+    """
+    tile_input = tile_size + 2 * overlap
+    inner_settings, _ = resolve_backend_settings(inner, gpu_memory_limit, (tile_input, tile_input), scale)
+    workers = workers or max(2, inner_settings["num_threads"])
+    
+    def upscale_batch(frames, scale, settings, tuner=None):
+        results = []
+        for frame in frames:
+            if (frame is None or frame.shape[0] * frame.shape[1] < min_pixels
+                    or (frame.shape[0] <= tile_input and frame.shape[1] <= tile_input)):
+                results.append(inner["upscale_batch"]([frame], scale, inner_settings)[0])
+            else:
+                results.append(upscale_frame_tiles(frame, inner, scale, inner_settings, tile_size, overlap, workers))
+        return results
+    
+    log_message(f"🧱 Frames grandes em tiles de {tile_size}px (margem {overlap}px) em {workers} workers")
+    return {
+        "name": f"{inner['name']}-tiled",
+        "model": f"{inner['model']}@tiles{tile_size}+{overlap}",
+        "scales": inner["scales"],
+        "exe_path": None,
+        "inner": inner,
+        # Um frame por vez no pipeline: os workers ficam dentro de cada frame
+        "settings": {"j_value": inner_settings["j_value"], "batch_size": 1, "tile_size": tile_size, "num_threads": 1},
+        "upscale_batch": upscale_batch,
+    }
+
+def configure_frame_tiling(backend, width, height, scale, gpu_memory_limit=None, options=None):
+    """Aplica a política de tiles por frame (`frame_tiling`) à resolução de entrada do upscaler"""
+    options = options or DEFAULT_OPTIONS
+    mode = options["frame_tiling"]
+    if mode not in FRAME_TILING_MODES:
+        raise ValueError(f"❌ Modo de tiles por frame desconhecido: {mode}")
+    tile_size = options["frame_tile_size"]
+    if mode == "off" or (width <= tile_size and height <= tile_size):
+        return backend
+    if mode == "auto" and width * height < FRAME_TILING_AUTO_PIXELS:
+        return backend
+    tiles = len(split_frame_tiles(width, height, tile_size, 0))
+    log_message(f"🧱 Frame {width}x{height} dividido em {tiles} tiles")
+    return create_tiled_backend(backend, gpu_memory_limit, scale, tile_size, options["frame_tile_overlap"],
+                                options["frame_tile_workers"], FRAME_TILING_AUTO_PIXELS if mode == "auto" else 0)
+
+# ----------------------------
+# Modo distribuído: lotes de frames repartidos entre workers na rede local
+# ----------------------------
+# Protocolo (TCP, uma conexão por vaga de worker, pedido → resposta):
+#   cada mensagem é uma linha JSON seguida dos payloads binários listados em "sizes"
+#   {"command": "hello", "token": ...}              → {"type": "hello", "backend", "model", "scales", "slots"}
+#   {"command": "upscale", "scale": 2, "sizes": [...]} + PNGs → {"type": "result", "sizes": [...]} + PNGs
+# Com token, o worker só atende comandos depois de um hello com o token certo.
+# Um payload vazio é um frame ausente/falho. O coordenador não precisa de ordem na
+# resposta entre vagas: cada lote volta para a thread do pipeline que o pediu, e os
+# pipelines já reordenam os frames antes do encode.
+DISTRIBUTED_PORT = 8766
+DISTRIBUTED_CONNECT_TIMEOUT = 10.0  # segundos para conectar e receber o hello de um worker
+DISTRIBUTED_FRAME_TIMEOUT = 120.0   # sem resposta nesse tempo por frame do lote, o worker é dado como morto
+DISTRIBUTED_SLOW_FACTOR = 3.0       # lote mais lento que isso × o tempo esperado ganha uma cópia em outro worker
+DISTRIBUTED_MIN_REISSUE_SECONDS = 2.0
+DISTRIBUTED_PNG_LEVEL = 1           # compressão dos PNGs na rede (rápida; os frames já são PNG em disco)
+# Limites de uma mensagem recebida: um peer qualquer não pode forçar alocações sem limite
+DISTRIBUTED_MAX_HEADER_BYTES = 64 * 1024
+DISTRIBUTED_MAX_PAYLOADS = 256                    # frames por mensagem (shard_size também é limitado a isso)
+DISTRIBUTED_MAX_PAYLOAD_BYTES = 512 * 1024 * 1024
+DISTRIBUTED_MAX_MESSAGE_BYTES = 2 * 1024 * 1024 * 1024
+
+class DistributedWorkerError(Exception):
+    """Worker caiu ou respondeu algo inválido: o lote volta para outro worker"""
+
+def _send_message(stream, header, payloads=()):
+    header = dict(header, sizes=[len(payload) for payload in payloads])
+    stream.write(json.dumps(header).encode("utf-8") + b"\n")
+    for payload in payloads:
+        stream.write(payload)
+    stream.flush()
+
+def _read_message(stream):
+    """Lê um cabeçalho JSON + payloads; ValueError se a mensagem passar dos limites DISTRIBUTED_MAX_*"""
+    line = stream.readline(DISTRIBUTED_MAX_HEADER_BYTES + 1)
+    if not line:
+        raise ConnectionError("conexão encerrada")
+    if len(line) > DISTRIBUTED_MAX_HEADER_BYTES:
+        raise ValueError("cabeçalho grande demais")
+    header = json.loads(line)
+    if not isinstance(header, dict):
+        raise ValueError("cabeçalho inválido")
+    sizes = header.get("sizes", [])
+    if (not isinstance(sizes, list) or len(sizes) > DISTRIBUTED_MAX_PAYLOADS
+            or not all(isinstance(size, int) and 0 <= size <= DISTRIBUTED_MAX_PAYLOAD_BYTES for size in sizes)
+            or sum(sizes) > DISTRIBUTED_MAX_MESSAGE_BYTES):
+        raise ValueError("payloads fora dos limites do protocolo")
+    payloads = []
+    for size in sizes:
+        payload = stream.read(size)
+        if len(payload) != size:
+            raise ConnectionError("payload incompleto")
+        payloads.append(payload)
+    return header, payloads
+
+def _encode_frames(frames):
+    return [cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, DISTRIBUTED_PNG_LEVEL])[1].tobytes()
+            if frame is not None else b"" for frame in frames]
+
+def _decode_frames(payloads):
+    return [cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR) if payload else None
+            for payload in payloads]
+
+def parse_address(address, default_port=DISTRIBUTED_PORT):
+    host, _, port = str(address).rpartition(":")
+    if not host:
+        return port or "127.0.0.1", default_port
+    return host, int(port)
+
+def is_loopback_host(host):
+    """True se todos os endereços de `host` forem locais (127.0.0.0/8, ::1)"""
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+def connect_worker_slot(address, token=None):
+    """Abre uma conexão (vaga) com um worker e retorna (vaga, hello)"""
+    sock = socket.create_connection(parse_address(address), timeout=DISTRIBUTED_CONNECT_TIMEOUT)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    stream = sock.makefile("rwb")
+    try:
+        _send_message(stream, {"command": "hello", "token": token})
+        hello, _ = _read_message(stream)
+    except (OSError, ValueError):
+        stream.close()
+        sock.close()
+        raise
+    if hello.get("type") != "hello":
+        stream.close()
+        sock.close()
+        raise ConnectionError(hello.get("message") or "resposta inválida ao hello")
+    slot = {"address": address, "sock": sock, "stream": stream, "busy": False, "alive": True,
+            "frames": 0, "shards": 0, "seconds": 0.0}
+    return slot, hello
+
+def close_worker_slot(slot):
+    try:
+        slot["stream"].close()
+    except OSError:
+        pass  # Buffer de escrita pendente em uma conexão já quebrada
+    slot["sock"].close()
+
+def create_distributed_backend(addresses, token=None, shard_size=8):
+    """Backend que reparte os lotes de frames entre workers (ver run_upscale_worker).
+
+    Cada worker anuncia quantas vagas (upscales simultâneos) tem; o coordenador abre
+    uma conexão por vaga e o pipeline roda uma thread por vaga, com lotes de
+    `shard_size` frames (faixas contíguas no modo em disco). Um lote que demora
+    DISTRIBUTED_SLOW_FACTOR vezes o esperado ganha uma cópia em uma vaga livre de
+    outro worker e vale a primeira resposta; se o worker cai, o lote volta para outro.
+    """
+    slots = []
+    reference = None
+    for address in addresses:
+        try:
+            slot, hello = connect_worker_slot(address, token)
+        except (OSError, ValueError) as e:
+            log_message(f"⚠️ Worker {address} indisponível: {e}", "warning")
+            continue
+        if reference is None:
+            reference = hello
+        elif (hello["model"], hello["backend"]) != (reference["model"], reference["backend"]):
+            # Modelos diferentes gerariam frames com aparência diferente no mesmo vídeo
+            log_message(f"⚠️ Worker {address} usa {hello['backend']}/{hello['model']}, diferente de "
+                        f"{reference['backend']}/{reference['model']}; ignorado", "warning")
+            close_worker_slot(slot)
+            continue
+        slots.append(slot)
+        for _ in range(max(1, int(hello.get("slots", 1))) - 1):
+            try:
+                slots.append(connect_worker_slot(address, token)[0])
+            except (OSError, ValueError) as e:
+                log_message(f"⚠️ Vaga extra do worker {address} indisponível: {e}", "warning")
+                break
+        log_message(f"🛰️ Worker {address}: {hello['backend']} ({hello['model']}), {hello.get('slots', 1)} vagas")
+    if not slots:
+        raise ValueError("❌ Nenhum worker distribuído disponível")
+    
+    cond = threading.Condition()
+    state = {"rate": None, "reissued": 0, "lost": 0}
+    attempts = ThreadPoolExecutor(max_workers=len(slots), thread_name_prefix="distributed")
+    
+    def acquire_slot(block=True, avoid=None):
+        with cond:
+            while True:
+                alive = [slot for slot in slots if slot["alive"]]
+                if not alive:
+                    raise ValueError("❌ Todos os workers distribuídos caíram")
+                idle = [slot for slot in alive if not slot["busy"] and slot["address"] != avoid]
+                if idle:
+                    # Vaga mais rápida no histórico (vagas ainda sem medida primeiro, para serem medidas)
+                    slot = max(idle, key=lambda s: s["frames"] / s["seconds"] if s["seconds"] else float("inf"))
+                    slot["busy"] = True
+                    return slot
+                if not block:
+                    return None
+                check_cancelled()
+                cond.wait(timeout=CANCEL_POLL_INTERVAL)
+    
+    def run_attempt(slot, scale, payloads):
+        started = time.perf_counter()
+        try:
+            slot["sock"].settimeout(DISTRIBUTED_FRAME_TIMEOUT * max(len(payloads), 1))
+            with profile_span("distributed_shard"):
+                _send_message(slot["stream"], {"command": "upscale", "scale": scale}, payloads)
+                header, results = _read_message(slot["stream"])
+            if header.get("type") != "result" or len(results) != len(payloads):
+                raise ConnectionError(header.get("message") or "resposta inválida")
+        except (OSError, ValueError) as e:
+            with cond:
+                slot["alive"] = False
+                state["lost"] += 1
+            close_worker_slot(slot)
+            log_message(f"⚠️ Worker {slot['address']} caiu ({e}); lote redistribuído", "warning")
+            raise DistributedWorkerError(str(e))
+        finally:
+            with cond:
+                slot["busy"] = False
+                cond.notify_all()
+        elapsed = time.perf_counter() - started
+        with cond:
+            slot["frames"] += len(payloads)
+            slot["shards"] += 1
+            slot["seconds"] += elapsed
+            rate = len(payloads) / elapsed if elapsed > 0 else None
+            if rate:
+                state["rate"] = rate if state["rate"] is None else 0.8 * state["rate"] + 0.2 * rate
+        return results
+    
+    def upscale_batch(frames, scale, settings, tuner=None):
+        with profile_span("distributed_encode"):
+            payloads = _encode_frames(frames)
+        started = time.perf_counter()
+        running = {}
+        while True:
+            if not running:
+                slot = acquire_slot()
+                running[attempts.submit(bind_job_context(run_attempt), slot, scale, payloads)] = slot
+            done, _ = wait(running, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                try:
+                    results = future.result()
+                except DistributedWorkerError:
+                    continue
+                # Cópias ainda em andamento terminam sozinhas e liberam a vaga; o resultado é descartado
+                with profile_span("distributed_decode"):
+                    return _decode_frames(results)
+            check_cancelled()
+            
+            # Rebalanceamento: lote atrasado ganha uma cópia em uma vaga livre de outro worker
+            elapsed = time.perf_counter() - started
+            expected = len(frames) / state["rate"] if state["rate"] else None
+            if (len(running) == 1 and expected is not None and elapsed > DISTRIBUTED_MIN_REISSUE_SECONDS
+                    and elapsed > expected * DISTRIBUTED_SLOW_FACTOR):
+                slow_slot = next(iter(running.values()))
+                slot = acquire_slot(block=False, avoid=slow_slot["address"])
+                if slot is not None:
+                    with cond:
+                        state["reissued"] += 1
+                    log_message(f"🐢 Lote atrasado em {slow_slot['address']} ({elapsed:.1f}s), "
+                                f"cópia enviada para {slot['address']}", "warning")
+                    running[attempts.submit(bind_job_context(run_attempt), slot, scale, payloads)] = slot
+    
+    def close():
+        report_distributed_metrics(slots, state)
+        attempts.shutdown(wait=False, cancel_futures=True)
+        for slot in slots:
+            close_worker_slot(slot)
+    
+    addresses_up = sorted({slot["address"] for slot in slots})
+    log_message(f"🛰️ Modo distribuído: {len(addresses_up)} workers, {len(slots)} vagas, lotes de {shard_size} frames")
+    return {
+        "name": f"distributed-{reference['backend']}",
+        "model": reference["model"],
+        "scales": tuple(reference["scales"]),
+        "exe_path": None,
+        # Uma thread do pipeline por vaga, cada uma enviando lotes de `shard_size` frames
+        "settings": {"j_value": "", "batch_size": shard_size, "tile_size": 0, "num_threads": len(slots)},
+        "upscale_batch": upscale_batch,
+        "close": close,
+    }
+
+def report_distributed_metrics(slots, state):
+    """Frames e throughput por worker, lotes reenviados e vagas perdidas"""
+    workers = {}
+    for slot in slots:
+        worker = workers.setdefault(slot["address"], {"address": slot["address"], "slots": 0, "alive": 0,
+                                                      "frames": 0, "shards": 0, "seconds": 0.0})
+        worker["slots"] += 1
+        worker["alive"] += int(slot["alive"])
+        worker["frames"] += slot["frames"]
+        worker["shards"] += slot["shards"]
+        worker["seconds"] += slot["seconds"]
+    for worker in workers.values():
+        worker["fps"] = round(worker["frames"] / worker["seconds"], 2) if worker["seconds"] else 0.0
+        worker["seconds"] = round(worker["seconds"], 3)
+        log_message(f"🛰️ {worker['address']}: {worker['frames']} frames em {worker['shards']} lotes "
+                    f"({worker['fps']} fps por vaga, {worker['alive']}/{worker['slots']} vagas ativas)")
+    send_metrics({"workers": list(workers.values()), "shardsReissued": state["reissued"],
+                  "slotsLost": state["lost"]}, kind="distributed")
+
+def start_local_workers(count, options, gpu_memory_limit=None, token=None):
+    """Sobe `count` workers nesta máquina, cada um em seu processo (stand-in dos nós remotos).
+
+    Retorna (endereços, processos). Os avisos/erros dos workers são repassados ao log.
+    """
+    worker_config = {
+        "backend": options["backend"],
+        "upscalerPath": options["upscaler_path"],
+        "cpuModelPath": options["cpu_model_path"],
+        "cpuThreads": options["cpu_threads"],
+        "gpuMemory": gpu_memory_limit,
+    }
+    addresses, processes = [], []
+    for i in range(count):
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--listen", "127.0.0.1:0",
+               "--worker-config", json.dumps(worker_config)]
+        if token:
+            cmd += ["--token", token]
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True, encoding="utf-8")
+        processes.append(process)
+        address = None
+        for line in process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("type") == "worker" and event.get("status") == "ready":
+                address = event["address"]
+                break
+        if address is None:
+            log_message(f"⚠️ Worker local {i} não iniciou", "warning")
+            continue
+        addresses.append(address)
+        
+        def forward(stream, label):
+            for line in stream:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("type") in ("warning", "error"):
+                    log_message(f"[{label}] {event.get('message')}", event["type"])
+        threading.Thread(target=bind_job_context(forward), args=(process.stdout, f"worker {address}"),
+                         daemon=True).start()
+    log_message(f"🛰️ {len(addresses)} workers locais iniciados")
+    return addresses, processes
+
+def stop_local_workers(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def create_job_distribution(options, gpu_memory_limit=None):
+    """Backend distribuído do job (workers configurados + locais); retorna (backend, processos_locais)"""
+    addresses = list(options["distributed_workers"])
+    processes = []
+    if options["distributed_local_workers"]:
+        local, processes = start_local_workers(options["distributed_local_workers"], options, gpu_memory_limit,
+                                               options["distributed_token"])
+        addresses += local
+    try:
+        backend = create_distributed_backend(addresses, options["distributed_token"], options["shard_size"])
+    except BaseException:
+        stop_local_workers(processes)
+        raise
+    return backend, processes
+
+class _WorkerConnection(socketserver.StreamRequestHandler):
+    """Uma vaga do coordenador: recebe lotes de frames e devolve os upscales"""
+
+    def handle(self):
+        worker = self.server.upscale_worker
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Sem token configurado qualquer coordenador é aceito; com token, só depois de um hello válido
+        authenticated = not worker["token"]
+        try:
+            while True:
+                try:
+                    command, payloads = _read_message(self.rfile)
+                except ConnectionError:
+                    return
+                action = command.get("command")
+                if action == "hello":
+                    if worker["token"] and not hmac.compare_digest(str(command.get("token") or "").encode("utf-8"),
+                                                                  str(worker["token"]).encode("utf-8")):
+                        _send_message(self.wfile, {"type": "error", "message": "token inválido"})
+                        return
+                    authenticated = True
+                    backend = worker["backend"]
+                    _send_message(self.wfile, {"type": "hello", "backend": backend["name"], "model": backend["model"],
+                                               "scales": list(backend["scales"]), "slots": worker["slots"]})
+                elif not authenticated:
+                    _send_message(self.wfile, {"type": "error", "message": "envie hello com o token antes"})
+                    return
+                elif action == "upscale":
+                    _send_message(self.wfile, {"type": "result"},
+                                  _encode_frames(upscale_worker_shard(worker, _decode_frames(payloads),
+                                                                      int(command.get("scale", 2)))))
+                else:
+                    _send_message(self.wfile, {"type": "error", "message": f"comando desconhecido: {action}"})
+        except (OSError, ValueError) as e:
+            log_message(f"⚠️ Conexão com o coordenador encerrada: {e}", "warning")
+
+def upscale_worker_shard(worker, frames, scale):
+    """Upscale de um lote recebido, com as configurações do backend resolvidas por resolução/escala"""
+    sample = next((frame for frame in frames if frame is not None), None)
+    if sample is None:
+        return frames
+    key = (sample.shape[1], sample.shape[0], scale)
+    with worker["lock"]:
+        if key not in worker["settings"]:
+            worker["settings"][key] = resolve_backend_settings(worker["backend"], worker["gpu_memory_limit"],
+                                                               key[:2], scale)[0]
+        settings = worker["settings"][key]
+    started = time.perf_counter()
+    upscaled = upscale_frames_with_backend(frames, worker["backend"], scale, settings, worker["cache"])
+    with worker["lock"]:
+        worker["frames"] += len(frames)
+        worker["seconds"] += time.perf_counter() - started
+    return upscaled
+
+def run_upscale_worker(listen=f"127.0.0.1:{DISTRIBUTED_PORT}", config=None, token=None):
+    """Modo worker: atende lotes de frames de um coordenador (ver create_distributed_backend).
+
+    `config` usa as mesmas chaves da configuração do job (backend, upscalerPath,
+    gpuMemory, frameCache...). O número de vagas anunciadas segue as threads
+    recomendadas para a GPU (ou `workerSlots`).
+    Sem `token` o worker só aceita escutar em endereço local: na rede, qualquer
+    um poderia mandar frames para a GPU.
+    """
+    address = parse_address(listen)
+    if not token and not is_loopback_host(address[0]):
+        raise ValueError(f"❌ Worker em {address[0]} (fora do loopback) exige --token")
+    config = config or {}
+    options = parse_pipeline_options(config)
+    gpu_memory_limit = config.get('gpuMemory')
+    backend = create_upscaler_backend(options)
+    slots = int(config.get('workerSlots') or resolve_backend_settings(backend, gpu_memory_limit)[0]["num_threads"])
+    worker = {
+        "backend": backend,
+        "gpu_memory_limit": gpu_memory_limit,
+        "cache": create_frame_cache(options["cache_dir"], options["cache_max_mb"]) if options["frame_cache"] else None,
+        "slots": max(1, slots),
+        "token": token,
+        "settings": {},
+        "lock": threading.Lock(),
+        "frames": 0,
+        "seconds": 0.0,
+    }
+    listener = socketserver.ThreadingTCPServer(address, _WorkerConnection)
+    listener.daemon_threads = True
+    listener.upscale_worker = worker
+    host, port = listener.server_address[:2]
+    emit_event({"type": "worker", "status": "ready", "address": f"{host}:{port}", "pid": os.getpid(),
+                "slots": worker["slots"], "backend": backend["name"], "timestamp": time.time()})
+    try:
+        listener.serve_forever()
+    finally:
+        listener.server_close()
+        emit_event({"type": "worker", "status": "stopped", "frames": worker["frames"],
+                    "seconds": round(worker["seconds"], 3), "timestamp": time.time()})
+
+# ----------------------------
+# Planejamento de resolução: menor custo até a resolução de entrega
+# ----------------------------
+RESOLUTION_PLANS = ("auto", "quality", "off")
+
+def plan_resolution(width, height, scale, target_width=None, target_height=None, model_scales=(2, 3, 4),
+                    encoder=None, policy="auto", allow_skip=False):
+    """Escolhe como chegar da resolução de origem à de entrega gastando o mínimo de upscaler.
+
+    - "skip": a origem já cobre o alvo; sem upscaler, só o resize do FFmpeg
+      (somente com `allow_skip`, opção resolutionSkip)
+    - "upscale": menor escala de modelo (até a pedida) que cobre o alvo; com a
+      política "auto" a entrada é reduzida antes (`prescale`) para o modelo não
+      gerar pixels que seriam descartados no resize final
+    O resize que sobrar vai para o filtro do FFmpeg quando há encoder FFmpeg.
+    A política "quality" nunca reduz a entrada; "off" mantém a escala pedida.
+    """
+    if policy not in RESOLUTION_PLANS:
+        raise ValueError(f"❌ Plano de resolução desconhecido: {policy}")
+    target = (target_width or width * scale, target_height or height * scale)
+    plan = {"policy": policy, "mode": "upscale", "model_scale": scale, "prescale": None,
+            "source": (width, height), "target": target}
+    
+    if policy == "off":
+        input_size = (width, height)
+    elif allow_skip and width >= target[0] and height >= target[1] and encoder is not None:
+        plan["mode"] = "skip"
+        plan["model_scale"] = 1
+        input_size = (width, height)
+    else:
+        fitting = [s for s in sorted(model_scales)
+                   if s <= scale and width * s >= target[0] and height * s >= target[1]]
+        plan["model_scale"] = fitting[0] if fitting else scale
+        input_size = (width, height)
+        model_scale = plan["model_scale"]
+        if policy == "auto" and (width * model_scale > target[0] or height * model_scale > target[1]):
+            input_size = (-(-target[0] // model_scale), -(-target[1] // model_scale))
+            plan["prescale"] = input_size
+    
+    plan["upscaled"] = (input_size[0] * plan["model_scale"], input_size[1] * plan["model_scale"])
+    if plan["upscaled"] == target:
+        plan["resize"] = None
+    else:
+        plan["resize"] = "ffmpeg" if encoder is not None else "opencv"
+    return plan
+
+def report_resolution_plan(plan, scale):
+    """Envia o plano escolhido nas métricas, com a economia de pixels no upscaler"""
+    width, height = plan["source"]
+    legacy_pixels = width * height * scale * scale
+    upscaled_pixels = plan["upscaled"][0] * plan["upscaled"][1] if plan["mode"] != "skip" else 0
+    send_metrics({
+        "mode": plan["mode"],
+        "policy": plan["policy"],
+        "modelScale": plan["model_scale"],
+        "prescaleWidth": plan["prescale"][0] if plan["prescale"] else None,
+        "prescaleHeight": plan["prescale"][1] if plan["prescale"] else None,
+        "upscaledWidth": plan["upscaled"][0],
+        "upscaledHeight": plan["upscaled"][1],
+        "targetWidth": plan["target"][0],
+        "targetHeight": plan["target"][1],
+        "finalResize": plan["resize"],
+        "upscaledPixelsPerFrame": upscaled_pixels,
+        "upscaledPixelsSaved": 1 - upscaled_pixels / legacy_pixels if legacy_pixels else 0.0,
+    }, kind="plan")
+    details = f"modelo x{plan['model_scale']}" if plan["mode"] != "skip" else "sem upscale"
+    if plan["prescale"]:
+        details += f", entrada reduzida para {plan['prescale'][0]}x{plan['prescale'][1]}"
+    if plan["resize"]:
+        details += f", resize final no {'FFmpeg' if plan['resize'] == 'ffmpeg' else 'OpenCV'}"
+    log_message(f"📐 Plano de resolução ({plan['policy']}): {details} → {plan['target'][0]}x{plan['target'][1]}")
+
+def transcode_to_target(input_path, output_path, target, encoder, frame_count=0):
+    """Plano "skip": um único passo do FFmpeg com resize, reencode e cópia do áudio"""
+    partial_path = output_path + ".partial"
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+        "-i", input_path, "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale={target[0]}:{target[1]}:flags=lanczos",
+    ]
+    cmd += build_video_codec_args(encoder) + build_audio_args(input_path)
+    cmd += ["-movflags", "+faststart", "-f", "mp4", partial_path]
+    log_message(f"🎬 Transcodificando sem upscale: {' '.join(cmd)}")
+    
+    throughput = create_throughput("transcoding", frame_count)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+    stderr_lines = []
+    stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    stderr_thread.start()
+    frames = 0
+    try:
+        for line in process.stdout:
+            if is_cancelled():
+                process.kill()
+                break
+            key, _, value = line.strip().partition("=")
+            if key == "frame" and value.isdigit():
+                frames = int(value)
+                progress_update(10 + min(frames / max(frame_count, 1), 1.0) * 85,
+                                f"Transcodificados {frames}/{frame_count} frames", "transcoding")
+                throughput_tick(throughput, frames)
+        returncode = process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        stderr_thread.join(timeout=5)
+    check_cancelled()
+    if returncode != 0:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise ValueError(f"❌ FFmpeg falhou (código {returncode}): {' | '.join(l.strip() for l in stderr_lines[-20:])}")
+    os.replace(partial_path, output_path)
+    throughput_tick(throughput, frames, force=True)
+    profile_bytes(os.path.getsize(output_path))
+    return frames
+
+# ----------------------------
+# Montagem do vídeo: leitura em paralelo, escrita na ordem
+# ----------------------------
+ASSEMBLY_MAX_WORKERS = 4                    # threads de leitura no modo automático
+ASSEMBLY_BUFFER_BYTES = 512 * 1024 * 1024   # memória máxima dos frames lidos à frente do encoder
+
+def prefetch_ordered(items, load, workers, depth):
+    """Aplica `load` aos itens em um pool de threads e entrega (item, resultado) na ordem dos itens.
+
+    No máximo `depth` itens ficam em andamento/à espera (buffer de reordenação
+    limitado): um frame lento segura a escrita, não a memória. A decodificação
+    de PNG e o resize do OpenCV liberam o GIL, então as threads rodam em paralelo.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    window = deque()
+    try:
+        for item in items:
+            window.append((item, executor.submit(bind_job_context(load), item)))
+            if len(window) >= depth:
+                item, future = window.popleft()
+                yield item, future.result()
+        while window:
+            item, future = window.popleft()
+            yield item, future.result()
+    finally:
+        # Interrupção ou erro do consumidor: não espera as leituras que sobraram
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def create_frame_readiness(ready=()):
+    """Frames com upscale concluído (ou com falha), para a montagem rodar junto com o upscale"""
+    return {"ready": set(ready), "failed": set(), "finished": False, "aborted": False,
+            "cond": threading.Condition()}
+
+def mark_frame_ready(readiness, idx):
+    with readiness["cond"]:
+        readiness["ready"].add(idx)
+        readiness["cond"].notify_all()
+
+def mark_frame_failed(readiness, idx):
+    """Upscale do frame falhou: a montagem pula o frame sem esperar o fim do upscale"""
+    with readiness["cond"]:
+        readiness["failed"].add(idx)
+        readiness["cond"].notify_all()
+
+def finish_frame_readiness(readiness, aborted=False):
+    """Fim do upscale: frames que não ficaram prontos falharam; com `aborted` a montagem para"""
+    with readiness["cond"]:
+        readiness["finished"] = True
+        readiness["aborted"] = aborted
+        readiness["cond"].notify_all()
+
+def wait_frame_ready(readiness, idx):
+    """Espera o upscale do frame `idx`; False se ele falhou ou se o upscale terminou sem ele"""
+    with readiness["cond"]:
+        while idx not in readiness["ready"] and idx not in readiness["failed"] and not readiness["finished"]:
+            check_cancelled()
+            readiness["cond"].wait(timeout=CANCEL_POLL_INTERVAL)
+        if readiness["aborted"]:
+            raise JobCancelled("⏹️ Upscale interrompido")
+        return idx in readiness["ready"]
+
+def create_output_video(tmp_folder, output_path, fps, target_width=None, target_height=None, duplicates=None,
+                        encoder=None, audio_source=None, store=None, timestamps=None, workers=0,
+                        frame_indices=None, readiness=None):
+    """Cria o vídeo final a partir dos frames upscaled.
+
+    `duplicates` mapeia índice do frame → índice do frame único cujo upscale é reaproveitado.
+    Com `encoder` (ver get_encoder_settings) os frames vão direto para o FFmpeg; se houver
+    `audio_source` o áudio entra no mesmo passo e o retorno já é `output_path`. Caso
+    contrário retorna o vídeo *_no_audio.mp4 para o mux de áudio posterior.
+    Com `store` os frames são lidos do frame store (views sem cópia) em vez dos PNGs.
+    Com `timestamps` (segundos por índice de frame) cada frame entra no instante
+    original (ver write_timed_frame), preservando o tempo de vídeos VFR.
+    Leitura e resize rodam em `workers` threads à frente do encoder (ver prefetch_ordered).
+    Com `readiness` (ver create_frame_readiness) a montagem roda durante o upscale:
+    `frame_indices` lista os frames únicos esperados e cada um é lido assim que fica pronto.
+    """
     tmp_dir = os.path.join(BASE_DIR, tmp_folder)
-    upscaled_frame_files = sorted([f for f in os.listdir(tmp_dir) if f.startswith("frame_up_") and f.endswith(".png")])
+    if store is not None:
+        read_upscaled = lambda idx: frame_store_read(store, idx)
+    else:
+        def read_upscaled(idx):
+            frame_path = os.path.join(tmp_dir, f"frame_up_{idx:06d}.png")
+            return cv2.imread(frame_path) if os.path.exists(frame_path) else None
+    if readiness is not None:
+        read_frame = lambda idx: read_upscaled(idx) if wait_frame_ready(readiness, idx) else None
+    else:
+        read_frame = read_upscaled
+    if frame_indices is None:
+        frame_indices = frame_store_indices(store) if store is not None else sorted(
+            int(f[len("frame_up_"):-len(".png")]) for f in os.listdir(tmp_dir)
+            if f.startswith("frame_up_") and f.endswith(".png"))
     
-    if not upscaled_frame_files:
+    if not frame_indices:
         raise ValueError("❌ Nenhum frame upscaled encontrado")
     
-    log_message(f"📹 Encontrados {len(upscaled_frame_files)} frames upscaled")
-    
-    # Verificar se o primeiro frame existe
-    first_frame_path = os.path.join(tmp_dir, upscaled_frame_files[0])
-    if not os.path.exists(first_frame_path):
-        raise ValueError(f"❌ Frame não encontrado: {first_frame_path}")
+    log_message(f"📹 {'Aguardando' if readiness is not None else 'Encontrados'} {len(frame_indices)} frames upscaled")
     
-    sample_frame = cv2.imread(first_frame_path)
+    # Primeiro frame legível define a resolução (na montagem antecipada, espera o upscale dele)
+    sample_frame = None
+    for idx in frame_indices:
+        sample_frame = read_frame(idx)
+        if sample_frame is not None:
+            break
+    if duplicates:
+        frame_indices = sorted(list(frame_indices) + list(duplicates))
+        log_message(f"🪞 {len(duplicates)} frames duplicados reaproveitam upscales existentes")
     if sample_frame is None:
         raise ValueError("❌ Não foi possível ler o frame sample")
-        
-    out_height, out_width = sample_frame.shape[:2]
-    final_width = target_width if target_width else out_width
-    final_height = target_height if target_height else out_height
     
     # Garantir que o diretório de saída existe
     output_dir = os.path.dirname(output_path)
@@ -332,66 +3258,1023 @@ def create_output_video(tmp_folder, output_path, fps, target_width=None, target_
         os.makedirs(output_dir, exist_ok=True)
         log_message(f"📁 Criado diretório: {output_dir}")
     
-    # Usar codec mais eficiente
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    temp_video = output_path.replace(".mp4", "_no_audio.mp4")
-    
-    log_message(f"🎬 Criando vídeo: {temp_video}")
-    log_message(f"📏 Resolução: {final_width}x{final_height}")
+    temp_video, audio_source = output_video_target(output_path, encoder, audio_source)
+    out, frame_size = open_output_writer(temp_video, fps, sample_frame, target_width, target_height, encoder,
+                                         audio_source)
     log_message(f"🎞️ FPS: {fps}")
     
-    out = cv2.VideoWriter(temp_video, fourcc, fps, (final_width, final_height))
+    throughput = create_throughput("video_assembly", len(frame_indices))
+    timing = create_frame_timing(fps) if timestamps else None
+    frame_time = lambda idx: timestamps[idx] if timestamps and idx < len(timestamps) else None
     
-    if not out.isOpened():
-        raise ValueError(f"❌ Não foi possível criar o vídeo: {temp_video}")
+    # (frame, frame de origem, repete o anterior): duplicados consecutivos não são lidos de novo
+    sources = [duplicates.get(idx, idx) if duplicates else idx for idx in frame_indices]
+    entries = [(idx, source, i > 0 and source == sources[i - 1])
+               for i, (idx, source) in enumerate(zip(frame_indices, sources))]
+    workers = workers or min(ASSEMBLY_MAX_WORKERS, os.cpu_count() or 1)
+    depth = max(workers + 1, min(workers * 4, ASSEMBLY_BUFFER_BYTES // max(sample_frame.nbytes, 1)))
+    
+    def load(entry):
+        _, source_idx, repeat = entry
+        if repeat:
+            return None
+        with profile_span("store_read" if store is not None else "png_read"):
+            frame = read_frame(source_idx)
+        if frame is not None and (frame.shape[1], frame.shape[0]) != frame_size:
+            frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_LANCZOS4)
+        return frame
     
     try:
-        log_message("📼 Montando vídeo final (sem áudio)...")
-        for i, frame_file in enumerate(upscaled_frame_files):
-            frame_path = os.path.join(tmp_dir, frame_file)
-            frame = cv2.imread(frame_path)
+        log_message(f"📼 Montando vídeo final ({'com' if audio_source else 'sem'} áudio, "
+                    f"{workers} threads de leitura)...")
+        last_source, last_frame = None, None
+        for i, ((frame_idx, source_idx, repeat), frame) in enumerate(prefetch_ordered(entries, load, workers, depth)):
+            if repeat:
+                frame = last_frame if last_source == source_idx else None
             
             if frame is None:
-                log_message(f"⚠️ Não foi possível ler frame: {frame_file}", "warning")
+                log_message(f"⚠️ Não foi possível ler frame: {source_idx}", "warning")
                 continue
-                
-            if frame.shape[1] != final_width or frame.shape[0] != final_height:
-                frame = cv2.resize(frame, (final_width, final_height), interpolation=cv2.INTER_LANCZOS4)
             
-            out.write(frame)
+            with profile_span("encode_write"):
+                write_timed_frame(out, frame, frame_time(frame_idx), timing)
+            last_source, last_frame = source_idx, frame
             
-            if (i + 1) % 50 == 0:
-                progress = 80 + ((i + 1) / len(upscaled_frame_files)) * 15
-                progress_update(progress, f"Montando vídeo: {i + 1}/{len(upscaled_frame_files)} frames", "video_assembly")
+            # Na montagem antecipada o progresso fica com o upscale até ele terminar
+            if (i + 1) % 50 == 0 and (readiness is None or readiness["finished"]):
+                progress = 80 + ((i + 1) / len(frame_indices)) * 15
+                progress_update(progress, f"Montando vídeo: {i + 1}/{len(frame_indices)} frames", "video_assembly")
+            throughput_tick(throughput, i + 1)
+            check_cancelled()
                 
     except Exception as e:
         log_message(f"❌ Erro ao montar vídeo: {e}", "error")
+        close_video_writer(out, completed=False)
         raise
-    finally:
-        out.release()
+    except BaseException:
+        close_video_writer(out, completed=False)
+        raise
+    else:
+        close_video_writer(out)
+    throughput_tick(throughput, len(frame_indices), force=True)
+    report_frame_timing(timing)
     
-    log_message(f"✅ Vídeo sem áudio montado: {temp_video}")
+    log_message(f"✅ Vídeo {'com' if audio_source else 'sem'} áudio montado: {temp_video}")
     
     # Verificar se o arquivo foi criado
     if not os.path.exists(temp_video):
         raise ValueError(f"❌ Vídeo temporário não foi criado: {temp_video}")
     
+    profile_bytes(os.path.getsize(temp_video))
     log_message(f"📊 Tamanho do vídeo: {os.path.getsize(temp_video) / (1024*1024):.2f} MB")
     return temp_video
 
+# ----------------------------
+# Staging com orçamento de disco: extração, upscale e encode sobrepostos
+# ----------------------------
+def create_disk_budget(limit_bytes):
+    """Contabiliza os bytes dos PNGs em staging; a extração espera enquanto o uso estiver no limite"""
+    return {
+        "limit": limit_bytes,
+        "used": 0,
+        "peak": 0,
+        "pauses": 0,
+        "paused_seconds": 0.0,
+        "closed": False,
+        "on_pause": None,  # chamado antes de cada pausa (ex.: entregar um lote incompleto ao upscaler)
+        "cond": threading.Condition(),
+    }
+
+def disk_budget_wait(budget):
+    """Espera o staging sair do limite. Retorna False se o orçamento foi encerrado durante a espera"""
+    with budget["cond"]:
+        if budget["used"] < budget["limit"]:
+            return True
+        budget["pauses"] += 1
+        if budget["pauses"] == 1:
+            log_message(f"⏸️ Staging no limite ({budget['used'] / (1024 * 1024):.1f} MB), "
+                        f"extração pausada até o upscale/encode liberarem espaço")
+    # Fora do lock: o callback pode submeter trabalho que libera espaço
+    if budget["on_pause"] is not None:
+        budget["on_pause"]()
+    started = time.perf_counter()
+    with budget["cond"]:
+        while budget["used"] >= budget["limit"] and not budget["closed"]:
+            check_cancelled()
+            budget["cond"].wait(timeout=CANCEL_POLL_INTERVAL)
+        budget["paused_seconds"] += time.perf_counter() - started
+        return not budget["closed"]
+
+def disk_budget_add(budget, nbytes):
+    with budget["cond"]:
+        budget["used"] += nbytes
+        budget["peak"] = max(budget["peak"], budget["used"])
+
+def disk_budget_release(budget, nbytes):
+    with budget["cond"]:
+        budget["used"] = max(budget["used"] - nbytes, 0)
+        budget["cond"].notify_all()
+
+def disk_budget_close(budget):
+    """Libera quem estiver esperando espaço (fim ou erro do pipeline)"""
+    with budget["cond"]:
+        budget["closed"] = True
+        budget["cond"].notify_all()
+
+def remove_staged_file(budget, path):
+    """Apaga um PNG de staging e devolve o espaço ao orçamento"""
+    try:
+        nbytes = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return
+    disk_budget_release(budget, nbytes)
+
+def report_disk_budget(budget):
+    """Resumo do staging: pico de uso em relação ao orçamento e tempo de extração pausada"""
+    send_metrics({
+        "stagingBytes": budget["used"],
+        "stagingPeakBytes": budget["peak"],
+        "stagingBudgetBytes": budget["limit"],
+        "extractionPauses": budget["pauses"],
+        "extractionPausedSeconds": round(budget["paused_seconds"], 2),
+    })
+    log_message(f"💽 Staging: pico de {budget['peak'] / (1024 * 1024):.1f} MB "
+                f"(orçamento {budget['limit'] / (1024 * 1024):.0f} MB), "
+                f"extração pausada {budget['paused_seconds']:.1f}s em {budget['pauses']} pausas")
+
+def reset_job_frames(job):
+    """Descarta os PNGs de uma execução anterior: com limpeza antecipada eles não cobrem o vídeo inteiro"""
+    manifest = job["manifest"]
+    if manifest["extracted_frames"] or manifest["upscaled"]:
+        log_message(f"⚠️ Retomada indisponível no staging com orçamento de disco: {manifest['extracted_frames']} "
+                    f"frames extraídos e {len(manifest['upscaled'])} com upscale da execução anterior serão "
+                    f"refeitos (com frameCache o upscale dos frames já processados é reaproveitado)", "warning")
+    removed = 0
+    for f in os.listdir(job["dir"]):
+        if f.startswith("frame_") and f.endswith(".png"):
+            os.remove(os.path.join(job["dir"], f))
+            removed += 1
+    manifest["extracted_frames"] = 0
+    manifest["extraction_complete"] = False
+    manifest["upscaled"] = []
+    manifest["duplicates"] = {}
+    save_manifest(job)
+    if removed:
+        log_message(f"🧽 {removed} frames de uma execução anterior descartados (staging com orçamento)")
+
+def stage_with_disk_budget(input_path, output_path, job, backend, scale, fps, frame_count,
+                           target_width=None, target_height=None, gpu_memory_limit=None, options=None,
+                           cache=None, encoder=None, audio_source=None, prescale=None, decoder=None):
+    """Pipeline em disco com orçamento de espaço: extração, upscale e encode ao mesmo tempo.
+
+    A extração roda em uma thread e pausa quando os PNGs em staging chegam a
+    `disk_budget_mb`; cada PNG de origem é apagado assim que seu upscale existe e
+    cada frame_up_*.png assim que é escrito no vídeo, na ordem original. O pico
+    pode passar do limite pelos frames que já estão no upscaler.
+    A deduplicação compara só com o frame anterior: o encoder repete o último
+    frame escrito, como no modo streaming. O manifesto do job registra os frames
+    com upscale e os duplicados; como os PNGs são apagados pelo caminho, uma
+    retomada refaz o job a partir da extração (ver reset_job_frames).
+    Retorna (vídeo, frames_processados).
+    """
+    options = options or dict(DEFAULT_OPTIONS)
+    tmp_dir = job["dir"]
+    manifest = job["manifest"]
+    reset_job_frames(job)
+    
+    budget = create_disk_budget(options["disk_budget_mb"] * 1024 * 1024)
+    frame_size = (prescale or get_video_info(input_path)[2:]) if options["autotune"] else None
+    settings, tuner = resolve_backend_settings(backend, gpu_memory_limit, frame_size, scale, options["autotune"])
+    exe_path = backend["exe_path"]
+    chunk_size = options["chunk_size"]
+    if not exe_path and chunk_size <= 0:
+        chunk_size = settings["batch_size"]
+    max_workers = AUTOTUNE_MAX_WORKERS if tuner is not None else settings["num_threads"]
+    dedup = create_dedup_state(options["dedup_threshold"], consecutive_only=True) if options["dedup"] else None
+    
+    temp_video, audio_source = output_video_target(output_path, encoder, audio_source)
+    
+    # índice → True/False (resultado do upscale) ou None (duplicado: repete o último frame)
+    results = {}
+    results_cond = threading.Condition()
+    extraction = {"total": None}
+    errors = []
+    timestamps = []
+    pending_group = []
+    chunk_counter = itertools.count()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    
+    def publish(idx, status):
+        with results_cond:
+            results[idx] = status
+            results_cond.notify_all()
+    
+    def finish_group(group, future):
+        if future.cancelled():
+            return
+        try:
+            group_results = future.result()
+            if exe_path and chunk_size <= 0:
+                group_results = [group_results]
+        except Exception as e:
+            log_message(f"❌ Erro no(s) frame(s) {', '.join(group)}: {e}", "error")
+            group_results = [(False, frame_file) for frame_file in group]
+        try:
+            for success, frame_file in group_results:
+                idx = int(frame_file[len("frame_"):-len(".png")])
+                if success:
+                    disk_budget_add(budget, os.path.getsize(os.path.join(tmp_dir, f"frame_up_{idx:06d}.png")))
+                # Origem apagada assim que o upscale existe (ou falhou de vez)
+                remove_staged_file(budget, os.path.join(tmp_dir, frame_file))
+                publish(idx, success)
+        except Exception as e:
+            # Callbacks de Future engolem exceções: o encoder ficaria esperando o frame para sempre
+            errors.append(e)
+            with results_cond:
+                results_cond.notify_all()
+    
+    def flush_group():
+        if not pending_group:
+            return
+        group = list(pending_group)
+        del pending_group[:]
+        if exe_path and chunk_size > 0:
+            future = executor.submit(bind_job_context(process_frame_chunk), next(chunk_counter), group, tmp_dir,
+                                     exe_path, scale, settings, cache, tuner)
+        elif exe_path:
+            future = executor.submit(bind_job_context(process_single_frame), group[0], tmp_dir, exe_path, scale,
+                                     settings, cache, tuner)
+        else:
+            future = executor.submit(bind_job_context(process_frame_batch_in_memory), group, tmp_dir, backend,
+                                     scale, settings, cache)
+        future.add_done_callback(bind_job_context(lambda f: finish_group(group, f)))
+    
+    def on_frame(idx, saved, source):
+        if errors or budget["closed"]:
+            return False
+        if source is not None:
+            publish(idx, None)
+        elif not saved:
+            publish(idx, False)
+        else:
+            pending_group.append(f"frame_{idx:06d}.png")
+            if len(pending_group) >= max(chunk_size, 1):
+                flush_group()
+        return True
+    
+    # Lote incompleto parado na pausa nunca seria completado: vai para o upscaler antes de esperar
+    budget["on_pause"] = flush_group
+    
+    def extract():
+        total = 0
+        try:
+            total = extract_frames(input_path, job["tmp_folder"], 0, None, dedup, frame_count, None, prescale,
+                                   decoder, timestamps, budget, on_frame, report_progress=False)
+            flush_group()
+        except BaseException as e:  # Inclui JobCancelled da espera por espaço
+            errors.append(e)
+        finally:
+            with results_cond:
+                extraction["total"] = total
+                results_cond.notify_all()
+    
+    log_message(f"💽 Staging com orçamento de {options['disk_budget_mb']} MB: {max_workers} threads de upscale"
+                + (f", lotes de {chunk_size} frames" if chunk_size > 0 else ""))
+    extractor = threading.Thread(target=bind_job_context(extract), daemon=True)
+    extractor.start()
+    
+    out = None
+    last_written = None
+    timing = create_frame_timing(fps)
+    next_idx = 0
+    successful_frames = 0
+    failed_frames = 0
+    throughput = create_throughput("staging", frame_count)
+    
+    try:
+        while True:
+            with results_cond:
+                while next_idx not in results and not errors and (
+                        extraction["total"] is None or next_idx < extraction["total"]):
+                    check_cancelled()
+                    results_cond.wait(timeout=CANCEL_POLL_INTERVAL)
+                if errors:
+                    raise errors[0]
+                if next_idx not in results:
+                    break
+                status = results.pop(next_idx)
+            frame_idx = next_idx
+            next_idx += 1
+            
+            if status is None:
+                frame = last_written
+            elif status:
+                up_path = os.path.join(tmp_dir, f"frame_up_{frame_idx:06d}.png")
+                with profile_span("png_read"):
+                    frame = cv2.imread(up_path)
+                # Frame com upscale apagado assim que lido para o encode
+                remove_staged_file(budget, up_path)
+                manifest["upscaled"].append(frame_idx)
+                save_manifest(job, force=False)
+            else:
+                frame = None
+            if frame is None:
+                failed_frames += 1
+                log_message(f"⚠️ Falha no upscale do frame {frame_idx}", "warning")
+                continue
+            
+            if out is None:
+                out, frame_size = open_output_writer(temp_video, fps, frame, target_width, target_height, encoder,
+                                                     audio_source)
+            
+            if (frame.shape[1], frame.shape[0]) != frame_size:
+                frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_LANCZOS4)
+            with profile_span("encode_write"):
+                write_timed_frame(out, frame, timestamps[frame_idx] if frame_idx < len(timestamps) else None,
+                                  timing)
+            last_written = frame
+            successful_frames += 1
+            
+            if next_idx % 30 == 0:
+                progress = 10 + (next_idx / max(frame_count, next_idx)) * 85
+                progress_update(progress, f"Processados {next_idx}/{frame_count} frames", "staging")
+            throughput_tick(throughput, next_idx, stagingBytes=budget["used"])
+        
+        check_cancelled()
+        completed = True
+    except BaseException:
+        completed = False
+        raise
+    finally:
+        disk_budget_close(budget)
+        executor.shutdown(wait=True, cancel_futures=True)
+        extractor.join(timeout=5)
+        if out is not None:
+            close_video_writer(out, completed)
+    
+    if dedup is not None:
+        manifest["duplicates"] = {str(idx): src for idx, src in dedup["duplicates"].items()}
+    manifest["extracted_frames"] = next_idx
+    manifest["extraction_complete"] = True
+    save_manifest(job)
+    save_job_timestamps(job, timestamps)
+    
+    throughput_tick(throughput, next_idx, force=True, stagingBytes=budget["used"])
+    report_frame_timing(timing)
+    report_disk_budget(budget)
+    if os.path.exists(temp_video):
+        profile_bytes(os.path.getsize(temp_video))
+    log_message(f"📊 Resultado final: {successful_frames} frames bem-sucedidos, {failed_frames} falhas")
+    if dedup is not None:
+        report_dedup_metrics(next_idx, len(dedup["duplicates"]))
+    if cache is not None:
+        report_cache_metrics(cache)
+    if tuner is not None:
+        autotune_finish(tuner)
+    return temp_video, successful_frames
+
+def _queue_put(q, item, stop_event):
+    """Coloca um item na fila sem bloquear para sempre se o pipeline for interrompido"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _queue_get(q, stop_event):
+    """Lê um item da fila; retorna (False, None) se o pipeline for interrompido"""
+    while not stop_event.is_set():
+        try:
+            return True, q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return False, None
+
+def get_scratch_root():
+    """Retorna um diretório em memória (tmpfs) para os slots de troca, quando disponível"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None  # Usa o diretório temporário padrão do sistema
+
+def upscale_frame_in_memory(frame, slot_dir, exe_path, scale, settings, cache=None, tuner=None):
+    """Faz upscale de um frame BGR em memória usando um slot de troca fixo por worker.
+
+    O executável do Real-ESRGAN só aceita arquivos, então cada worker reutiliza
+    sempre o mesmo par de arquivos (PNG sem compressão) em vez de gerar um por frame.
+    """
+    slot_input = os.path.join(slot_dir, "in.png")
+    slot_output = os.path.join(slot_dir, "out.png")
+    if os.path.exists(slot_output):
+        os.remove(slot_output)
+    
+    with (autotune_slot(tuner) if tuner is not None else contextlib.nullcontext(settings)) as settings:
+        cache_key = None
+        if cache is not None:
+            cache_key = frame_cache_key(frame, scale, settings)
+            if frame_cache_lookup(cache, cache_key, slot_output):
+                return cv2.imread(slot_output)
+        
+        if not cv2.imwrite(slot_input, frame, [cv2.IMWRITE_PNG_COMPRESSION, 0]):
+            return None
+        
+        try:
+            success = run_upscaler(slot_input, slot_output, exe_path, scale, settings, "upscale em memória", tuner)
+        except subprocess.TimeoutExpired:
+            log_message("⏰ Timeout no upscale em memória", "warning")
+            return None
+    
+    if not success:
+        return None
+    if cache_key is not None:
+        frame_cache_store(cache, cache_key, slot_output)
+    if tuner is not None:
+        autotune_record(tuner)
+    return cv2.imread(slot_output)
+
+# ----------------------------
+# Tile-diff temporal: upscale só das regiões que mudaram entre frames
+# ----------------------------
+TILE_DIFF_FULL_RATIO = 0.5          # acima desta fração de tiles alterados o frame inteiro vai para o upscaler
+TILE_DIFF_KEYFRAME_INTERVAL = 120   # frames entre upscales completos (limita o acúmulo de erro das transições)
+
+def create_tile_diff_state(tile_size=128, overlap=16, threshold=1.0, keyframe_interval=TILE_DIFF_KEYFRAME_INTERVAL):
+    """Estado do tile-diff, mantido pelo decoder (que vê os frames em ordem).
+
+    `ref` guarda, para cada tile, o conteúdo de entrada que foi enviado ao
+    upscaler pela última vez: a comparação é sempre contra o que está de fato
+    na saída, então pequenas diferenças não se acumulam frame a frame.
+    `retry` guarda os tiles cujo upscale falhou (ver mark_tiles_failed): eles
+    voltam no próximo plano mesmo sem diferença em relação a `ref`. Com
+    `full_retry` (upscale do frame inteiro falhou) o próximo frame vai inteiro.
+    """
+    return {
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "threshold": threshold,
+        "keyframe_interval": keyframe_interval,
+        "ref": None,
+        "retry": set(),
+        "full_retry": False,
+        "lock": threading.Lock(),
+        "since_keyframe": 0,
+        "tiles_total": 0,
+        "tiles_skipped": 0,
+    }
+
+def plan_changed_tiles(frame, state):
+    """Compara o frame com a referência e retorna os tiles a refazer.
+
+    Retorna None quando o frame inteiro deve passar pelo upscaler (primeiro frame,
+    keyframe periódico ou mudanças demais); senão uma lista (possivelmente vazia)
+    de (tile, região_com_margem), ambos como (x0, y0, x1, y1) na entrada.
+    """
+    height, width = frame.shape[:2]
+    tile_size, overlap = state["tile_size"], state["overlap"]
+    tiles = [(x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+             for y0 in range(0, height, tile_size) for x0 in range(0, width, tile_size)]
+    state["tiles_total"] += len(tiles)
+    with state["lock"]:
+        retry, state["retry"] = state["retry"], set()
+        full_retry, state["full_retry"] = state["full_retry"], False
+    
+    ref = state["ref"]
+    if (full_retry or ref is None or ref.shape != frame.shape
+            or state["since_keyframe"] >= state["keyframe_interval"]):
+        state["ref"] = frame.copy()
+        state["since_keyframe"] = 0
+        return None
+    
+    diff = cv2.absdiff(frame, ref)
+    changed = [tile for tile in tiles
+               if tile in retry or diff[tile[1]:tile[3], tile[0]:tile[2]].mean() > state["threshold"]]
+    state["since_keyframe"] += 1
+    if len(changed) > len(tiles) * TILE_DIFF_FULL_RATIO:
+        state["ref"] = frame.copy()
+        state["since_keyframe"] = 0
+        return None
+    
+    state["tiles_skipped"] += len(tiles) - len(changed)
+    plan = []
+    for x0, y0, x1, y1 in changed:
+        ref[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+        padded = (max(0, x0 - overlap), max(0, y0 - overlap), min(width, x1 + overlap), min(height, y1 + overlap))
+        plan.append(((x0, y0, x1, y1), padded))
+    return plan
+
+def mark_tiles_failed(state, plan):
+    """Upscale dos tiles do `plan` falhou: `ref` já avançou, então eles entram à força no próximo plano.
+
+    Com `plan` None (frame inteiro) a saída não corresponde mais a `ref`: o próximo frame vai inteiro.
+    """
+    with state["lock"]:
+        if plan is None:
+            state["full_retry"] = True
+        else:
+            state["retry"].update(tile for tile, _ in plan)
+
+def upscale_changed_tiles(frame, plan, backend, scale, settings, cache=None, tuner=None):
+    """Upscale dos tiles alterados (com margem de contexto) em um único lote do backend.
+
+    Retorna a lista de patches (tile, região_com_margem, recorte_com_upscale) ou None se algum tile falhar.
+    """
+    crops = [np.ascontiguousarray(frame[py0:py1, px0:px1]) for _, (px0, py0, px1, py1) in plan]
+    with (autotune_slot(tuner) if tuner is not None else contextlib.nullcontext(settings)) as tile_settings:
+        upscaled = upscale_frames_with_backend(crops, backend, scale, tile_settings, cache, tuner)
+    if any(crop is None for crop in upscaled):
+        return None
+    if tuner is not None and backend["exe_path"]:
+        autotune_record(tuner)
+    return [(tile, padded, crop) for (tile, padded), crop in zip(plan, upscaled)]
+
+def _feather_weights(length, start_margin, end_margin):
+    """Peso 1 no tile e rampa linear até 0 nas margens (transição sem emenda visível)"""
+    weights = np.ones(length, dtype=np.float32)
+    if start_margin:
+        weights[:start_margin] = np.arange(1, start_margin + 1, dtype=np.float32) / (start_margin + 1)
+    if end_margin:
+        weights[length - end_margin:] = np.arange(end_margin, 0, -1, dtype=np.float32) / (end_margin + 1)
+    return weights
+
+def apply_tile_patches(canvas, patches, scale):
+    """Aplica os patches sobre o último frame com upscale (no próprio array), mesclando as bordas"""
+    for (x0, y0, x1, y1), (px0, py0, px1, py1), crop in patches:
+        region = canvas[py0 * scale:py1 * scale, px0 * scale:px1 * scale]
+        if crop.shape != region.shape:
+            crop = cv2.resize(crop, (region.shape[1], region.shape[0]), interpolation=cv2.INTER_LANCZOS4)
+        weights = np.minimum.outer(
+            _feather_weights(region.shape[0], (y0 - py0) * scale, (py1 - y1) * scale),
+            _feather_weights(region.shape[1], (x0 - px0) * scale, (px1 - x1) * scale),
+        )[:, :, None]
+        region[...] = (crop * weights + region * (1.0 - weights) + 0.5).astype(np.uint8)
+    return canvas
+
+def report_tile_diff_metrics(state):
+    """Fração de tiles que não passaram pelo upscaler no job"""
+    total = state["tiles_total"]
+    skipped_fraction = state["tiles_skipped"] / total if total else 0.0
+    send_metrics({
+        "tilesTotal": total,
+        "tilesSkipped": state["tiles_skipped"],
+        "tilesSkippedFraction": skipped_fraction,
+    })
+    log_message(f"🧩 Tile-diff: {state['tiles_skipped']}/{total} tiles reaproveitados ({skipped_fraction:.1%})")
+
+# Marca enviada ao encoder no lugar de um frame duplicado do anterior
+_DUPLICATE_FRAME = "duplicate"
+
+def stream_video(input_path, output_path, backend, scale, fps, frame_count,
+                 target_width=None, target_height=None, gpu_memory_limit=None, queue_depth=8,
+                 dedup_threshold=None, cache=None, autotune=False, encoder=None, audio_source=None,
+                 tile_diff=None, prescale=None, decoder=None):
+    """Pipeline em streaming: decode → upscale → encode rodando em paralelo.
+
+    Os frames circulam como buffers BGR em filas limitadas por `queue_depth`,
+    então o pico de memória fica em torno de 2 * queue_depth + workers frames.
+    Com `dedup_threshold` (não None) frames iguais ao anterior pulam o upscaler
+    e o encoder repete o último frame escrito.
+    Com `encoder` + `audio_source` o áudio entra no próprio encode e o vídeo
+    retornado já é `output_path`.
+    Com `tile_diff` (ver create_tile_diff_state) só os tiles alterados passam pelo
+    upscaler e o encoder os aplica sobre o último frame com upscale.
+    Com `prescale` (largura, altura) o decoder reduz os frames antes do upscaler.
+    Com `decoder` (ver get_decoder_settings) o decode é feito pelo FFmpeg e os
+    timestamps de cada frame chegam ao encoder (ver write_timed_frame).
+    Retorna (vídeo, frames_processados).
+    """
+    frame_size = (prescale or get_video_info(input_path)[2:]) if autotune else None
+    settings, tuner = resolve_backend_settings(backend, gpu_memory_limit, frame_size, scale, autotune)
+    # Com autotune sobem workers até o limite e autotune_slot controla quantos rodam juntos
+    num_workers = AUTOTUNE_MAX_WORKERS if tuner is not None else settings["num_threads"]
+    
+    frames_in = queue.Queue(maxsize=queue_depth)
+    frames_out = queue.Queue(maxsize=queue_depth)
+    stop_event = threading.Event()
+    errors = []
+    
+    temp_video, audio_source = output_video_target(output_path, encoder, audio_source)
+    scratch_dir = tempfile.mkdtemp(prefix="upscale_stream_", dir=get_scratch_root())
+    dedup = create_dedup_state(dedup_threshold, consecutive_only=True) if dedup_threshold is not None else None
+    frame_times = {}  # índice → timestamp (s), preenchido pelo decoder e consumido pelo encoder
+    
+    def decode_frames():
+        cap = open_video_reader(input_path, decoder, prescale)
+        try:
+            frame_idx = 0
+            while not stop_event.is_set():
+                if is_cancelled():
+                    stop_event.set()
+                    break
+                with profile_span("decode"):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_times[frame_idx] = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                if prescale and (frame.shape[1], frame.shape[0]) != tuple(prescale):
+                    frame = cv2.resize(frame, tuple(prescale), interpolation=cv2.INTER_AREA)
+                duplicate = dedup is not None and find_duplicate_frame(frame, frame_idx, dedup) is not None
+                plan = plan_changed_tiles(frame, tile_diff) if tile_diff is not None and not duplicate else None
+                # Sem nenhum tile alterado o encoder repete o último frame, como em um duplicado
+                if duplicate or plan == []:
+                    item, target = (frame_idx, _DUPLICATE_FRAME), frames_out
+                else:
+                    item, target = (frame_idx, frame, plan), frames_in
+                if not _queue_put(target, item, stop_event):
+                    break
+                frame_idx += 1
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        finally:
+            cap.release()
+            for _ in range(num_workers):
+                _queue_put(frames_in, None, stop_event)
+    
+    def upscaler(worker_idx):
+        slot_dir = os.path.join(scratch_dir, f"worker_{worker_idx}")
+        os.makedirs(slot_dir, exist_ok=True)
+        try:
+            while True:
+                ok, item = _queue_get(frames_in, stop_event)
+                if not ok or item is None:
+                    break
+                frame_idx, frame, plan = item
+                if plan is not None:
+                    with profile_span("upscale_tiles"):
+                        patches = upscale_changed_tiles(frame, plan, backend, scale, settings, cache, tuner)
+                    if patches is None:
+                        mark_tiles_failed(tile_diff, plan)
+                    if not _queue_put(frames_out, (frame_idx, {"patches": patches}), stop_event):
+                        break
+                    continue
+                with profile_span("upscale_frame"):
+                    if backend["exe_path"]:
+                        upscaled = upscale_frame_in_memory(frame, slot_dir, backend["exe_path"], scale, settings,
+                                                           cache, tuner)
+                    else:
+                        upscaled = upscale_frames_with_backend([frame], backend, scale, settings, cache)[0]
+                if upscaled is None and tile_diff is not None:
+                    mark_tiles_failed(tile_diff, None)
+                if not _queue_put(frames_out, (frame_idx, upscaled), stop_event):
+                    break
+        except BaseException as e:  # Inclui JobCancelled do upscaler
+            errors.append(e)
+            stop_event.set()
+        finally:
+            _queue_put(frames_out, None, stop_event)
+    
+    threads = [threading.Thread(target=bind_job_context(decode_frames), daemon=True)]
+    threads += [threading.Thread(target=bind_job_context(upscaler), args=(i,), daemon=True)
+                for i in range(num_workers)]
+    
+    log_message(f"🌊 Modo streaming: {num_workers} workers, fila de {queue_depth} frames")
+    for t in threads:
+        t.start()
+    
+    out = None
+    last_written = None
+    canvas = None  # último frame com upscale (antes do resize final), base dos patches do tile-diff
+    timing = create_frame_timing(fps)
+    pending = {}
+    next_idx = 0
+    finished_workers = 0
+    successful_frames = 0
+    failed_frames = 0
+    throughput = create_throughput("streaming", frame_count)
+    
+    try:
+        while finished_workers < num_workers:
+            ok, item = _queue_get(frames_out, stop_event)
+            if not ok:
+                break
+            check_cancelled()
+            if item is None:
+                finished_workers += 1
+                continue
+            
+            frame_idx, upscaled = item
+            pending[frame_idx] = upscaled
+            profile_queue("frames_in", frames_in.qsize())
+            profile_queue("frames_out", frames_out.qsize())
+            profile_queue("reorder_buffer", len(pending))
+            
+            # Escrever os frames na ordem original (buffer de reordenação)
+            while next_idx in pending:
+                frame = pending.pop(next_idx)
+                frame_time = frame_times.pop(next_idx, None)
+                next_idx += 1
+                if isinstance(frame, str) and frame == _DUPLICATE_FRAME:
+                    # No tile-diff, sem tiles alterados em relação a um frame inteiro que falhou não há o que repetir
+                    frame = last_written if tile_diff is None or canvas is not None else None
+                elif isinstance(frame, dict):
+                    # Cópia: o frame anterior pode ainda ser repetido pelo posicionamento por timestamp.
+                    # O resultado vira a nova base: os próximos patches só cobrem o que mudou depois dele
+                    if frame["patches"] is None:
+                        frame = None
+                    else:
+                        if canvas is not None:
+                            canvas = apply_tile_patches(canvas.copy(), frame["patches"], scale)
+                        frame = canvas
+                else:
+                    # Frame inteiro: nova base dos patches. Com falha (None) os patches já planejados
+                    # sobre ele ficam sem base até o próximo frame inteiro (ver mark_tiles_failed)
+                    canvas = frame
+                if frame is None:
+                    failed_frames += 1
+                    log_message(f"⚠️ Falha no upscale do frame {next_idx - 1}", "warning")
+                    continue
+                
+                if out is None:
+                    out, frame_size = open_output_writer(temp_video, fps, frame, target_width, target_height,
+                                                         encoder, audio_source)
+                
+                if (frame.shape[1], frame.shape[0]) != frame_size:
+                    frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_LANCZOS4)
+                with profile_span("encode_write"):
+                    write_timed_frame(out, frame, frame_time, timing)
+                last_written = frame
+                successful_frames += 1
+                
+                if next_idx % 30 == 0:
+                    progress = 10 + (next_idx / max(frame_count, next_idx)) * 70
+                    progress_update(progress, f"Processados {next_idx}/{frame_count} frames", "streaming")
+                throughput_tick(throughput, next_idx, queueDepths={"in": frames_in.qsize(), "out": frames_out.qsize(),
+                                                                   "reorder": len(pending)})
+        
+        check_cancelled()
+        if errors:
+            raise errors[0]
+        completed = True
+    except BaseException:
+        completed = False
+        stop_event.set()
+        raise
+    finally:
+        for t in threads:
+            t.join(timeout=5)
+        if out is not None:
+            close_video_writer(out, completed)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    
+    throughput_tick(throughput, next_idx, force=True)
+    report_frame_timing(timing)
+    if os.path.exists(temp_video):
+        profile_bytes(os.path.getsize(temp_video))
+    log_message(f"📊 Resultado final: {successful_frames} frames bem-sucedidos, {failed_frames} falhas")
+    if dedup is not None:
+        report_dedup_metrics(next_idx, len(dedup["duplicates"]))
+    if tile_diff is not None:
+        report_tile_diff_metrics(tile_diff)
+    if cache is not None:
+        report_cache_metrics(cache)
+    if tuner is not None:
+        autotune_finish(tuner)
+    return temp_video, successful_frames
+
+def choose_segment_cuts(keyframes, num_segments, duration):
+    """Keyframes mais próximos de k·duração/n (k = 1..n-1), sem repetir e sem o instante inicial"""
+    if not keyframes:
+        return []
+    start = keyframes[0]
+    cuts = []
+    for k in range(1, num_segments):
+        target = start + duration * k / num_segments
+        cut = min(keyframes, key=lambda t: abs(t - target))
+        if cut > start and (not cuts or cut > cuts[-1]):
+            cuts.append(cut)
+    return cuts
+
+def split_video_at_keyframes(input_path, segments_dir, num_segments, duration):
+    """Divide o vídeo (somente a trilha de vídeo) em segmentos alinhados a keyframes, sem reencode.
+
+    Com o índice de keyframes do probe os cortes caem nos keyframes mais próximos
+    das divisões uniformes (segmentos equilibrados); sem ele o segment muxer corta
+    no primeiro keyframe após cada intervalo fixo.
+    """
+    os.makedirs(segments_dir, exist_ok=True)
+    segment_time = max(duration / num_segments, 0.1)
+    probe = probe_video(input_path)
+    cuts = choose_segment_cuts(probe["keyframes"], num_segments, probe["duration"] or duration) if probe else []
+    if cuts:
+        # Um pouco antes do keyframe: o muxer corta no primeiro keyframe a partir do instante pedido
+        split_args = ["-segment_times", ",".join(f"{max(cut - 0.001, 0):.3f}" for cut in cuts)]
+        log_message(f"✂️ Dividindo vídeo em {len(cuts) + 1} segmentos nos keyframes "
+                    f"{', '.join(f'{cut:.2f}s' for cut in cuts)}")
+    else:
+        split_args = ["-segment_time", f"{segment_time:.3f}"]
+        log_message(f"✂️ Dividindo vídeo em até {num_segments} segmentos (~{segment_time:.1f}s cada)")
+    cmd = [
+        "ffmpeg",
+        "-i", input_path,
+        "-map", "0:v:0",
+        "-c", "copy",
+        "-f", "segment",
+        *split_args,
+        "-reset_timestamps", "1",
+        os.path.join(segments_dir, "segment_%03d.mp4"),
+        "-y"
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"❌ Erro ao dividir o vídeo: {result.stderr}")
+    
+    segment_files = sorted(f for f in os.listdir(segments_dir) if f.startswith("segment_") and f.endswith(".mp4"))
+    return [os.path.join(segments_dir, f) for f in segment_files]
+
+def process_segment(segment_idx, segment_path, tmp_root, backend_options, scale, fps, target_width, target_height,
+                    gpu_memory_limit, chunk_size, dedup_threshold=None, cache_config=None, encoder=None,
+                    prescale=None):
+    """Executa extract → upscale → encode para um segmento (roda em um processo separado).
+
+    Retorna (vídeo_do_segmento, frames_no_vídeo, frames_duplicados).
+    """
+    global PROGRESS_MUTED
+    PROGRESS_MUTED = True
+    PROFILER.set(None)  # Telemetria fica no processo principal (etapa "segments")
+    
+    tmp_folder = os.path.join(tmp_root, f"segment_{segment_idx:03d}")
+    clean_temp_folder(tmp_folder)
+    stores = (None, None)
+    try:
+        if backend_options["frame_store"] == "raw":
+            _, frame_count, width, height = get_video_info(segment_path)
+            width, height = prescale or (width, height)
+            stores = open_job_frame_stores(os.path.join(BASE_DIR, tmp_folder), width, height, scale, frame_count,
+                                           backend_options["frame_store_codec"])
+        source_store, target_store = stores
+        
+        dedup = create_dedup_state(dedup_threshold) if dedup_threshold is not None else None
+        timestamps = []
+        extracted_frames = extract_frames(segment_path, tmp_folder, dedup=dedup, store=source_store,
+                                          prescale=prescale, decoder=get_decoder_settings(backend_options),
+                                          timestamps=timestamps)
+        if extracted_frames == 0:
+            raise ValueError(f"❌ Nenhum frame extraído do segmento {segment_idx}")
+        duplicates = dedup["duplicates"] if dedup else {}
+        
+        cache = create_frame_cache(*cache_config) if cache_config else None
+        backend = create_upscaler_backend(backend_options)
+        width, height = prescale or get_video_info(segment_path)[2:]
+        backend = configure_frame_tiling(backend, width, height, scale, gpu_memory_limit, backend_options)
+        if source_store is not None:
+            successful_frames = upscale_frame_store(source_store, target_store, backend, scale, gpu_memory_limit,
+                                                    chunk_size, cache=cache)
+        else:
+            successful_frames = upscale_frames_optimized(tmp_folder, backend, scale, gpu_memory_limit, chunk_size,
+                                                         cache=cache)
+        if successful_frames == 0:
+            raise ValueError(f"❌ Nenhum frame processado no segmento {segment_idx}")
+        
+        segment_output = segment_path.replace(".mp4", "_up.mp4")
+        segment_video = create_output_video(tmp_folder, segment_output, fps, target_width, target_height, duplicates,
+                                            encoder, store=target_store, timestamps=timestamps)
+        return segment_video, successful_frames + len(duplicates), len(duplicates)
+    finally:
+        for store in stores:
+            if store is not None:
+                close_frame_store(store)
+        shutil.rmtree(os.path.join(BASE_DIR, tmp_folder), ignore_errors=True)
+
+def _init_segment_worker(job_id, cancel_event):
+    """Inicializa um processo de segmento: eventos com o id do job e cancelamento vindo do pai"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # O processo principal coordena o Ctrl+C
+    JOB_CONTEXT.set({"id": job_id, "cancel": cancel_event, "gpu": None})
+
+def concat_segments(segment_videos, output_path, audio_source=None):
+    """Junta os segmentos com o demuxer concat do FFmpeg (stream copy, sem reencode).
+
+    Com `audio_source` o áudio do original é multiplexado no mesmo passo.
+    """
+    list_path = output_path + ".segments.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for video in segment_videos:
+            escaped = video.replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    
+    cmd = [
+        "ffmpeg",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_path,
+    ]
+    if audio_source:
+        cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?"] + build_audio_args(audio_source) + ["-shortest"]
+    cmd += [
+        "-c:v", "copy",
+        "-movflags", "+faststart",
+        output_path,
+        "-y"
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ValueError(f"❌ Erro ao concatenar segmentos: {result.stderr}")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def process_segments_parallel(input_path, output_path, scale, fps, frame_count,
+                              target_width, target_height, gpu_memory_limit, options, job,
+                              encoder=None, audio_source=None, prescale=None):
+    """Modo segmentado: divide em keyframes, processa cada segmento em um processo e concatena.
+
+    Segmentos já concluídos em uma execução anterior do mesmo job são reaproveitados.
+    Com `audio_source` o áudio entra na própria concatenação e o vídeo retornado é
+    `output_path`; senão retorna o *_no_audio.mp4 para o mux posterior.
+    Retorna (vídeo, frames_processados).
+    """
+    manifest = job["manifest"]
+    segments_dir = os.path.join(job["dir"], "segments")
+    if manifest["segments_split"] and os.path.isdir(segments_dir):
+        segment_paths = sorted(os.path.join(segments_dir, f) for f in os.listdir(segments_dir)
+                               if f.startswith("segment_") and f.endswith(".mp4") and "_up" not in f)
+    else:
+        duration = frame_count / fps if fps else 0
+        segment_paths = split_video_at_keyframes(input_path, segments_dir, options["segments"], duration)
+        manifest["segments_split"] = True
+        manifest["segments_done"] = []
+        save_manifest(job)
+    if not segment_paths:
+        raise ValueError("❌ Nenhum segmento gerado")
+    
+    segment_videos = [None] * len(segment_paths)
+    done = {entry["index"]: entry for entry in manifest["segments_done"]}
+    successful_frames = 0
+    duplicate_frames = 0
+    pending = []
+    for idx, path in enumerate(segment_paths):
+        entry = done.get(idx)
+        if entry and os.path.exists(entry["video"]):
+            segment_videos[idx] = entry["video"]
+            successful_frames += entry["frames"]
+            duplicate_frames += entry.get("duplicates", 0)
+        else:
+            pending.append((idx, path))
+    if len(pending) < len(segment_paths):
+        log_message(f"♻️ {len(segment_paths) - len(pending)} segmentos já concluídos reaproveitados")
+    
+    max_workers = options["segment_workers"] or min(max(len(pending), 1), os.cpu_count() or 1)
+    throughput = create_throughput("segments", frame_count)
+    log_message(f"🧩 {len(segment_paths)} segmentos, {max_workers} processos paralelos")
+    
+    # Os segmentos rodam em outros processos: o cancelamento chega a eles por um Event compartilhado.
+    # "spawn" em todas as plataformas: fork de um processo com threads (modo servidor) pode herdar locks presos
+    context = JOB_CONTEXT.get()
+    mp_context = multiprocessing.get_context("spawn")
+    segment_cancel = mp_context.Event()
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=_init_segment_worker,
+                             initargs=(context["id"] if context else None, segment_cancel)) as executor:
+        future_to_idx = {
+            executor.submit(process_segment, idx, path, job["tmp_folder"], options, scale, fps,
+                            target_width, target_height, gpu_memory_limit, options["chunk_size"],
+                            options["dedup_threshold"] if options["dedup"] else None,
+                            (options["cache_dir"], options["cache_max_mb"]) if options["frame_cache"] else None,
+                            encoder, prescale): idx
+            for idx, path in pending
+        }
+        try:
+            for i, future in enumerate(as_completed_cancellable(future_to_idx)):
+                idx = future_to_idx[future]
+                segment_videos[idx], segment_frames, segment_duplicates = future.result()
+                successful_frames += segment_frames
+                duplicate_frames += segment_duplicates
+                manifest["segments_done"].append({"index": idx, "video": segment_videos[idx],
+                                                  "frames": segment_frames, "duplicates": segment_duplicates})
+                save_manifest(job)
+                progress = 10 + ((i + 1) / len(pending)) * 70
+                progress_update(progress, f"Segmentos concluídos: {i + 1}/{len(pending)}", "segments")
+                throughput_tick(throughput, successful_frames, force=True)
+                log_message(f"✅ Segmento {idx} concluído ({segment_frames} frames)")
+        except BaseException:
+            segment_cancel.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    
+    if options["dedup"]:
+        report_dedup_metrics(successful_frames, duplicate_frames)
+    
+    temp_video = output_path if audio_source else output_path.replace(".mp4", "_no_audio.mp4")
+    log_message("🔗 Concatenando segmentos...")
+    with profile_stage("concat"):
+        concat_segments(segment_videos, temp_video, audio_source)
+    profile_bytes(os.path.getsize(temp_video))
+    return temp_video, successful_frames
+
 def signal_handler(sig, frame):
     log_message('\n\n⚠️  Processamento interrompido pelo usuário!', "warning")
-    sys.exit(0)
+    with _active_jobs_lock:
+        running = [context for context in ACTIVE_JOBS.values() if not context["cancel"].is_set()]
+    if not running:
+        sys.exit(0)  # Nada em execução (ou segundo Ctrl+C): sai direto
+    # Cancela os jobs; cada um para no próximo ponto de verificação e salva o manifesto
+    for context in running:
+        context["cancel"].set()
 
-def process_video(input_path, output_path, scale=2, use_gpu=True, gpu_memory_limit=None):
+def process_video(input_path, output_path, scale=2, use_gpu=True, gpu_memory_limit=None, options=None):
     """Função principal para processar o vídeo."""
-    exe_path = os.path.join(BASE_DIR, "realesrgan_portable",
-                            "realesrgan-ncnn-vulkan-20220424-windows",
-                            "realesrgan-ncnn-vulkan.exe")
-    tmp_folder = "tmp_frames"
-
-    if not os.path.exists(exe_path):
-        raise FileNotFoundError(f"❌ Executável Real-ESRGAN não encontrado: {exe_path}")
+    options = options or dict(DEFAULT_OPTIONS)
 
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"❌ Arquivo não encontrado: {input_path}")
@@ -408,39 +4291,98 @@ def process_video(input_path, output_path, scale=2, use_gpu=True, gpu_memory_lim
 
     log_message(f"🎯 Arquivo de saída: {output_path}")
 
-    temp_audio = os.path.join(BASE_DIR, "temp_audio.aac")
+    # O tile-diff compõe cada frame sobre o anterior: precisa da ordem do pipeline em streaming
+    if options["tile_diff"] and options["segments"] <= 1 and not options["streaming"]:
+        log_message("🧩 Tile-diff ativo: usando o pipeline em streaming")
+        options = dict(options, streaming=True)
+    elif options["tile_diff"] and options["segments"] > 1:
+        log_message("⚠️ Tile-diff não é suportado no modo segmentado, ignorando", "warning")
+    # Os segmentos rodam em processos próprios, cada um com seu backend local
+    if (options["distributed_workers"] or options["distributed_local_workers"]) and options["segments"] > 1:
+        log_message("⚠️ Modo distribuído não é suportado no modo segmentado, ignorando", "warning")
+        options = dict(options, distributed_workers=[], distributed_local_workers=0)
+    # O frame store é pré-alocado: o orçamento de disco só vale para o staging em PNGs
+    if options["disk_budget_mb"] and options["frame_store"] != "png":
+        log_message("⚠️ Orçamento de disco não se aplica ao frame store, ignorando", "warning")
+        options = dict(options, disk_budget_mb=0)
+    # No modo distribuído o upscaler roda nos workers: o coordenador não precisa do backend local
+    distributed_mode = bool(options["distributed_workers"] or options["distributed_local_workers"])
+    backend = create_upscaler_backend(options) if not distributed_mode else None
+
+    # Jobs concluídos/abandonados saem conforme a política de retenção
+    cleanup_jobs(options["job_retention_hours"], options["stale_job_hours"])
+    
+    job = None
+    finished = False
+    stores = []
+    distributed, local_workers = None, []
+    cache = create_frame_cache(options["cache_dir"], options["cache_max_mb"]) if options["frame_cache"] else None
+    # Nome único: no modo servidor vários jobs podem estar extraindo áudio ao mesmo tempo
+    temp_audio = os.path.join(BASE_DIR, f"temp_audio.{os.getpid()}-{threading.get_ident()}.aac")
+    encoder = get_encoder_settings(options)
+    decoder = get_decoder_settings(options)
+    # Com o encoder FFmpeg o áudio do original é multiplexado no próprio encode
+    audio_source = input_path if encoder is not None else None
+    # Saída progressiva: segmentos HLS ao lado da saída, gravados pelo encode único do job
+    if options["progressive_output"] and encoder is None:
+        log_message("⚠️ Saída progressiva exige o encoder FFmpeg, ignorando", "warning")
+    elif options["progressive_output"] and options["segments"] > 1:
+        log_message("⚠️ Saída progressiva não é suportada no modo segmentado, ignorando", "warning")
+    elif options["progressive_output"]:
+        encoder = dict(encoder, progressive={"dir": progressive_output_dir(output_path),
+                                             "segment_seconds": options["progressive_segment_seconds"]})
+    profiler_token = PROFILER.set(create_profiler(options["trace_path"]))
 
     try:
         log_message("🎬 Iniciando upscale do vídeo...")
         progress_update(0, "Iniciando processamento...")
 
-        # Extrair áudio
-        log_message("🔊 Extraindo áudio do vídeo original...")
-        has_audio = extract_audio(input_path, temp_audio)
-        progress_update(10, "Áudio extraído")
+        # Probe único (com cache) para metadados, áudio e keyframes
+        probe = probe_video(input_path)
+        if probe is not None:
+            log_message(f"🔎 Probe: {describe_probe(probe)}")
 
-        # Limpar pasta temporária
-        clean_temp_folder(tmp_folder)
+        # Extrair áudio (só no caminho OpenCV, que faz o mux em um passo separado)
+        if audio_source:
+            has_audio = False
+        elif probe is not None and not probe["audio"]:
+            log_message("🔇 Vídeo sem trilha de áudio")
+            has_audio = False
+        else:
+            log_message("🔊 Extraindo áudio do vídeo original...")
+            with profile_stage("audio_extract"):
+                has_audio = extract_audio(input_path, temp_audio)
+        progress_update(10, "Áudio extraído")
 
-        # Informações do vídeo
-        fps, frame_count, width, height = get_video_info(input_path)
+        # Informações do vídeo (com o decoder FFmpeg, contagem exata de frames)
+        fps, frame_count, width, height = get_video_info(input_path, exact_count=decoder is not None)
         log_message(f"📊 Informações do vídeo:")
         log_message(f"   - Frames: {frame_count}")
         log_message(f"   - Resolução original: {width}x{height}")
         log_message(f"   - FPS: {fps:.2f}")
 
         # Enviar métricas iniciais
-        metrics_data = {
-            "type": "metrics",
-            "metrics": {
-                "totalFrames": frame_count,
-                "fps": fps,
-                "originalWidth": width,
-                "originalHeight": height,
-                "currentStage": "extracting_frames"
-            }
+        metrics = {
+            "totalFrames": frame_count,
+            "fps": fps,
+            "originalWidth": width,
+            "originalHeight": height,
+            "currentStage": "extracting_frames"
         }
-        print(json.dumps(metrics_data))
+        if probe is not None:
+            metrics.update({
+                "vfr": probe["vfr"],
+                "rotation": probe["rotation"],
+                "pixelFormat": probe["pix_fmt"],
+                "audioStreams": len(probe["audio"]),
+                "keyframes": len(probe["keyframes"]),
+            })
+        send_metrics(metrics)
+
+        # Modo distribuído: os lotes de frames vão para os workers em vez do backend local
+        if distributed_mode:
+            distributed, local_workers = create_job_distribution(options, gpu_memory_limit)
+            backend = distributed
 
         # Resolução final
         final_width, final_height = None, None
@@ -448,49 +4390,238 @@ def process_video(input_path, output_path, scale=2, use_gpu=True, gpu_memory_lim
             final_width, final_height = calculate_target_resolution(width, height, 1080)
             log_message(f"   - Resolução final: {final_width}x{final_height}")
 
-        # Extrair frames
-        log_message("🎞️ Extraindo frames do vídeo...")
-        extracted_frames = extract_frames(input_path, tmp_folder)
-        if extracted_frames == 0:
-            raise ValueError("❌ Nenhum frame foi extraído do vídeo")
-        progress_update(30, "Frames extraídos")
+        # Plano de resolução: escala do modelo, redução da entrada e onde fica o resize final
+        requested_scale = scale
+        plan = plan_resolution(width, height, scale, final_width, final_height, backend["scales"], encoder,
+                               options["resolution_plan"], options["resolution_skip"])
+        report_resolution_plan(plan, requested_scale)
+        if plan["mode"] == "skip":
+            log_message(f"⏭️ A origem {width}x{height} já cobre a entrega {plan['target'][0]}x{plan['target'][1]}: "
+                        f"upscaler desativado (resolutionSkip), apenas resize e reencode no FFmpeg", "warning")
+        scale = plan["model_scale"]
+        prescale = plan["prescale"]
+        if plan["mode"] != "skip":
+            width, height = prescale or (width, height)
+            backend = configure_frame_tiling(backend, width, height, scale, gpu_memory_limit, options)
+
+        # Diretório de trabalho do job (o modo streaming não usa PNGs em disco)
+        if plan["mode"] != "skip" and (not options["streaming"] or options["segments"] > 1):
+            job_settings = {
+                "scale": requested_scale,
+                "target": [final_width, final_height],
+                "segments": options["segments"],
+                "dedup": [options["dedup"], options["dedup_threshold"]],
+            }
+            if options["frame_store"] != "png":
+                job_settings["frame_store"] = options["frame_store"]
+            if scale != requested_scale or prescale:
+                job_settings["plan"] = [scale, prescale]
+            job = open_job(input_path, job_settings, options["resume"])
+            manifest = job["manifest"]
+            tmp_folder = job["tmp_folder"]
+            job_video = os.path.join(job["dir"], "video.mp4")
+
+        if plan["mode"] == "skip":
+            # A origem já cobre a resolução de entrega: sem upscaler
+            with profile_stage("transcode"):
+                successful_frames = transcode_to_target(input_path, output_path, plan["target"], encoder,
+                                                        frame_count)
+            temp_video = output_path
+        elif options["segments"] > 1:
+            # Segmentos alinhados a keyframes processados em paralelo
+            log_message("🧩 Iniciando processamento segmentado...")
+            with gpu_stage(), profile_stage("segments"):
+                temp_video, successful_frames = process_segments_parallel(
+                    input_path, job_video, scale, fps, frame_count,
+                    final_width, final_height, gpu_memory_limit, options, job, encoder, audio_source, prescale
+                )
+        elif options["streaming"]:
+            # Decode, upscale e encode simultâneos, sem PNGs em disco
+            log_message("🌊 Iniciando pipeline em streaming...")
+            with gpu_stage(), profile_stage("streaming"):
+                temp_video, successful_frames = stream_video(
+                    input_path, output_path, backend, scale, fps, frame_count,
+                    final_width, final_height, gpu_memory_limit, options["queue_depth"],
+                    options["dedup_threshold"] if options["dedup"] else None, cache, options["autotune"],
+                    encoder, audio_source,
+                    create_tile_diff_state(options["tile_diff_size"], options["tile_diff_overlap"],
+                                           options["tile_diff_threshold"]) if options["tile_diff"] else None,
+                    prescale, decoder
+                )
+        elif (manifest["encoded"] and manifest.get("encoded_with") == [encoder, audio_source]
+              and os.path.exists(manifest.get("encoded_video") or "")):
+            log_message("♻️ Vídeo já montado em execução anterior, pulando para o áudio")
+            temp_video = manifest["encoded_video"]
+            successful_frames = len(manifest["upscaled"]) + len(manifest["duplicates"])
+        elif options["disk_budget_mb"]:
+            # Staging limitado: extração, upscale e encode sobrepostos, PNGs apagados pelo caminho
+            with gpu_stage(), profile_stage("staging"):
+                temp_video, successful_frames = stage_with_disk_budget(
+                    input_path, job_video, job, backend, scale, fps, frame_count,
+                    final_width, final_height, gpu_memory_limit, options, cache, encoder, audio_source,
+                    prescale, decoder
+                )
+            if successful_frames > 0:
+                manifest["encoded"] = True
+                manifest["encoded_video"] = temp_video
+                manifest["encoded_with"] = [encoder, audio_source]
+                save_manifest(job)
+        else:
+            source_store, target_store = None, None
+            if options["frame_store"] == "raw":
+                source_store, target_store = open_job_frame_stores(job["dir"], width, height, scale, frame_count,
+                                                                   options["frame_store_codec"])
+                stores = [source_store, target_store]
+            
+            # Extrair frames
+            if manifest["extraction_complete"]:
+                log_message(f"♻️ {manifest['extracted_frames']} frames já extraídos")
+                extracted_frames = manifest["extracted_frames"]
+                timestamps = load_job_timestamps(job)
+            else:
+                def extraction_checkpoint(count):
+                    manifest["extracted_frames"] = count
+                    save_manifest(job, force=False)
+
+                dedup = create_dedup_state(options["dedup_threshold"]) if options["dedup"] else None
+                timestamps = []
+                log_message("🎞️ Extraindo frames do vídeo...")
+                with profile_stage("extract"):
+                    extracted_frames = extract_frames(input_path, tmp_folder, manifest["extracted_frames"],
+                                                      extraction_checkpoint, dedup, frame_count, source_store,
+                                                      prescale, decoder, timestamps)
+                save_job_timestamps(job, timestamps)
+                manifest["extracted_frames"] = extracted_frames
+                manifest["extraction_complete"] = True
+                manifest["duplicates"] = {str(idx): src for idx, src in dedup["duplicates"].items()} if dedup else {}
+                save_manifest(job)
+            if extracted_frames == 0:
+                raise ValueError("❌ Nenhum frame foi extraído do vídeo")
+            duplicates = {int(idx): src for idx, src in manifest["duplicates"].items()}
+            if options["dedup"]:
+                report_dedup_metrics(extracted_frames, len(duplicates))
+            progress_update(30, "Frames extraídos")
+
+            # Aplicar upscale OTIMIZADO
+            prune_unrecorded_frames(job, target_store)
+            upscaled = set(manifest["upscaled"])
+
+            # Montagem antecipada: o encoder começa pelos primeiros frames enquanto o upscale continua
+            readiness, assembler, assembly = None, None, {}
+            if options["early_assembly"]:
+                readiness = create_frame_readiness(upscaled)
+                unique_frames = [idx for idx in range(extracted_frames) if idx not in duplicates]
+
+                def assemble():
+                    try:
+                        with profile_stage("encode"):
+                            assembly["video"] = create_output_video(
+                                tmp_folder, job_video, fps, final_width, final_height, duplicates, encoder,
+                                audio_source, target_store, timestamps, options["assembly_workers"],
+                                unique_frames, readiness)
+                    except BaseException as e:
+                        assembly["error"] = e
 
-        # Aplicar upscale OTIMIZADO
-        log_message("🚀 Iniciando upscale otimizado...")
-        successful_frames = upscale_frames_optimized(tmp_folder, exe_path, scale, gpu_memory_limit)
+                assembler = threading.Thread(target=bind_job_context(assemble), daemon=True)
+                assembler.start()
+
+            def frame_number(frame):
+                return frame if isinstance(frame, int) else int(frame.replace("frame_", "").replace(".png", ""))
+
+            def frame_done(frame):
+                number = frame_number(frame)
+                if number not in upscaled:
+                    upscaled.add(number)
+                    manifest["upscaled"].append(number)
+                    save_manifest(job, force=False)
+                if readiness is not None:
+                    mark_frame_ready(readiness, number)
+
+            def frame_failed(frame):
+                if readiness is not None:
+                    mark_frame_failed(readiness, frame_number(frame))
+
+            log_message("🚀 Iniciando upscale otimizado...")
+            try:
+                with gpu_stage(), profile_stage("upscale"):
+                    if source_store is not None:
+                        successful_frames = upscale_frame_store(source_store, target_store, backend, scale,
+                                                                gpu_memory_limit, options["chunk_size"], frame_done,
+                                                                cache, options["autotune"], frame_failed)
+                    else:
+                        successful_frames = upscale_frames_optimized(tmp_folder, backend, scale, gpu_memory_limit,
+                                                                     options["chunk_size"], frame_done, cache,
+                                                                     options["autotune"], frame_failed)
+            except BaseException:
+                if assembler is not None:
+                    finish_frame_readiness(readiness, aborted=True)
+                    assembler.join()
+                raise
+            save_manifest(job)
+            temp_video = None
+            if assembler is not None:
+                finish_frame_readiness(readiness)
+                assembler.join()
+                if successful_frames > 0:
+                    if "error" in assembly:
+                        raise assembly["error"]
+                    temp_video = assembly["video"]
+                    if stores:
+                        report_frame_store_metrics(stores)
+                    manifest["encoded"] = True
+                    manifest["encoded_video"] = temp_video
+                    manifest["encoded_with"] = [encoder, audio_source]
+                    save_manifest(job)
 
         if successful_frames > 0:
             progress_update(80, "Upscale concluído, montando vídeo...")
 
             # Criar vídeo final
-            temp_video = create_output_video(tmp_folder, output_path, fps, final_width, final_height)
+            if temp_video is None:
+                with profile_stage("encode"):
+                    temp_video = create_output_video(tmp_folder, job_video, fps, final_width, final_height,
+                                                     duplicates, encoder, audio_source, target_store, timestamps,
+                                                     options["assembly_workers"])
+                if stores:
+                    report_frame_store_metrics(stores)
+                manifest["encoded"] = True
+                manifest["encoded_video"] = temp_video
+                manifest["encoded_with"] = [encoder, audio_source]
+                save_manifest(job)
 
             progress_update(95, "Vídeo montado, adicionando áudio...")
 
             # Adicionar áudio
-            if has_audio and os.path.exists(temp_audio):
+            if audio_source:
+                # Áudio já multiplexado pelo encoder FFmpeg
+                if temp_video != output_path and os.path.exists(temp_video):
+                    shutil.move(temp_video, output_path)
+            elif has_audio and os.path.exists(temp_audio):
                 log_message("🔊 Adicionando áudio ao vídeo final...")
-                if add_audio_to_video(temp_video, temp_audio, output_path):
+                with profile_stage("audio_mux"):
+                    audio_added = add_audio_to_video(temp_video, temp_audio, output_path)
+                if audio_added:
                     log_message("✅ Áudio adicionado com sucesso!")
                     # Remover vídeo temporário
                     if os.path.exists(temp_video):
                         os.remove(temp_video)
                 else:
                     log_message("❌ Falha ao adicionar áudio, mantendo vídeo sem áudio", "warning")
-                    # Renomear vídeo temporário para o nome final
+                    # Mover vídeo temporário para o nome final
                     if os.path.exists(temp_video):
-                        os.rename(temp_video, output_path)
+                        shutil.move(temp_video, output_path)
             else:
                 log_message("ℹ️ Nenhum áudio para adicionar")
-                # Renomear vídeo temporário para o nome final
+                # Mover vídeo temporário para o nome final
                 if os.path.exists(temp_video):
-                    os.rename(temp_video, output_path)
+                    shutil.move(temp_video, output_path)
 
             # Verificar se o arquivo final foi criado
             if os.path.exists(output_path):
                 file_size = os.path.getsize(output_path) / (1024*1024)
                 log_message(f"✅ Vídeo final criado: {output_path} ({file_size:.2f} MB)", "success")
                 progress_update(100, "Processamento concluído!")
+                finished = True
             else:
                 raise ValueError("❌ Vídeo final não foi criado")
 
@@ -501,86 +4632,555 @@ def process_video(input_path, output_path, scale=2, use_gpu=True, gpu_memory_lim
         log_message(f"❌ Erro durante o processamento: {e}", "error")
         raise
     finally:
-        # Limpeza
-        tmp_path = os.path.join(BASE_DIR, tmp_folder)
-        if os.path.exists(tmp_path):
-            log_message("🧹 Limpando arquivos temporários...")
-            shutil.rmtree(tmp_path)
+        # Limpeza: jobs incompletos ficam em disco para serem retomados
+        for store in stores:
+            close_frame_store(store)
+        if distributed is not None:
+            distributed["close"]()
+        stop_local_workers(local_workers)
+        if job is not None:
+            job["manifest"]["status"] = "done" if finished else "interrupted"
+            save_manifest(job)
+            if finished:
+                cleanup_jobs(options["job_retention_hours"], options["stale_job_hours"])
+            else:
+                log_message(f"💾 Job {job['id']} mantido em disco para retomada", "warning")
         if os.path.exists(temp_audio):
             os.remove(temp_audio)
+        profile_report()
+        PROFILER.reset(profiler_token)
+
+# ----------------------------
+# Modo preview: trecho curto ou par antes/depois em segundos
+# ----------------------------
+PREVIEW_MODES = ("clip", "pair")
+PREVIEW_MAX_FRAMES = 240  # limite de frames de um preview (o upscale roda em um único lote)
+
+def read_preview_frames(input_path, start=0.0, duration=0.0, stride=1, max_frames=PREVIEW_MAX_FRAMES):
+    """Lê os frames do trecho [start, start + duration], 1 a cada `stride`.
+
+    O seek vai direto ao início (keyframe anterior + decode até o ponto pedido),
+    sem passar pelos frames anteriores. Frames pulados pelo stride só usam grab().
+    Com `duration` 0 retorna apenas o frame em `start`.
+    Retorna (frames, instantes_em_segundos).
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"❌ Não foi possível abrir o vídeo: {input_path}")
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+    end = start + duration
+    frames, times = [], []
+    offset = 0
+    try:
+        while len(frames) < max_frames:
+            check_cancelled()
+            if offset % stride:
+                if not cap.grab():
+                    break
+                offset += 1
+                continue
+            with profile_span("decode"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if frames and timestamp > end:
+                break
+            frames.append(frame)
+            times.append(timestamp)
+            offset += 1
+            if duration <= 0:
+                break
+    finally:
+        cap.release()
+    return frames, times
+
+def preview_video(input_path, output_path, scale=2, gpu_memory_limit=None, options=None):
+    """Preview rápido para ajustar escala/backend/plano antes do vídeo inteiro.
+
+    Só os frames do trecho passam pelo upscaler, em um único lote e com o mesmo
+    plano de resolução e configurações do job completo. O modo "clip" grava um
+    vídeo curto sem áudio em `output_path`; o modo "pair" grava *_before.png
+    (resize simples até o alvo) e *_after.png (upscale) do primeiro frame do trecho.
+    """
+    options = options or dict(DEFAULT_OPTIONS)
+    mode = options["preview"]
+    if mode not in PREVIEW_MODES:
+        raise ValueError(f"❌ Modo de preview desconhecido: {mode}")
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"❌ Arquivo não encontrado: {input_path}")
+    started = time.perf_counter()
+    backend = create_upscaler_backend(options)
+    
+    fps, frame_count, width, height = get_video_info(input_path)
+    final_width, final_height = calculate_target_resolution(width, height, 1080) if scale == 2 else (None, None)
+    encoder = get_encoder_settings(options)
+    plan = plan_resolution(width, height, scale, final_width, final_height, backend["scales"], encoder,
+                           options["resolution_plan"], options["resolution_skip"])
+    report_resolution_plan(plan, scale)
+    target = plan["target"]
+    
+    stride = options["preview_stride"]
+    duration = options["preview_duration"] if mode == "clip" else 0.0
+    log_message(f"🔍 Preview {mode}: {options['preview_start']:.2f}s + {duration:.2f}s, 1 a cada {stride} frames")
+    progress_update(5, "Lendo trecho do preview...", "preview")
+    frames, times = read_preview_frames(input_path, options["preview_start"], duration, stride)
+    if not frames:
+        raise ValueError("❌ Nenhum frame no trecho do preview")
+    
+    inputs = [cv2.resize(frame, plan["prescale"], interpolation=cv2.INTER_AREA) for frame in frames] \
+        if plan["prescale"] else frames
+    progress_update(20, f"Upscale de {len(frames)} frames...", "preview")
+    if plan["mode"] == "skip":
+        upscaled = inputs
+    else:
+        frame_size = (inputs[0].shape[1], inputs[0].shape[0])
+        backend = configure_frame_tiling(backend, *frame_size, plan["model_scale"], gpu_memory_limit, options)
+        settings, _ = resolve_backend_settings(backend, gpu_memory_limit, frame_size, plan["model_scale"])
+        cache = create_frame_cache(options["cache_dir"], options["cache_max_mb"]) if options["frame_cache"] else None
+        with gpu_stage():
+            upscaled = upscale_frames_with_backend(inputs, backend, plan["model_scale"], settings, cache)
+    results = [cv2.resize(frame, target, interpolation=cv2.INTER_LANCZOS4)
+               if frame is not None and (frame.shape[1], frame.shape[0]) != target else frame
+               for frame in upscaled]
+    failed = sum(1 for frame in results if frame is None)
+    if failed == len(results):
+        raise ValueError("❌ Nenhum frame do preview foi processado com sucesso")
+    progress_update(80, "Gravando preview...", "preview")
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if mode == "pair":
+        base = os.path.splitext(output_path)[0]
+        files = [base + "_before.png", base + "_after.png"]
+        cv2.imwrite(files[0], cv2.resize(frames[0], target, interpolation=cv2.INTER_LANCZOS4))
+        cv2.imwrite(files[1], results[0])
+    else:
+        if not output_path.endswith(".mp4"):
+            output_path += ".mp4"
+        files = [output_path]
+        out = open_video_writer(output_path, fps / stride, target, encoder)
+        if not out.isOpened():
+            raise ValueError(f"❌ Não foi possível criar o vídeo: {output_path}")
+        completed = False
+        try:
+            for frame in results:
+                if frame is not None:
+                    out.write(frame)
+            completed = True
+        finally:
+            close_video_writer(out, completed)
+    
+    elapsed = time.perf_counter() - started
+    send_metrics({
+        "mode": mode,
+        "files": files,
+        "frames": len(frames),
+        "failedFrames": failed,
+        "startSeconds": times[0],
+        "endSeconds": times[-1],
+        "stride": stride,
+        "elapsedSeconds": elapsed,
+    }, kind="preview")
+    log_message(f"✅ Preview pronto em {elapsed:.1f}s: {', '.join(files)}", "success")
+    progress_update(100, "Preview concluído!", "preview")
+    return files
+
+def run_job_config(config):
+    """Resolve os caminhos e opções de uma configuração JSON e processa o vídeo"""
+    # Obter caminhos da configuração
+    input_path = config['inputPath']
+    output_path = config['outputPath']
+    scale = config.get('scale', 2)
+    use_gpu = config.get('useGpu', True)
+    gpu_memory_limit = config.get('gpuMemory')  # Em MB
+    options = parse_pipeline_options(config)
+
+    log_message(f"📥 Configuração recebida:")
+    log_message(f"   - inputPath: {input_path}")
+    log_message(f"   - outputPath: {output_path}")
+    log_message(f"   - scale: {scale}")
+    log_message(f"   - useGpu: {use_gpu}")
+    log_message(f"   - gpuMemory: {gpu_memory_limit}")
+    log_message(f"   - streaming: {options['streaming']} (fila: {options['queue_depth']})")
+    log_message(f"   - chunkSize: {options['chunk_size']}")
+    log_message(f"   - segments: {options['segments']}")
+    log_message(f"   - resume: {options['resume']} (retenção: {options['job_retention_hours']}h)")
+    log_message(f"   - frameCache: {options['frame_cache']} (limite: {options['cache_max_mb']} MB)")
+    log_message(f"   - autotune: {options['autotune']}")
+    log_message(f"   - backend: {options['backend']}")
+    log_message(f"   - tracePath: {options['trace_path']}")
+    log_message(f"   - frameStore: {options['frame_store']} (codec: {options['frame_store_codec']})")
+    log_message(f"   - diskBudgetMb: {options['disk_budget_mb'] or 'sem limite'}")
+    log_message(f"   - frameTiling: {options['frame_tiling']} (tile {options['frame_tile_size']}px, "
+                f"margem {options['frame_tile_overlap']}px, workers {options['frame_tile_workers'] or 'auto'})")
+    if options["distributed_workers"] or options["distributed_local_workers"]:
+        log_message(f"   - distributedWorkers: {', '.join(options['distributed_workers']) or '-'} "
+                    f"(+{options['distributed_local_workers']} locais, lotes de {options['shard_size']} frames)")
+    log_message(f"   - assembly: {options['assembly_workers'] or 'auto'} threads "
+                f"({'durante' if options['early_assembly'] else 'depois d'}o upscale)")
+    if options["progressive_output"]:
+        log_message(f"   - progressiveOutput: segmentos de {options['progressive_segment_seconds']:g}s")
+    log_message(f"   - resolutionPlan: {options['resolution_plan']} "
+                f"(resolutionSkip: {'sim' if options['resolution_skip'] else 'não'})")
+    if options["preview"]:
+        log_message(f"   - preview: {options['preview']} ({options['preview_start']}s + "
+                    f"{options['preview_duration']}s, stride {options['preview_stride']})")
+    log_message(f"   - tileDiff: {options['tile_diff']} (tile {options['tile_diff_size']}px, "
+                f"margem {options['tile_diff_overlap']}px, limiar {options['tile_diff_threshold']})")
+    log_message(f"   - decoder: {options['decoder']} (threads {options['decoder_threads'] or 'auto'}, "
+                f"hwaccel {options['decoder_hwaccel'] or 'não'})")
+    log_message(f"   - encoder: {options['encoder']} ({options['video_codec']}, crf {options['crf']}, "
+                f"preset {options['preset']}, threads {options['encoder_threads'] or 'auto'})")
+
+    # CORREÇÃO: Se os caminhos são relativos, converter para absolutos
+    if not os.path.isabs(input_path):
+        original_input = input_path
+        input_path = os.path.join(BASE_DIR, "uploads", os.path.basename(input_path))
+        log_message(f"🔁 Convertendo caminho relativo para absoluto:")
+        log_message(f"   - Original: {original_input}")
+        log_message(f"   - Absoluto: {input_path}")
+    
+    if not os.path.isabs(output_path):
+        original_output = output_path
+        output_dir = os.path.join(BASE_DIR, "outputs")
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, os.path.basename(output_path))
+        log_message(f"🔁 Convertendo caminho relativo para absoluto:")
+        log_message(f"   - Original: {original_output}")
+        log_message(f"   - Absoluto: {output_path}")
+
+    log_message(f"📁 Caminho de entrada resolvido: {input_path}")
+    log_message(f"📁 Caminho de saída resolvido: {output_path}")
+    input_exists = os.path.isfile(input_path)
+    log_message(f"📁 Arquivo de entrada existe: {input_exists}")
+
+    # Verificar se o arquivo de entrada existe
+    if not input_exists:
+        input_dir = os.path.dirname(input_path)
+        dir_exists = os.path.isdir(input_dir)
+        log_message(f"❌ ARQUIVO NÃO ENCONTRADO - Investigação:")
+        log_message(f"   - Caminho procurado: {input_path}")
+        log_message(f"   - Diretório: {input_dir}")
+        log_message(f"   - Diretório existe: {dir_exists}")
+        
+        if dir_exists:
+            files = os.listdir(input_dir)
+            log_message(f"   - Arquivos no diretório: {files}")
+        
+        # Tentar encontrar o arquivo de outras formas
+        uploads_dir = os.path.join(BASE_DIR, "uploads")
+        if os.path.isdir(uploads_dir):
+            all_files = os.listdir(uploads_dir)
+            log_message(f"   - Todos os arquivos em uploads: {all_files}")
+        
+        raise FileNotFoundError(f"❌ Arquivo não encontrado: {input_path}")
+
+    if options["preview"]:
+        preview_video(input_path, output_path, scale, gpu_memory_limit, options)
+    else:
+        process_video(input_path, output_path, scale, use_gpu, gpu_memory_limit, options)
+
+# ----------------------------
+# Modo servidor: fila de jobs com prioridade, limite de concorrência e cancelamento
+# ----------------------------
+# Protocolo (uma linha JSON por comando, no stdin ou no socket):
+#   {"command": "submit", "jobId": "a1", "priority": 5, "config": {...mesma config do modo simples...}}
+#   {"command": "cancel", "jobId": "a1"}
+#   {"command": "status"}
+#   {"command": "shutdown", "cancelRunning": false}
+# Os eventos de cada job (log/progress/metrics) saem com "jobId"; mudanças de estado
+# saem como {"type": "job", "jobId": ..., "status": "queued|running|done|failed|cancelled"}.
+SERVER_HISTORY = 100  # jobs finalizados mantidos para o comando "status"
+SERVER_CLIENT_QUEUE = 10000  # eventos pendentes por conexão do socket; cliente que não lê é desconectado
+
+def create_job_server(max_jobs=1, gpu_slots=1):
+    """Estado do servidor de jobs"""
+    return {
+        "lock": threading.Condition(),
+        "queue": [],                    # heap de (-prioridade, ordem de chegada, job_id)
+        "jobs": {},                     # job_id → registro do job
+        "running": 0,
+        "max_jobs": max(1, max_jobs),
+        "gpu": threading.Semaphore(max(1, gpu_slots)),
+        "order": itertools.count(),
+        "accepting": True,
+    }
+
+def emit_job_status(record, **extra):
+    entry = {"type": "job", "jobId": record["id"], "status": record["status"],
+             "priority": record["priority"], "timestamp": time.time()}
+    entry.update(extra)
+    emit_event(entry)
+
+def submit_server_job(server, command):
+    """Enfileira um job; jobs de maior prioridade saem primeiro (FIFO entre iguais)"""
+    config = command.get("config", command)
+    if not config.get("inputPath") or not config.get("outputPath"):
+        raise ValueError("inputPath e outputPath são obrigatórios")
+    job_id = str(command.get("jobId") or uuid.uuid4().hex[:12])
+    priority = int(command.get("priority", 0))
+    with server["lock"]:
+        if not server["accepting"]:
+            raise ValueError("servidor encerrando, job não aceito")
+        previous = server["jobs"].get(job_id)
+        if previous is not None and previous["status"] in ("queued", "running"):
+            raise ValueError(f"job {job_id} já está na fila")
+        record = {
+            "id": job_id,
+            "priority": priority,
+            "config": config,
+            "status": "queued",
+            "context": create_job_context(job_id, server["gpu"]),
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        server["jobs"][job_id] = record
+        heapq.heappush(server["queue"], (-priority, next(server["order"]), job_id))
+        queued = sum(1 for r in server["jobs"].values() if r["status"] == "queued")
+        server["lock"].notify_all()
+    emit_job_status(record, queued=queued)
+
+def cancel_server_job(server, job_id):
+    """Cancela um job: na fila sai direto; em execução para no próximo ponto de verificação"""
+    with server["lock"]:
+        record = server["jobs"].get(job_id)
+        if record is None:
+            raise ValueError(f"job desconhecido: {job_id}")
+        status = record["status"]
+        if status == "queued":
+            record["status"] = "cancelled"
+            record["finished_at"] = time.time()
+        elif status == "running":
+            record["context"]["cancel"].set()
+    if status == "queued":
+        emit_job_status(record)
+    elif status == "running":
+        emit_job_status(record, status="cancelling")
+
+def emit_server_status(server):
+    with server["lock"]:
+        jobs = [{
+            "jobId": record["id"],
+            "status": record["status"],
+            "priority": record["priority"],
+            "inputPath": record["config"].get("inputPath"),
+            "submittedAt": record["submitted_at"],
+            "startedAt": record["started_at"],
+            "finishedAt": record["finished_at"],
+            "error": record["error"],
+        } for record in server["jobs"].values()]
+        status = {"type": "status", "running": server["running"],
+                  "queued": sum(1 for job in jobs if job["status"] == "queued"),
+                  "maxJobs": server["max_jobs"], "jobs": jobs, "timestamp": time.time()}
+    emit_event(status)
+
+def shutdown_server(server, cancel_running=False):
+    """Para de aceitar jobs; o servidor sai quando a fila e os jobs em execução terminarem"""
+    with server["lock"]:
+        server["accepting"] = False
+        records = list(server["jobs"].values()) if cancel_running else []
+        server["lock"].notify_all()
+    for record in records:
+        if record["status"] in ("queued", "running"):
+            cancel_server_job(server, record["id"])
+
+def handle_server_command(server, line):
+    """Executa um comando JSON-lines recebido pelo stdin ou socket"""
+    try:
+        command = json.loads(line)
+        action = command.get("command", "submit")
+        if action == "submit":
+            submit_server_job(server, command)
+        elif action == "cancel":
+            cancel_server_job(server, str(command["jobId"]))
+        elif action == "status":
+            emit_server_status(server)
+        elif action == "shutdown":
+            shutdown_server(server, bool(command.get("cancelRunning", False)))
+        else:
+            raise ValueError(f"comando desconhecido: {action}")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        emit_event({"type": "error", "message": f"❌ Comando inválido: {e}", "timestamp": time.time()})
+
+def run_server_job(server, record):
+    """Thread de um job do servidor"""
+    emit_job_status(record)
+    status, error = "done", None
+    with job_scope(record["context"]):
+        try:
+            run_job_config(record["config"])
+        except JobCancelled:
+            status = "cancelled"
+            log_message("⏹️ Job cancelado", "warning")
+        except Exception as e:
+            status, error = "failed", str(e)
+            log_message(f"❌ Erro: {error}", "error")
+    with server["lock"]:
+        record.update(status=status, error=error, finished_at=time.time())
+        server["running"] -= 1
+        # Histórico limitado de jobs finalizados
+        finished = [r for r in server["jobs"].values() if r["finished_at"] is not None]
+        for old in sorted(finished, key=lambda r: r["finished_at"])[:-SERVER_HISTORY]:
+            del server["jobs"][old["id"]]
+        server["lock"].notify_all()
+    emit_job_status(record, error=error, elapsedSeconds=round(record["finished_at"] - record["started_at"], 3))
+
+def server_dispatcher(server):
+    """Inicia jobs da fila respeitando o limite de concorrência; sai após o shutdown"""
+    with server["lock"]:
+        while True:
+            while server["queue"] and server["running"] < server["max_jobs"]:
+                _, _, job_id = heapq.heappop(server["queue"])
+                record = server["jobs"].get(job_id)
+                if record is None or record["status"] != "queued":
+                    continue  # Cancelado enquanto esperava na fila
+                record["status"] = "running"
+                record["started_at"] = time.time()
+                server["running"] += 1
+                threading.Thread(target=run_server_job, args=(server, record), name=f"job-{job_id}").start()
+            if not server["accepting"] and not server["queue"] and server["running"] == 0:
+                return
+            server["lock"].wait()
+
+class _ServerConnection(socketserver.StreamRequestHandler):
+    """Conexão no socket local: recebe comandos e recebe todos os eventos do servidor.
+
+    Os eventos entram em uma fila própria da conexão (sob o EVENT_LOCK só o
+    enfileiramento) e uma thread os escreve no socket: um cliente lento não
+    trava emit_event para o resto do processo. Com a fila cheia o cliente é
+    desconectado.
+    """
+
+    def handle(self):
+        events = queue.Queue(maxsize=SERVER_CLIENT_QUEUE)
+        
+        def sink(line):
+            try:
+                events.put_nowait(line)
+            except queue.Full:
+                self.connection.shutdown(socket.SHUT_RDWR)
+                raise OSError("fila de eventos da conexão cheia")
+        
+        writer = threading.Thread(target=self.write_events, args=(events,), daemon=True)
+        writer.start()
+        with EVENT_LOCK:
+            EVENT_SINKS.append(sink)
+        try:
+            for raw in self.rfile:
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    handle_server_command(self.server.job_server, line)
+        except OSError:
+            pass  # Conexão encerrada (inclusive por fila cheia)
+        finally:
+            with EVENT_LOCK:
+                if sink in EVENT_SINKS:
+                    EVENT_SINKS.remove(sink)
+            # Sem produtores: a thread escreve o que sobrou na fila e termina
+            events.put(None)
+            writer.join()
+
+    def write_events(self, events):
+        """Thread de escrita da conexão; depois de um erro no socket só esvazia a fila"""
+        connected = True
+        while True:
+            line = events.get()
+            if line is None:
+                return
+            if connected:
+                try:
+                    self.wfile.write((line + "\n").encode("utf-8"))
+                except OSError:
+                    connected = False
+
+def start_socket_listener(server, address):
+    """Abre o socket TCP local (host:porta; padrão 127.0.0.1) para comandos do servidor"""
+    host, _, port = address.rpartition(":")
+    listener = socketserver.ThreadingTCPServer((host or "127.0.0.1", int(port)), _ServerConnection)
+    listener.daemon_threads = True
+    listener.job_server = server
+    threading.Thread(target=listener.serve_forever, daemon=True).start()
+    log_message(f"🔌 Servidor ouvindo em {host or '127.0.0.1'}:{listener.server_address[1]}")
+    return listener
+
+def run_server(max_jobs=1, gpu_slots=1, socket_address=None):
+    """Modo servidor: processo único e persistente (imports, backends e perfis ficam carregados).
+
+    Até `max_jobs` jobs rodam ao mesmo tempo, mas só `gpu_slots` deles ficam na etapa
+    de upscale: a extração/encode de um job se sobrepõe ao upscale do outro.
+    """
+    server = create_job_server(max_jobs, gpu_slots)
+    dispatcher = threading.Thread(target=server_dispatcher, args=(server,), daemon=True)
+    dispatcher.start()
+    listener = start_socket_listener(server, socket_address) if socket_address else None
+    emit_event({"type": "server", "status": "ready", "pid": os.getpid(), "maxJobs": server["max_jobs"],
+                "gpuSlots": max(1, gpu_slots), "timestamp": time.time()})
+    
+    if listener is None:
+        # Comandos pelo stdin; EOF encerra depois dos jobs pendentes
+        for line in sys.stdin:
+            if line.strip():
+                handle_server_command(server, line)
+        shutdown_server(server)
+    
+    # join com timeout para o Ctrl+C continuar sendo atendido na thread principal
+    while dispatcher.is_alive():
+        dispatcher.join(timeout=CANCEL_POLL_INTERVAL)
+    if listener is not None:
+        listener.shutdown()
+    emit_event({"type": "server", "status": "stopped", "timestamp": time.time()})
 
 def main():
     signal.signal(signal.SIGINT, signal_handler)
 
+    parser = argparse.ArgumentParser(description="Upscale de vídeo com Real-ESRGAN")
+    parser.add_argument("--server", action="store_true",
+                        help="modo servidor: recebe vários jobs (JSON-lines) no stdin ou socket")
+    parser.add_argument("--socket", help="host:porta do socket local do modo servidor (ex.: 127.0.0.1:8765)")
+    parser.add_argument("--max-jobs", type=int, default=2, help="jobs simultâneos no modo servidor")
+    parser.add_argument("--gpu-slots", type=int, default=1, help="jobs simultâneos na etapa de upscale")
+    parser.add_argument("--worker", action="store_true",
+                        help="modo worker: faz upscale dos lotes enviados por um coordenador (modo distribuído)")
+    parser.add_argument("--listen", default=f"127.0.0.1:{DISTRIBUTED_PORT}",
+                        help="host:porta do modo worker (fora do loopback exige --token)")
+    parser.add_argument("--worker-config", default="{}",
+                        help="configuração JSON do worker (backend, upscalerPath, gpuMemory, workerSlots...)")
+    parser.add_argument("--token", help="token exigido dos coordenadores no modo worker")
+    args = parser.parse_args()
+    if args.worker:
+        try:
+            run_upscale_worker(args.listen, json.loads(args.worker_config), args.token)
+        except ValueError as e:
+            log_message(str(e), "error")
+            sys.exit(1)
+        return
+    if args.server:
+        run_server(args.max_jobs, args.gpu_slots, args.socket)
+        return
+
     # Lê os parâmetros de entrada via stdin
     input_data = sys.stdin.read()
     
     try:
         config = json.loads(input_data)
-        
-        # Obter caminhos da configuração
-        input_path = config['inputPath']
-        output_path = config['outputPath']
-        scale = config.get('scale', 2)
-        use_gpu = config.get('useGpu', True)
-        gpu_memory_limit = config.get('gpuMemory')  # Em MB
-
-        log_message(f"📥 Configuração recebida:")
-        log_message(f"   - inputPath: {input_path}")
-        log_message(f"   - outputPath: {output_path}")
-        log_message(f"   - scale: {scale}")
-        log_message(f"   - useGpu: {use_gpu}")
-        log_message(f"   - gpuMemory: {gpu_memory_limit}")
-
-        # CORREÇÃO: Se os caminhos são relativos, converter para absolutos
-        if not os.path.isabs(input_path):
-            original_input = input_path
-            input_path = os.path.join(BASE_DIR, "uploads", os.path.basename(input_path))
-            log_message(f"🔁 Convertendo caminho relativo para absoluto:")
-            log_message(f"   - Original: {original_input}")
-            log_message(f"   - Absoluto: {input_path}")
-        
-        if not os.path.isabs(output_path):
-            original_output = output_path
-            output_dir = os.path.join(BASE_DIR, "outputs")
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, os.path.basename(output_path))
-            log_message(f"🔁 Convertendo caminho relativo para absoluto:")
-            log_message(f"   - Original: {original_output}")
-            log_message(f"   - Absoluto: {output_path}")
-
-        log_message(f"📁 Caminho de entrada resolvido: {input_path}")
-        log_message(f"📁 Caminho de saída resolvido: {output_path}")
-        log_message(f"📁 Arquivo de entrada existe: {os.path.exists(input_path)}")
-
-        # Verificar se o arquivo de entrada existe
-        if not os.path.exists(input_path):
-            log_message(f"❌ ARQUIVO NÃO ENCONTRADO - Investigação:")
-            log_message(f"   - Caminho procurado: {input_path}")
-            log_message(f"   - Diretório: {os.path.dirname(input_path)}")
-            log_message(f"   - Diretório existe: {os.path.exists(os.path.dirname(input_path))}")
-            
-            if os.path.exists(os.path.dirname(input_path)):
-                files = os.listdir(os.path.dirname(input_path))
-                log_message(f"   - Arquivos no diretório: {files}")
-            
-            # Tentar encontrar o arquivo de outras formas
-            uploads_dir = os.path.join(BASE_DIR, "uploads")
-            if os.path.exists(uploads_dir):
-                all_files = os.listdir(uploads_dir)
-                log_message(f"   - Todos os arquivos em uploads: {all_files}")
-            
-            raise FileNotFoundError(f"❌ Arquivo não encontrado: {input_path}")
-
-        process_video(input_path, output_path, scale, use_gpu, gpu_memory_limit)
+        with job_scope(create_job_context()):
+            run_job_config(config)
         
     except json.JSONDecodeError as e:
         log_message(f"❌ Erro ao decodificar JSON: {str(e)}", "error")
         log_message(f"❌ Dados recebidos: {input_data}", "error")
         sys.exit(1)
+    except JobCancelled:
+        log_message("⏹️ Processamento cancelado; o job pode ser retomado", "warning")
+        sys.exit(0)
     except Exception as e:
         log_message(f"❌ Erro: {str(e)}", "error")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos do pipeline ficam em backend/scripts (executados como scripts, sem pacote)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import upscale
+
+def test_results_come_out_in_item_order_despite_finishing_out_of_order():
+    def load(item):
+        time.sleep(0.002 * (10 - item))
+        return item * item
+    results = list(upscale.prefetch_ordered(range(10), load, workers=4, depth=4))
+    assert results == [(i, i * i) for i in range(10)]
+
+def test_depth_bounds_the_work_ahead_of_the_consumer():
+    started = []
+    lock = threading.Lock()
+
+    def load(item):
+        with lock:
+            started.append(item)
+        return item
+    consumed = []
+    for item, _ in upscale.prefetch_ordered(range(20), load, workers=2, depth=3):
+        consumed.append(item)
+        time.sleep(0.01)
+        with lock:
+            assert max(started) < item + 3
+    assert consumed == list(range(20))
+
+def test_load_errors_reach_the_consumer():
+    def load(item):
+        if item == 2:
+            raise ValueError("falhou")
+        return item
+    gen = upscale.prefetch_ordered(range(5), load, workers=2, depth=2)
+    assert next(gen) == (0, 0)
+    assert next(gen) == (1, 1)
+    with pytest.raises(ValueError):
+        next(gen)
+
+def test_readiness_waits_for_frames_and_reports_missing_ones():
+    readiness = upscale.create_frame_readiness([0])
+    assert upscale.wait_frame_ready(readiness, 0)
+    threading.Timer(0.05, upscale.mark_frame_ready, (readiness, 1)).start()
+    assert upscale.wait_frame_ready(readiness, 1)
+    upscale.finish_frame_readiness(readiness)
+    assert not upscale.wait_frame_ready(readiness, 2)
+
+def test_aborted_readiness_stops_the_assembly():
+    readiness = upscale.create_frame_readiness()
+    upscale.finish_frame_readiness(readiness, aborted=True)
+    with pytest.raises(upscale.JobCancelled):
+        upscale.wait_frame_ready(readiness, 0)
+
+def test_audio_is_muxed_by_the_encoder_only_with_ffmpeg():
+    encoder = {"name": "ffmpeg"}
+    assert upscale.output_video_target("out.mp4", encoder, "in.mp4") == ("out.mp4", "in.mp4")
+    assert upscale.output_video_target("out.mp4", None, "in.mp4") == ("out_no_audio.mp4", None)
+    assert upscale.output_video_target("out.mp4", encoder, None) == ("out_no_audio.mp4", None)
+
+def test_output_writer_resizes_in_ffmpeg_or_per_frame(monkeypatch):
+    opened = []
+
+    class Writer:
+        def isOpened(self):
+            return True
+
+    def open_video_writer(*args):
+        opened.append(args)
+        return Writer()
+    monkeypatch.setattr(upscale, "open_video_writer", open_video_writer)
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    _, size = upscale.open_output_writer("v.mp4", 24.0, frame, 1920, 1080, {"name": "ffmpeg"}, "in.mp4")
+    assert size == (1280, 720)
+    assert opened[-1] == ("v.mp4", 24.0, (1280, 720), {"name": "ffmpeg"}, "in.mp4", (1920, 1080))
+    _, size = upscale.open_output_writer("v.mp4", 24.0, frame, 1920, 1080)
+    assert size == (1920, 1080)
+    _, size = upscale.open_output_writer("v.mp4", 24.0, frame)
+    assert size == (1280, 720)
+
+def test_failed_frame_is_skipped_without_waiting_for_the_upscale_to_finish():
+    readiness = upscale.create_frame_readiness([0])
+    upscale.mark_frame_failed(readiness, 1)
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(upscale.wait_frame_ready(readiness, 1)), daemon=True)
+    waiter.start()
+    waiter.join(timeout=5)
+    assert result == [False]
+    assert not readiness["finished"]
+
+def test_frame_store_upscale_reports_failed_frames(tmp_path):
+    def upscale_batch(frames, scale, settings, tuner=None):
+        return [None if (f == 1).all() else np.repeat(np.repeat(f, scale, 0), scale, 1) for f in frames]
+    backend = {"name": "fake", "model": "fake", "scales": (2,), "exe_path": None,
+               "settings": {"j_value": "", "batch_size": 1, "tile_size": 0, "num_threads": 1},
+               "upscale_batch": upscale_batch}
+    source, target = upscale.open_job_frame_stores(str(tmp_path), 8, 4, 2, 3)
+    for idx in range(3):
+        upscale.frame_store_write(source, idx, np.full((4, 8, 3), idx, dtype=np.uint8))
+    done, failed = [], []
+    upscale.upscale_frame_store(source, target, backend, 2, on_frame_done=done.append, on_frame_failed=failed.append)
+    assert sorted(done) == [0, 2]
+    assert failed == [1]
+    upscale.close_frame_store(source)
+    upscale.close_frame_store(target)
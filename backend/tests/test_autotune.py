@@ -0,0 +1,58 @@
+import time
+
+import upscale
+
+SETTINGS = {"j_value": "8:4:4", "batch_size": 8, "tile_size": 0, "num_threads": 2}
+
+def record_window(tuner, fps, seconds=20.0):
+    tuner["window_start"] = time.time() - seconds
+    upscale.autotune_record(tuner, frames=int(fps * seconds))
+
+def test_moves_step_workers_and_j_within_bounds():
+    assert upscale._apply_autotune_move(SETTINGS, ("workers", 1))["num_threads"] == 3
+    assert upscale._apply_autotune_move(SETTINGS, ("j", 1))["j_value"] == "12:6:6"
+    assert upscale._apply_autotune_move(SETTINGS, ("j", -1))["j_value"] == "4:2:2"
+    assert upscale._apply_autotune_move(dict(SETTINGS, num_threads=1), ("workers", -1)) is None
+    assert upscale._apply_autotune_move(dict(SETTINGS, num_threads=upscale.AUTOTUNE_MAX_WORKERS), ("workers", 1)) is None
+    assert upscale._apply_autotune_move(dict(SETTINGS, j_value="24:12:12"), ("j", 1)) is None
+
+def test_move_does_not_touch_the_original_settings():
+    upscale._apply_autotune_move(SETTINGS, ("workers", 1))
+    assert SETTINGS["num_threads"] == 2
+
+def test_short_windows_are_not_measured():
+    tuner = upscale.create_autotuner(SETTINGS, "key")
+    upscale.autotune_record(tuner, frames=1000)
+    assert tuner["settings"] == SETTINGS
+    assert tuner["best_fps"] == 0.0
+
+def test_hill_climbing_keeps_improvements_and_converges_on_the_best():
+    tuner = upscale.create_autotuner(SETTINGS, "key")
+    record_window(tuner, 10)
+    assert tuner["settings"]["num_threads"] == 3
+    record_window(tuner, 20)
+    assert tuner["best"]["num_threads"] == 3
+    assert tuner["settings"]["num_threads"] == 4
+    # Sem ganho: volta ao melhor e testa os outros passos a partir dele
+    record_window(tuner, 20)
+    assert tuner["settings"] == dict(SETTINGS, num_threads=3, j_value="12:6:6")
+    record_window(tuner, 5)
+    assert tuner["settings"] == dict(SETTINGS, num_threads=2)
+    record_window(tuner, 5)
+    assert tuner["settings"] == dict(SETTINGS, num_threads=3, j_value="4:2:2")
+    record_window(tuner, 5)
+    assert tuner["converged"]
+    assert tuner["settings"] == dict(SETTINGS, num_threads=3)
+    assert round(tuner["best_fps"]) == 20
+
+def test_converged_tuner_does_not_change():
+    tuner = upscale.create_autotuner(SETTINGS, "key", converged=True)
+    record_window(tuner, 10)
+    assert tuner["settings"] == SETTINGS
+    assert not tuner["changed"]
+
+def test_shrink_tile_size_halves_down_to_the_minimum():
+    assert upscale.shrink_tile_size(0) == upscale.OOM_FALLBACK_TILE_SIZE
+    assert upscale.shrink_tile_size(200) == 100
+    assert upscale.shrink_tile_size(upscale.MIN_TILE_SIZE * 2) == upscale.MIN_TILE_SIZE
+    assert upscale.shrink_tile_size(upscale.MIN_TILE_SIZE) is None
@@ -0,0 +1,31 @@
+import numpy as np
+
+import upscale
+
+def solid(value, shape=(32, 48, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+def test_exact_duplicates_point_to_the_first_occurrence():
+    dedup = upscale.create_dedup_state()
+    frames = [solid(10), solid(10), solid(200), solid(10)]
+    sources = [upscale.find_duplicate_frame(frame, i, dedup) for i, frame in enumerate(frames)]
+    assert sources == [None, 0, None, 0]
+    assert dedup["duplicates"] == {1: 0, 3: 0}
+
+def test_consecutive_only_ignores_older_frames():
+    dedup = upscale.create_dedup_state(consecutive_only=True)
+    frames = [solid(10), solid(10), solid(200), solid(10)]
+    sources = [upscale.find_duplicate_frame(frame, i, dedup) for i, frame in enumerate(frames)]
+    assert sources == [None, 0, None, None]
+    assert dedup["hashes"] == {}
+
+def test_threshold_matches_near_duplicates_of_the_last_unique_frame():
+    dedup = upscale.create_dedup_state(threshold=2.0)
+    assert upscale.find_duplicate_frame(solid(100), 0, dedup) is None
+    assert upscale.find_duplicate_frame(solid(101), 1, dedup) == 0
+    assert upscale.find_duplicate_frame(solid(150), 2, dedup) is None
+
+def test_without_threshold_near_duplicates_are_unique():
+    dedup = upscale.create_dedup_state()
+    assert upscale.find_duplicate_frame(solid(100), 0, dedup) is None
+    assert upscale.find_duplicate_frame(solid(101), 1, dedup) is None
@@ -0,0 +1,28 @@
+import upscale
+
+def make_job(tmp_path, extracted=0, upscaled=()):
+    manifest = {"extracted_frames": extracted, "extraction_complete": bool(extracted), "upscaled": list(upscaled),
+                "duplicates": {}}
+    return {"id": "job", "dir": str(tmp_path), "tmp_folder": str(tmp_path), "manifest": manifest, "last_save": 0.0}
+
+def capture_logs(monkeypatch):
+    logs = []
+    monkeypatch.setattr(upscale, "log_message", lambda message, type="log": logs.append((type, message)))
+    return logs
+
+def test_reset_warns_when_resumable_frames_are_discarded(tmp_path, monkeypatch):
+    logs = capture_logs(monkeypatch)
+    (tmp_path / "frame_000000.png").write_bytes(b"png")
+    (tmp_path / "frame_up_000000.png").write_bytes(b"png")
+    (tmp_path / "video.mp4").write_bytes(b"mp4")
+    job = make_job(tmp_path, extracted=12, upscaled=[0, 1, 2])
+    upscale.reset_job_frames(job)
+    assert [type for type, _ in logs].count("warning") == 1
+    assert "12 frames extraídos e 3 com upscale" in logs[0][1]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["manifest.json", "video.mp4"]
+    assert job["manifest"]["upscaled"] == [] and job["manifest"]["extracted_frames"] == 0
+
+def test_reset_of_a_fresh_job_is_silent(tmp_path, monkeypatch):
+    logs = capture_logs(monkeypatch)
+    upscale.reset_job_frames(make_job(tmp_path))
+    assert logs == []
@@ -0,0 +1,99 @@
+import inspect
+import io
+import json
+import socket
+import socketserver
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import upscale
+
+def nearest_worker(token):
+    def upscale_batch(frames, scale, settings, tuner=None):
+        return [cv2.resize(f, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST) for f in frames]
+    backend = {"name": "nearest", "model": "nearest", "scales": (2,), "exe_path": None,
+               "settings": {"j_value": "", "batch_size": 1, "tile_size": 0, "num_threads": 1},
+               "upscale_batch": upscale_batch}
+    return {"backend": backend, "gpu_memory_limit": None, "cache": None, "slots": 1, "token": token,
+            "settings": {}, "lock": threading.Lock(), "frames": 0, "seconds": 0.0}
+
+@pytest.fixture
+def worker_address():
+    listener = socketserver.ThreadingTCPServer(("127.0.0.1", 0), upscale._WorkerConnection)
+    listener.daemon_threads = True
+    listener.upscale_worker = nearest_worker("segredo")
+    thread = threading.Thread(target=listener.serve_forever, daemon=True)
+    thread.start()
+    yield listener.server_address
+    listener.shutdown()
+    listener.server_close()
+
+def exchange(address, messages):
+    """Envia as mensagens em uma conexão e retorna as respostas (None quando o worker fecha)"""
+    replies = []
+    with socket.create_connection(address, timeout=5) as sock, sock.makefile("rwb") as stream:
+        for header, payloads in messages:
+            upscale._send_message(stream, header, payloads)
+            try:
+                replies.append(upscale._read_message(stream))
+            except ConnectionError:
+                replies.append(None)
+                break
+    return replies
+
+FRAME = np.full((4, 4, 3), 7, dtype=np.uint8)
+
+def test_upscale_without_hello_is_rejected(worker_address):
+    replies = exchange(worker_address, [({"command": "upscale", "scale": 2}, upscale._encode_frames([FRAME]))])
+    assert replies[0][0]["type"] == "error"
+
+def test_wrong_token_is_rejected(worker_address):
+    replies = exchange(worker_address, [({"command": "hello", "token": "errado"}, []),
+                                        ({"command": "upscale", "scale": 2}, upscale._encode_frames([FRAME]))])
+    assert replies[0][0]["type"] == "error"
+    assert len(replies) == 1 or replies[1] is None
+
+def test_upscale_after_hello(worker_address):
+    replies = exchange(worker_address, [({"command": "hello", "token": "segredo"}, []),
+                                        ({"command": "upscale", "scale": 2}, upscale._encode_frames([FRAME]))])
+    assert replies[0][0]["type"] == "hello"
+    header, payloads = replies[1]
+    assert header["type"] == "result"
+    assert upscale._decode_frames(payloads)[0].shape == (8, 8, 3)
+
+def header_stream(header, body=b""):
+    return io.BytesIO(json.dumps(header).encode("utf-8") + b"\n" + body)
+
+def test_read_message_limits_payloads():
+    with pytest.raises(ValueError):
+        upscale._read_message(header_stream({"sizes": [1] * (upscale.DISTRIBUTED_MAX_PAYLOADS + 1)}))
+    with pytest.raises(ValueError):
+        upscale._read_message(header_stream({"sizes": [upscale.DISTRIBUTED_MAX_PAYLOAD_BYTES + 1]}))
+    with pytest.raises(ValueError):
+        upscale._read_message(header_stream({"sizes": [-1]}))
+    with pytest.raises(ValueError):
+        upscale._read_message(io.BytesIO(b"x" * (upscale.DISTRIBUTED_MAX_HEADER_BYTES + 10) + b"\n"))
+
+def test_read_message_round_trip():
+    stream = io.BytesIO()
+    upscale._send_message(stream, {"type": "result"}, [b"abc", b""])
+    stream.seek(0)
+    header, payloads = upscale._read_message(stream)
+    assert header["type"] == "result" and payloads == [b"abc", b""]
+
+def test_loopback_hosts():
+    assert upscale.is_loopback_host("127.0.0.1")
+    assert upscale.is_loopback_host("localhost")
+    assert not upscale.is_loopback_host("0.0.0.0")
+    assert not upscale.is_loopback_host("nao-existe.invalid")
+
+def test_worker_refuses_network_address_without_token():
+    with pytest.raises(ValueError):
+        upscale.run_upscale_worker("0.0.0.0:0", {})
+
+def test_worker_listens_on_loopback_by_default():
+    default = inspect.signature(upscale.run_upscale_worker).parameters["listen"].default
+    assert upscale.parse_address(default)[0] == "127.0.0.1"
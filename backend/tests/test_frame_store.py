@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import upscale
+
+SHAPE = (24, 32, 3)
+
+def noise(seed):
+    return np.random.default_rng(seed).integers(0, 256, SHAPE, dtype=np.uint8)
+
+@pytest.mark.parametrize("codec", ["raw", "zlib"])
+def test_write_read_round_trip(tmp_path, codec):
+    store = upscale.open_frame_store(str(tmp_path / "frames"), SHAPE, 4, codec)
+    flat = np.full(SHAPE, 77, dtype=np.uint8)
+    random = noise(1)
+    upscale.frame_store_write(store, 0, flat)
+    upscale.frame_store_write(store, 2, random)
+    assert np.array_equal(upscale.frame_store_read(store, 0), flat)
+    assert np.array_equal(upscale.frame_store_read(store, 2), random)
+    assert upscale.frame_store_read(store, 1) is None
+    assert upscale.frame_store_indices(store) == [0, 2]
+    upscale.close_frame_store(store)
+
+def test_zlib_compresses_redundant_frames_and_keeps_noise_raw(tmp_path):
+    store = upscale.open_frame_store(str(tmp_path / "frames"), SHAPE, 2, "zlib")
+    slot_bytes = int(np.prod(SHAPE))
+    assert upscale.frame_store_write(store, 0, np.zeros(SHAPE, dtype=np.uint8)) < slot_bytes
+    assert upscale.frame_store_write(store, 1, noise(2)) == slot_bytes
+    upscale.close_frame_store(store)
+
+def test_store_grows_past_its_capacity(tmp_path):
+    store = upscale.open_frame_store(str(tmp_path / "frames"), SHAPE, 2)
+    upscale.frame_store_write(store, 9, noise(3))
+    assert store["capacity"] >= 10
+    assert np.array_equal(upscale.frame_store_read(store, 9), noise(3))
+    upscale.close_frame_store(store)
+
+def test_clear_and_has(tmp_path):
+    store = upscale.open_frame_store(str(tmp_path / "frames"), SHAPE, 2)
+    upscale.frame_store_write(store, 1, noise(4))
+    assert upscale.frame_store_has(store, 1)
+    upscale.frame_store_clear(store, 1)
+    assert not upscale.frame_store_has(store, 1)
+    assert not upscale.frame_store_has(store, 50)
+    assert upscale.frame_store_read(store, 1) is None
+    upscale.close_frame_store(store)
+
+def test_frames_are_resized_to_the_store_shape(tmp_path):
+    store = upscale.open_frame_store(str(tmp_path / "frames"), SHAPE, 1)
+    upscale.frame_store_write(store, 0, np.zeros((12, 16, 3), dtype=np.uint8))
+    assert upscale.frame_store_read(store, 0).shape == SHAPE
+    upscale.close_frame_store(store)
+
+def test_reopening_with_the_same_shape_resumes(tmp_path):
+    path = str(tmp_path / "frames")
+    store = upscale.open_frame_store(path, SHAPE, 2)
+    upscale.frame_store_write(store, 5, noise(5))
+    upscale.close_frame_store(store)
+    store = upscale.open_frame_store(path, SHAPE, 2)
+    assert upscale.frame_store_indices(store) == [5]
+    assert np.array_equal(upscale.frame_store_read(store, 5), noise(5))
+    upscale.close_frame_store(store)
+    store = upscale.open_frame_store(path, (48, 64, 3), 2)
+    assert upscale.frame_store_indices(store) == []
+    upscale.close_frame_store(store)
+
+def test_job_stores_are_scaled(tmp_path):
+    source, target = upscale.open_job_frame_stores(str(tmp_path), 32, 24, 2, 3)
+    assert source["shape"] == (24, 32, 3)
+    assert target["shape"] == (48, 64, 3)
+    upscale.close_frame_store(source)
+    upscale.close_frame_store(target)
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+import upscale
+
+def nearest_backend():
+    """Backend em processo que faz resize nearest-neighbor e registra o tamanho de cada entrada"""
+    calls = []
+
+    def upscale_batch(frames, scale, settings, tuner=None):
+        calls.extend(f.shape[:2] for f in frames)
+        return [cv2.resize(f, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST) for f in frames]
+    return {
+        "name": "nearest", "model": "nearest", "scales": (2,), "exe_path": None,
+        "settings": {"j_value": "", "batch_size": 1, "tile_size": 0, "num_threads": 1},
+        "upscale_batch": upscale_batch, "calls": calls,
+    }
+
+def noise(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+def test_tiles_cover_the_frame_once_and_margins_stay_inside():
+    tiles = upscale.split_frame_tiles(50, 30, 16, 4)
+    covered = np.zeros((30, 50), dtype=int)
+    for (x0, y0, x1, y1), (px0, py0, px1, py1) in tiles:
+        covered[y0:y1, x0:x1] += 1
+        assert 0 <= px0 <= x0 and 0 <= py0 <= y0
+        assert x1 <= px1 <= 50 and y1 <= py1 <= 30
+        assert x0 - px0 <= 4 and px1 - x1 <= 4 and y0 - py0 <= 4 and py1 - y1 <= 4
+    assert (covered == 1).all()
+    assert len(tiles) == 4 * 2
+
+def test_feather_weights_ramp_only_in_the_margins():
+    weights = upscale._feather_weights(10, 3, 2)
+    assert np.allclose(weights[:3], [0.25, 0.5, 0.75])
+    assert (weights[3:8] == 1).all()
+    assert np.allclose(weights[8:], [2 / 3, 1 / 3])
+    assert (upscale._feather_weights(5, 0, 0) == 1).all()
+
+def test_patches_without_margin_replace_the_region():
+    canvas = np.zeros((8, 8, 3), dtype=np.uint8)
+    crop = np.full((4, 4, 3), 200, dtype=np.uint8)
+    upscale.apply_tile_patches(canvas, [((0, 0, 2, 2), (0, 0, 2, 2), crop)], 2)
+    assert (canvas[:4, :4] == 200).all()
+    assert (canvas[4:, :] == 0).all() and (canvas[:, 4:] == 0).all()
+
+def test_patch_margin_blends_into_the_canvas():
+    canvas = np.zeros((4, 16, 3), dtype=np.uint8)
+    crop = np.full((4, 12, 3), 255, dtype=np.uint8)
+    upscale.apply_tile_patches(canvas, [((0, 0, 4, 2), (0, 0, 6, 2), crop)], 2)
+    row = canvas[0, :, 0]
+    assert (row[:8] == 255).all()
+    assert 0 < row[11] < row[8] < 255
+    assert (row[12:] == 0).all()
+
+def test_patches_of_a_whole_grid_rebuild_the_upscaled_frame():
+    frame = noise(30, 50)
+    full = cv2.resize(frame, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST)
+    patches = []
+    for tile, (px0, py0, px1, py1) in upscale.split_frame_tiles(50, 30, 16, 4):
+        patches.append((tile, (px0, py0, px1, py1), full[py0 * 2:py1 * 2, px0 * 2:px1 * 2].copy()))
+    canvas = upscale.apply_tile_patches(np.zeros_like(full), patches, 2)
+    assert np.array_equal(canvas, full)
+
+def test_tiled_frame_matches_the_whole_frame_upscale():
+    backend = nearest_backend()
+    frame = noise(40, 70, seed=1)
+    result = upscale.upscale_frame_tiles(frame, backend, 2, backend["settings"], 16, 4, 3)
+    assert np.array_equal(result, cv2.resize(frame, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST))
+    assert max(h for h, _ in backend["calls"]) <= 16 + 2 * 4
+    assert max(w for _, w in backend["calls"]) <= 16 + 2 * 4
+
+def test_tiled_backend_passes_small_frames_through():
+    inner = nearest_backend()
+    tiled = upscale.create_tiled_backend(inner, scale=2, tile_size=16, overlap=4, workers=2)
+    small, large = noise(20, 20), noise(40, 70, seed=2)
+    results = tiled["upscale_batch"]([small, large], 2, tiled["settings"])
+    assert inner["calls"][0] == (20, 20)
+    assert len(inner["calls"]) > 2
+    for frame, result in zip((small, large), results):
+        assert np.array_equal(result, cv2.resize(frame, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST))
@@ -0,0 +1,39 @@
+import upscale
+
+class RecordingWriter:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+def write_all(timestamps, fps=10.0):
+    out, timing = RecordingWriter(), upscale.create_frame_timing(fps)
+    for i, timestamp in enumerate(timestamps):
+        upscale.write_timed_frame(out, f"f{i}", timestamp, timing)
+    return out.frames, timing
+
+def test_constant_rate_passes_through():
+    frames, timing = write_all([0.0, 0.1, 0.2, 0.3])
+    assert frames == ["f0", "f1", "f2", "f3"]
+    assert timing["repeated"] == timing["dropped"] == 0
+
+def test_gap_repeats_previous_frame():
+    frames, timing = write_all([0.0, 0.1, 0.4, 0.5])
+    assert frames == ["f0", "f1", "f1", "f1", "f2", "f3"]
+    assert timing["repeated"] == 2
+
+def test_frames_on_the_same_output_slot_are_dropped():
+    frames, timing = write_all([0.0, 0.02, 0.1, 0.13, 0.2])
+    assert frames == ["f0", "f2", "f4"]
+    assert timing["dropped"] == 2
+
+def test_origin_is_the_first_timestamp():
+    frames, _ = write_all([5.0, 5.1, 5.3])
+    assert frames == ["f0", "f1", "f1", "f2"]
+
+def test_without_timestamp_or_timing_frames_are_written_as_is():
+    out = RecordingWriter()
+    upscale.write_timed_frame(out, "a", None, upscale.create_frame_timing(10.0))
+    upscale.write_timed_frame(out, "b", 3.0, None)
+    assert out.frames == ["a", "b"]
@@ -0,0 +1,120 @@
+import os
+import sys
+
+import pytest
+
+import media_probe
+
+def probe_json(video=None, audio=(), packets=None, fmt=None):
+    """Saída do ffprobe (-show_format -show_streams + pacotes da trilha de vídeo)"""
+    stream = {"index": 0, "codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p",
+              "width": 1920, "height": 1080, "time_base": "1/12288",
+              "avg_frame_rate": "24/1", "r_frame_rate": "24/1"}
+    stream.update(video or {})
+    streams = [stream] + [dict({"index": i + 1, "codec_type": "audio"}, **a) for i, a in enumerate(audio)]
+    if packets is None:
+        packets = [{"stream_index": 0, "pts_time": f"{i / 24:.6f}", "flags": "K_" if i % 24 == 0 else "__"}
+                   for i in range(48)]
+    return {"format": fmt or {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "2.000000",
+                              "bit_rate": "800000"},
+            "streams": streams, "packets": packets}
+
+def test_constant_frame_rate_with_audio():
+    info = media_probe.parse_probe(probe_json(audio=[{"codec_name": "aac", "channels": 2, "sample_rate": "48000",
+                                                      "tags": {"language": "por"}}]))
+    assert info["frame_count"] == 48
+    assert info["fps"] == 24.0 and not info["vfr"]
+    assert info["keyframes"] == [0.0, 1.0]
+    assert info["time_base"] == "1/12288" and info["pix_fmt"] == "yuv420p"
+    assert info["audio"] == [{"index": 1, "codec": "aac", "channels": 2, "channel_layout": None,
+                              "sample_rate": 48000, "bit_rate": 0, "language": "por"}]
+
+def test_missing_audio():
+    info = media_probe.parse_probe(probe_json())
+    assert info["audio"] == []
+    assert "sem áudio" in media_probe.describe_probe(info)
+
+@pytest.mark.parametrize("video, rotation", [
+    ({"side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}]}, 90),
+    ({"side_data_list": [{"rotation": 90}]}, 270),
+    ({"tags": {"rotate": "180"}}, 180),
+    ({}, 0),
+])
+def test_rotation_and_display_size(video, rotation):
+    info = media_probe.parse_probe(probe_json(video=video))
+    assert info["rotation"] == rotation
+    expected = (1080, 1920) if rotation in (90, 270) else (1920, 1080)
+    assert (info["display_width"], info["display_height"]) == expected
+
+def test_variable_frame_rate():
+    times = [0.0, 0.04, 0.08, 0.2, 0.24, 0.4, 0.44]
+    packets = [{"stream_index": 0, "pts_time": str(t), "flags": "K_" if t == 0 else "__"} for t in times]
+    info = media_probe.parse_probe(probe_json(video={"avg_frame_rate": "0/0", "r_frame_rate": "25/1"},
+                                              packets=packets))
+    assert info["vfr"]
+    assert info["frame_count"] == len(times)
+    assert info["fps"] == pytest.approx((len(times) - 1) / 0.44)
+    assert info["base_fps"] == 25.0
+
+def test_packets_of_other_streams_are_ignored():
+    packets = probe_json()["packets"] + [{"stream_index": 1, "pts_time": "0.0", "flags": "K_"}] * 10
+    info = media_probe.parse_probe(probe_json(audio=[{"codec_name": "aac"}], packets=packets))
+    assert info["frame_count"] == 48
+
+def test_without_video_stream():
+    data = probe_json()
+    data["streams"] = [{"index": 0, "codec_type": "audio", "codec_name": "mp3"}]
+    with pytest.raises(media_probe.ProbeError):
+        media_probe.parse_probe(data)
+
+def test_parse_packet_line():
+    assert media_probe.parse_packet_line("pts_time=0.041667|dts_time=N/A|flags=K__\n", 3) == {
+        "stream_index": 3, "pts_time": "0.041667", "dts_time": "N/A", "flags": "K__"}
+    assert media_probe.parse_packet_line("\n", 0) is None
+
+def test_cache_is_keyed_by_size_and_mtime(tmp_path, monkeypatch):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"x" * 10)
+    calls = []
+    monkeypatch.setattr(media_probe, "run_ffprobe", lambda path: calls.append(path) or probe_json())
+    monkeypatch.setattr(media_probe, "_memory_cache", {})
+    cache_dir = str(tmp_path / "cache")
+    
+    assert media_probe.probe_media(str(video), cache_dir)["frame_count"] == 48
+    media_probe._memory_cache.clear()
+    media_probe.probe_media(str(video), cache_dir)  # do disco
+    assert len(calls) == 1
+    
+    stat = os.stat(video)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    media_probe.probe_media(str(video), cache_dir)
+    assert len(calls) == 2
+
+FAKE_FFPROBE = """#!{python}
+import json, sys
+args = sys.argv[1:]
+with open({log!r}, "a") as log:
+    log.write(" ".join(args) + "\\n")
+if "-show_streams" in args:
+    print(json.dumps({{"format": {{"duration": "0.125"}}, "streams": [
+        {{"index": 0, "codec_type": "audio", "codec_name": "aac"}},
+        {{"index": 1, "codec_type": "video", "codec_name": "h264", "width": 64, "height": 48,
+         "avg_frame_rate": "24/1", "r_frame_rate": "24/1"}}]}}))
+else:
+    for i in range(3):
+        print(f"pts_time={{i / 24:.6f}}|dts_time={{i / 24:.6f}}|flags={{'K_' if i == 0 else '__'}}")
+"""
+
+def test_run_ffprobe_reads_only_video_packets(tmp_path, monkeypatch):
+    log = tmp_path / "calls.log"
+    script = tmp_path / "ffprobe"
+    script.write_text(FAKE_FFPROBE.format(python=sys.executable, log=str(log)))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    
+    info = media_probe.parse_probe(media_probe.run_ffprobe("video.mp4"))
+    assert info["frame_count"] == 3 and info["keyframes"] == [0.0]
+    calls = log.read_text().splitlines()
+    assert len(calls) == 2
+    assert "packet" not in calls[0]
+    assert "-select_streams 1" in calls[1]
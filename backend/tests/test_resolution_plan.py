@@ -0,0 +1,68 @@
+import pytest
+
+import upscale
+
+ENCODER = {"name": "ffmpeg"}
+
+def test_skip_is_opt_in_by_default():
+    options = upscale.parse_pipeline_options({})
+    assert options["resolution_skip"] is False
+    plan = upscale.plan_resolution(1920, 1080, 2, 1920, 1080, (2, 3, 4), ENCODER, options["resolution_plan"],
+                                   options["resolution_skip"])
+    assert plan["mode"] == "upscale"
+    assert plan["model_scale"] == 2
+
+def test_skip_when_enabled_and_source_covers_the_target():
+    options = upscale.parse_pipeline_options({"resolutionSkip": True})
+    plan = upscale.plan_resolution(3840, 2160, 2, 1920, 1080, (2, 3, 4), ENCODER, options["resolution_plan"],
+                                   options["resolution_skip"])
+    assert plan["mode"] == "skip"
+    assert plan["model_scale"] == 1
+    assert plan["resize"] == "ffmpeg"
+
+def test_auto_prescales_so_the_model_lands_on_the_target():
+    plan = upscale.plan_resolution(1280, 720, 2, 1920, 1080, (2, 3, 4), ENCODER, "auto")
+    assert plan["mode"] == "upscale"
+    assert plan["prescale"] == (960, 540)
+    assert plan["upscaled"] == (1920, 1080)
+    assert plan["resize"] is None
+
+def test_quality_keeps_the_input_and_resizes_at_the_end():
+    plan = upscale.plan_resolution(1280, 720, 2, 1920, 1080, (2, 3, 4), ENCODER, "quality")
+    assert plan["prescale"] is None
+    assert plan["upscaled"] == (2560, 1440)
+    assert plan["resize"] == "ffmpeg"
+
+def test_off_keeps_the_requested_scale_even_when_skip_is_allowed():
+    plan = upscale.plan_resolution(1920, 1080, 2, 1920, 1080, (2, 3, 4), ENCODER, "off", allow_skip=True)
+    assert plan["mode"] == "upscale"
+    assert plan["model_scale"] == 2
+    assert plan["upscaled"] == (3840, 2160)
+
+def test_smallest_model_scale_that_covers_the_target():
+    plan = upscale.plan_resolution(100, 50, 4, 300, 150, (2, 3, 4), ENCODER, "auto")
+    assert plan["model_scale"] == 3
+    assert plan["prescale"] is None
+    assert plan["resize"] is None
+
+def test_small_source_uses_the_requested_scale_and_resizes():
+    plan = upscale.plan_resolution(640, 360, 2, 1920, 1080, (2, 3, 4), ENCODER, "auto")
+    assert plan["model_scale"] == 2
+    assert plan["prescale"] is None
+    assert plan["upscaled"] == (1280, 720)
+    assert plan["resize"] == "ffmpeg"
+
+def test_without_ffmpeg_encoder_there_is_no_skip_and_resize_is_opencv():
+    plan = upscale.plan_resolution(1920, 1080, 2, 1280, 720, (2, 3, 4), None, "quality", allow_skip=True)
+    assert plan["mode"] == "upscale"
+    assert plan["resize"] == "opencv"
+
+def test_target_defaults_to_the_requested_scale():
+    plan = upscale.plan_resolution(320, 180, 4, model_scales=(2, 4), encoder=ENCODER)
+    assert plan["target"] == (1280, 720)
+    assert plan["model_scale"] == 4
+    assert plan["resize"] is None
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        upscale.plan_resolution(640, 360, 2, policy="fast")
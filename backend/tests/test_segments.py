@@ -0,0 +1,35 @@
+import shutil
+import subprocess
+
+import cv2
+import pytest
+
+import upscale
+
+def test_cuts_land_on_nearest_keyframes():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert upscale.choose_segment_cuts(keyframes, 2, 10.0) == [4.0]
+    assert upscale.choose_segment_cuts(keyframes, 4, 8.0) == [2.0, 4.0, 6.0]
+    assert upscale.choose_segment_cuts(keyframes, 3, 10.0) == [4.0, 6.0]
+
+def test_cuts_are_relative_to_the_first_keyframe():
+    assert upscale.choose_segment_cuts([1.0, 3.0, 5.0, 7.0], 2, 6.0) == [3.0]
+
+def test_cuts_are_not_repeated_when_keyframes_are_sparse():
+    assert upscale.choose_segment_cuts([0.0, 9.0], 4, 10.0) == [9.0]
+
+def test_single_keyframe_or_segment_has_no_cuts():
+    assert upscale.choose_segment_cuts([0.0], 4, 10.0) == []
+    assert upscale.choose_segment_cuts([0.0, 5.0], 1, 10.0) == []
+    assert upscale.choose_segment_cuts([], 4, 10.0) == []
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg não instalado")
+def test_split_keeps_every_frame(tmp_path):
+    source = str(tmp_path / "in.mp4")
+    subprocess.run(["ffmpeg", "-f", "lavfi", "-i", "testsrc=size=64x48:rate=10:duration=4",
+                    "-c:v", "libx264", "-g", "10", "-pix_fmt", "yuv420p", source, "-y"],
+                   capture_output=True, check=True)
+    segments = upscale.split_video_at_keyframes(source, str(tmp_path / "segments"), 4, 4.0)
+    assert len(segments) > 1
+    counts = [int(cv2.VideoCapture(path).get(cv2.CAP_PROP_FRAME_COUNT)) for path in segments]
+    assert sum(counts) == 40
@@ -0,0 +1,54 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import upscale
+
+@pytest.fixture
+def listener():
+    listener = upscale.start_socket_listener(upscale.create_job_server(1, 1), "127.0.0.1:0")
+    yield listener
+    listener.shutdown()
+    listener.server_close()
+
+def connect(listener):
+    client = socket.create_connection(listener.server_address[:2], timeout=10)
+    deadline = time.time() + 5
+    while len(upscale.EVENT_SINKS) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(upscale.EVENT_SINKS) == 1
+    return client
+
+def test_connected_client_receives_events_in_order(listener):
+    client = connect(listener)
+    for i in range(50):
+        upscale.emit_event({"type": "test", "n": i})
+    reader = client.makefile("r", encoding="utf-8")
+    received = []
+    while len(received) < 50:
+        event = json.loads(reader.readline())
+        if event["type"] == "test":
+            received.append(event["n"])
+    assert received == list(range(50))
+    client.close()
+
+def test_client_that_stops_reading_does_not_block_events(listener, monkeypatch):
+    monkeypatch.setattr(upscale, "SERVER_CLIENT_QUEUE", 20)
+    client = connect(listener)
+    payload = "x" * 64 * 1024
+
+    def flood():
+        for _ in range(400):
+            upscale.emit_event({"type": "test", "payload": payload})
+    emitter = threading.Thread(target=flood, daemon=True)
+    emitter.start()
+    emitter.join(timeout=30)
+    assert not emitter.is_alive()
+    deadline = time.time() + 5
+    while upscale.EVENT_SINKS and time.time() < deadline:
+        time.sleep(0.01)
+    assert upscale.EVENT_SINKS == []
+    client.close()
@@ -0,0 +1,115 @@
+import time
+
+import cv2
+import numpy as np
+
+import upscale
+
+TILE = 8
+
+def nearest_backend(fails=lambda frame: False):
+    """Backend em processo que faz resize nearest-neighbor (saída exata e previsível); None onde `fails`"""
+    def upscale_batch(frames, scale, settings, tuner=None):
+        return [None if fails(f) else cv2.resize(f, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+                for f in frames]
+    return {
+        "name": "nearest", "model": "nearest", "scales": (2,), "exe_path": None,
+        "settings": {"j_value": "", "batch_size": 1, "tile_size": 0, "num_threads": 1},
+        "upscale_batch": upscale_batch,
+    }
+
+class FakeReader:
+    def __init__(self, frames, fps=24.0, delay=0.0):
+        self.frames = list(frames)
+        self.fps = fps
+        self.delay = delay
+        self.position = -1
+
+    def read(self):
+        time.sleep(self.delay)
+        if self.position + 1 >= len(self.frames):
+            return False, None
+        self.position += 1
+        return True, self.frames[self.position].copy()
+
+    def get(self, prop):
+        return self.position / self.fps * 1000 if prop == cv2.CAP_PROP_POS_MSEC else 0
+
+    def release(self):
+        pass
+
+class FakeWriter:
+    def __init__(self):
+        self.frames = []
+
+    def isOpened(self):
+        return True
+
+    def write(self, frame):
+        self.frames.append(np.array(frame))
+
+    def release(self):
+        pass
+
+def tile_frame(values):
+    """Frame 2x2 tiles (16x16) com cada tile preenchido com o valor de `values` (ordem raster)"""
+    frame = np.zeros((2 * TILE, 2 * TILE, 3), dtype=np.uint8)
+    for i, value in enumerate(values):
+        y, x = divmod(i, 2)
+        frame[y * TILE:(y + 1) * TILE, x * TILE:(x + 1) * TILE] = value
+    return frame
+
+def run_stream(monkeypatch, tmp_path, frames, backend=None, read_delay=0.0):
+    writer = FakeWriter()
+    monkeypatch.setattr(upscale, "open_video_reader", lambda *args, **kwargs: FakeReader(frames, delay=read_delay))
+    monkeypatch.setattr(upscale, "open_video_writer", lambda *args, **kwargs: writer)
+    monkeypatch.setattr(upscale, "get_scratch_root", lambda: str(tmp_path))
+    state = upscale.create_tile_diff_state(tile_size=TILE, overlap=0, threshold=1.0)
+    upscale.stream_video("in.mp4", str(tmp_path / "out.mp4"), backend or nearest_backend(), 2, 24.0, len(frames),
+                         queue_depth=2, tile_diff=state)
+    return writer.frames
+
+def tile_mean(frame, index, scale=2):
+    y, x = divmod(index, 2)
+    size = TILE * scale
+    return frame[y * size:(y + 1) * size, x * size:(x + 1) * size].mean()
+
+def test_tile_changed_then_static_keeps_new_content(monkeypatch, tmp_path):
+    # Tile A muda no frame 1, tile B no frame 2; A fica parado depois disso
+    frames = [tile_frame([0, 0, 0, 0]), tile_frame([250, 0, 0, 0]),
+              tile_frame([250, 250, 0, 0]), tile_frame([250, 250, 0, 0])]
+    written = run_stream(monkeypatch, tmp_path, frames)
+    assert len(written) == 4
+    assert [tile_mean(f, 0) for f in written] == [0, 250, 250, 250]
+    assert [tile_mean(f, 1) for f in written] == [0, 0, 250, 250]
+
+def test_failed_tiles_are_planned_again():
+    state = upscale.create_tile_diff_state(tile_size=TILE, overlap=0, threshold=1.0)
+    assert upscale.plan_changed_tiles(tile_frame([0, 0, 0, 0]), state) is None
+    changed = tile_frame([250, 0, 0, 0])
+    plan = upscale.plan_changed_tiles(changed, state)
+    assert [tile for tile, _ in plan] == [(0, 0, TILE, TILE)]
+    
+    # Sem falha o mesmo conteúdo não gera trabalho; com falha o tile volta no próximo plano
+    upscale.mark_tiles_failed(state, plan)
+    assert [tile for tile, _ in upscale.plan_changed_tiles(changed, state)] == [(0, 0, TILE, TILE)]
+    assert upscale.plan_changed_tiles(changed, state) == []
+
+def test_failed_full_frame_sends_the_next_frame_whole():
+    state = upscale.create_tile_diff_state(tile_size=TILE, overlap=0, threshold=1.0)
+    assert upscale.plan_changed_tiles(tile_frame([0, 0, 0, 0]), state) is None
+    upscale.mark_tiles_failed(state, None)
+    assert upscale.plan_changed_tiles(tile_frame([0, 0, 0, 0]), state) is None
+    assert upscale.plan_changed_tiles(tile_frame([0, 0, 0, 0]), state) == []
+
+def test_failed_full_frame_is_not_used_as_patch_base(monkeypatch, tmp_path):
+    # O frame 1 (todos os tiles mudam: frame inteiro) falha; os seguintes só mudam o tile 3 em relação a ele
+    after = tile_frame([250, 250, 250, 200])
+    frames = [tile_frame([0, 0, 0, 0]), tile_frame([250, 250, 250, 250])] + [after] * 4
+    backend = nearest_backend(fails=lambda frame: frame.shape[0] == 2 * TILE and (frame == 250).all())
+    written = run_stream(monkeypatch, tmp_path, frames, backend, read_delay=0.02)
+    expected = [cv2.resize(f, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST) for f in (frames[0], after)]
+    assert written
+    for frame in written:
+        assert any(np.array_equal(frame, e) for e in expected)
+    assert np.array_equal(written[-1], expected[1])
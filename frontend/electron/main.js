@@ -4,7 +4,10 @@ const path = require('path');
 const fs = require('fs');
 
 let mainWindow;
+// Servidor Python persistente (upscale.py --server): imports e GPU ficam "quentes" entre conversões
 let pythonProcess = null;
+let activeJobId = null;
+const pendingJobs = new Map(); // jobId -> { resolve, reject }
 
 // DEBUG: Log inicial
 console.log('🚀 Electron iniciando...');
@@ -325,6 +328,132 @@ ipcMain.handle('select-output-folder', async () => {
   return result.canceled ? null : result.filePaths[0];
 });
 
+function sendToRenderer(message) {
+  if (mainWindow && !mainWindow.isDestroyed()) {
+    mainWindow.webContents.send('conversion-progress', message);
+  }
+}
+
+// Trata uma linha JSON emitida pelo servidor Python
+function handleServerMessage(message) {
+  if (message.type === 'job') {
+    const job = pendingJobs.get(message.jobId);
+    if (!job) return;
+
+    if (message.status === 'done') {
+      pendingJobs.delete(message.jobId);
+      sendToRenderer({ type: 'complete', message: 'Conversão concluída com sucesso!' });
+      job.resolve({ success: true });
+    } else if (message.status === 'failed' || message.status === 'cancelled') {
+      pendingJobs.delete(message.jobId);
+      const errorMsg = message.status === 'cancelled'
+        ? 'Conversão cancelada'
+        : `Conversão falhou: ${message.error || 'erro desconhecido'}`;
+      sendToRenderer({ type: 'error', message: errorMsg });
+      job.reject(new Error(errorMsg));
+    }
+    if (!pendingJobs.has(message.jobId) && activeJobId === message.jobId) {
+      activeJobId = null;
+    }
+    return;
+  }
+
+  // Eventos de outros jobs não interessam à tela; erros de comando chegam sem jobId
+  if (message.jobId && message.jobId !== activeJobId) return;
+  if (message.type === 'server') {
+    console.log(`🐍 Servidor Python: ${message.status}`);
+    return;
+  }
+  sendToRenderer(message);
+}
+
+function startPythonServer() {
+  if (pythonProcess) return pythonProcess;
+
+  const backendPath = getBackendPath();
+  const pythonPath = getPythonPath();
+
+  console.log(`🚀 Executando: ${pythonPath} ${backendPath} --server`);
+  console.log(`📁 Backend path: ${backendPath}`);
+  console.log(`📁 Backend existe: ${fs.existsSync(backendPath)}`);
+
+  // Verificar se o backend existe
+  if (!fs.existsSync(backendPath)) {
+    throw new Error(`Arquivo Python não encontrado: ${backendPath}`);
+  }
+
+  // Configurações otimizadas para o processo Python
+  const processEnv = {
+    ...process.env,
+    PYTHONUNBUFFERED: '1',
+    CUDA_VISIBLE_DEVICES: '0' // Forçar GPU 0
+  };
+
+  const serverProcess = spawn(pythonPath, [backendPath, '--server'], {
+    stdio: ['pipe', 'pipe', 'pipe'],
+    cwd: path.dirname(backendPath),
+    env: processEnv,
+    windowsHide: false // Manter visível no Windows
+  });
+  pythonProcess = serverProcess;
+
+  console.log('✅ Servidor Python iniciado com PID:', serverProcess.pid);
+
+  let stdoutBuffer = '';
+  let stderrBuffer = '';
+
+  serverProcess.stdout.on('data', (data) => {
+    stdoutBuffer += data.toString();
+
+    // Processar linhas completas
+    const lines = stdoutBuffer.split('\n');
+    stdoutBuffer = lines.pop() || ''; // Mantém linha incompleta
+
+    lines.forEach(line => {
+      if (!line.trim()) return;
+      try {
+        handleServerMessage(JSON.parse(line));
+      } catch (e) {
+        sendToRenderer({ type: 'log', message: line.trim() });
+      }
+    });
+  });
+
+  serverProcess.stderr.on('data', (data) => {
+    const errorOutput = data.toString();
+    stderrBuffer = (stderrBuffer + errorOutput).slice(-10000);
+    console.log('❌ Python stderr:', errorOutput);
+
+    // Enviar erros críticos imediatamente
+    if (errorOutput.includes('out of memory') || errorOutput.includes('CUDA error')) {
+      sendToRenderer({ type: 'error', message: `Erro GPU: ${errorOutput}` });
+    }
+  });
+
+  const failPendingJobs = (errorMsg) => {
+    for (const [jobId, job] of pendingJobs) {
+      pendingJobs.delete(jobId);
+      sendToRenderer({ type: 'error', message: errorMsg });
+      job.reject(new Error(stderrBuffer ? `${errorMsg}\n\nDetalhes:\n${stderrBuffer}` : errorMsg));
+    }
+    activeJobId = null;
+  };
+
+  serverProcess.on('close', (code) => {
+    console.log(`🔚 Servidor Python finalizado com código: ${code}`);
+    if (pythonProcess === serverProcess) pythonProcess = null;
+    failPendingJobs(`Processo finalizado com código ${code}`);
+  });
+
+  serverProcess.on('error', (error) => {
+    console.log('💥 Erro no processo Python:', error);
+    if (pythonProcess === serverProcess) pythonProcess = null;
+    failPendingJobs(`Erro ao executar Python: ${error.message}. Verifique a instalação do Python.`);
+  });
+
+  return serverProcess;
+}
+
 ipcMain.handle('start-conversion', async (event, config) => {
   console.log('🎬 Iniciando conversão com config:', config);
   
@@ -349,130 +478,19 @@ ipcMain.handle('start-conversion', async (event, config) => {
 
   return new Promise((resolve, reject) => {
     try {
-      const backendPath = getBackendPath();
-      const pythonPath = getPythonPath();
-
-      console.log(`🚀 Executando: ${pythonPath} ${backendPath}`);
-      console.log(`📁 Backend path: ${backendPath}`);
-      console.log(`📁 Backend existe: ${fs.existsSync(backendPath)}`);
       console.log(`📁 Input: ${config.inputPath}`);
       console.log(`📁 Output: ${config.outputPath}`);
       console.log(`🎮 GPU Memory Limit: ${config.gpuMemory || 'Auto'}`);
       console.log(`⚡ Scale: ${config.scale || 2}`);
 
-      // Verificar se o backend existe
-      if (!fs.existsSync(backendPath)) {
-        const errorMsg = `Arquivo Python não encontrado: ${backendPath}`;
-        console.log('❌', errorMsg);
-        throw new Error(errorMsg);
-      }
-
-      // Configurações otimizadas para o processo Python
-      const processEnv = {
-        ...process.env,
-        PYTHONUNBUFFERED: '1',
-        CUDA_VISIBLE_DEVICES: '0' // Forçar GPU 0
-      };
-
-      pythonProcess = spawn(pythonPath, [backendPath], {
-        stdio: ['pipe', 'pipe', 'pipe'],
-        cwd: path.dirname(backendPath),
-        env: processEnv,
-        windowsHide: false // Manter visível no Windows
-      });
-
-      console.log('✅ Processo Python iniciado com PID:', pythonProcess.pid);
-
-      // Enviar configuração para o Python
-      pythonProcess.stdin.write(JSON.stringify(config));
-      pythonProcess.stdin.end();
-
-      let stdoutBuffer = '';
-      let stderrBuffer = '';
-
-      pythonProcess.stdout.on('data', (data) => {
-        const output = data.toString();
-        stdoutBuffer += output;
-        
-        // Processar linhas completas
-        const lines = stdoutBuffer.split('\n');
-        stdoutBuffer = lines.pop() || ''; // Mantém linha incompleta
-        
-        lines.forEach(line => {
-          if (line.trim()) {
-            try {
-              const message = JSON.parse(line);
-              mainWindow.webContents.send('conversion-progress', message);
-            } catch (e) {
-              if (line.trim().length > 0) {
-                mainWindow.webContents.send('conversion-progress', {
-                  type: 'log',
-                  message: line.trim()
-                });
-              }
-            }
-          }
-        });
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        const errorOutput = data.toString();
-        stderrBuffer += errorOutput;
-        console.log('❌ Python stderr:', errorOutput);
-        
-        // Enviar erros críticos imediatamente
-        if (errorOutput.includes('out of memory') || errorOutput.includes('CUDA error')) {
-          mainWindow.webContents.send('conversion-progress', {
-            type: 'error',
-            message: `Erro GPU: ${errorOutput}`
-          });
-        }
-      });
-
-      pythonProcess.on('close', (code) => {
-        console.log(`🔚 Processo Python finalizado com código: ${code}`);
-        
-        // Processar qualquer buffer restante
-        if (stdoutBuffer.trim()) {
-          try {
-            const message = JSON.parse(stdoutBuffer);
-            mainWindow.webContents.send('conversion-progress', message);
-          } catch (e) {
-            // Ignora erro de parse
-          }
-        }
-        
-        if (code === 0) {
-          mainWindow.webContents.send('conversion-progress', {
-            type: 'complete',
-            message: 'Conversão concluída com sucesso!'
-          });
-          resolve({ success: true });
-        } else {
-          const errorMsg = `Processo finalizado com código ${code}`;
-          mainWindow.webContents.send('conversion-progress', {
-            type: 'error',
-            message: errorMsg
-          });
-          
-          // Incluir stderr no erro se disponível
-          const fullError = stderrBuffer ? `${errorMsg}\n\nDetalhes:\n${stderrBuffer}` : errorMsg;
-          reject(new Error(fullError));
-        }
-        pythonProcess = null;
-      });
+      const serverProcess = startPythonServer();
+      const jobId = `job-${Date.now()}`;
+      pendingJobs.set(jobId, { resolve, reject });
+      activeJobId = jobId;
 
-      pythonProcess.on('error', (error) => {
-        console.log('💥 Erro no processo Python:', error);
-        const errorMsg = `Erro ao executar Python: ${error.message}. Verifique a instalação do Python.`;
-        
-        mainWindow.webContents.send('conversion-progress', {
-          type: 'error',
-          message: errorMsg
-        });
-        reject(error);
-        pythonProcess = null;
-      });
+      // Enviar o job para o servidor (uma linha JSON por comando)
+      serverProcess.stdin.write(JSON.stringify({ command: 'submit', jobId, config }) + '\n');
+      console.log('✅ Job enviado ao servidor:', jobId);
 
     } catch (error) {
       console.log('💥 Erro no start-conversion:', error);
@@ -483,18 +501,9 @@ ipcMain.handle('start-conversion', async (event, config) => {
 
 ipcMain.handle('cancel-conversion', async () => {
   console.log('⏹️ Cancelando conversão...');
-  if (pythonProcess) {
-    // Tentar finalizar graciosamente primeiro
-    pythonProcess.kill('SIGTERM');
-    
-    // Forçar kill após 3 segundos se necessário
-    setTimeout(() => {
-      if (pythonProcess) {
-        pythonProcess.kill('SIGKILL');
-        pythonProcess = null;
-      }
-    }, 3000);
-    
+  if (pythonProcess && activeJobId) {
+    // O servidor cancela só este job e continua rodando para as próximas conversões
+    pythonProcess.stdin.write(JSON.stringify({ command: 'cancel', jobId: activeJobId }) + '\n');
     console.log('✅ Comando de cancelamento enviado');
     return { success: true };
   }
@@ -11,6 +11,7 @@ export interface ProgressData {
   progress?: number;
   message?: string;
   stage?: string;
+  kind?: 'stage' | 'throughput' | 'profile' | string;
   metrics?: {
     totalFrames?: number;
     fps?: number;